@@ -0,0 +1,607 @@
+# -*- encoding: utf-8 -*-
+"""
+util 核心处理函数的基准测试，不依赖 Qt，可在 Linux 上无界面运行（识别只使用本机的 tesseract）
+
+  python bench.py run                                  # 默认 small、medium 两档
+  python bench.py run --scale large --op split_pdf --op merge_pdf -o before.json
+  python bench.py run --set pages=2000 --set image=4960x7016
+  python bench.py compare before.json after.json
+
+每个 (函数, 规模) 在单独的进程中执行：先预热，再计时 repeat 次，最后开启 tracemalloc 再执行一次统计内存
+输入文件按规模生成一次并缓存在工作目录中，结果写为 JSON，可用 compare 对比两次的结果
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Tuple
+
+EXIT_OK = 0
+EXIT_REGRESSED = 1
+
+# 记录到结果中的依赖版本
+PACKAGES = ['pymupdf', 'numpy', 'opencv-python', 'opencv-python-headless', 'scipy', 'pandas', 'python-docx',
+            'docxcompose', 'pytesseract',
+            ]
+
+WORDS = ['contract', 'plaintiff', 'defendant', 'court', 'judgment', 'appeal', 'evidence', 'claim', 'payment',
+         'interest', 'article', 'section', 'party', 'agreement', 'liability', 'damages', 'notice', 'hearing',
+         ]
+
+
+@dataclass
+class Scale:
+  # 分割、合并使用的文字 pdf 总页数
+  pages: int = 20
+  # 合并的文件数
+  files: int = 5
+  # 扫描件 pdf 的页数，用于渲染、识别
+  scan_pages: int = 2
+  # 渲染、识别的分辨率
+  dpi: int = 150
+  # 扫描图片的尺寸 (宽, 高)
+  image: Tuple[int, int] = (1240, 1754)
+  # 合并的 Word 文件数
+  docs: int = 3
+  # 每个 Word 文件的段落数
+  paragraphs: int = 50
+  # cal_fees 的计算次数
+  fees: int = 10000
+
+
+SCALES = {
+  'small' : Scale(),
+  'medium': Scale(pages = 200, files = 20, scan_pages = 5, dpi = 200, image = (2480, 3508), docs = 10,
+                  paragraphs = 300, fees = 100000,
+                  ),
+  'large' : Scale(pages = 1000, files = 100, scan_pages = 20, dpi = 300, image = (4960, 7016), docs = 30,
+                  paragraphs = 1000, fees = 1000000,
+                  ),
+}
+
+
+@dataclass
+class Case:
+  """
+  run 为计时的部分，reset 在每次执行前调用且不计时
+  """
+  run: Callable[[], Any]
+  reset: Callable[[], None] = None
+  input: Dict[str, Any] = field(default_factory = dict)
+
+
+class Skipped(Exception):
+  pass
+
+
+def parse_scale(scale: Scale, items: List[str]):
+  """
+  按 --set name=value 修改规模，image 写为 宽x高
+  """
+  changes = { }
+
+  for item in items or []:
+    name, _, val = item.partition('=')
+
+    if name not in Scale.__dataclass_fields__:
+      raise ValueError(f'未知的规模参数：{name}')
+
+    changes[name] = tuple(int(v) for v in val.lower().split('x')) if name == 'image' else int(val)
+
+  return replace(scale, **changes)
+
+
+# 生成输入文件
+def text_pdf(path: str, pages: int, seed = 0):
+  import fitz
+
+  if os.path.exists(path):
+    return path
+
+  doc = fitz.open()
+
+  for i in range(pages):
+    page = doc.new_page()
+    lines = [' '.join(WORDS[(seed + i + j * 7 + k) % len(WORDS)] for k in range(10)) for j in range(40)]
+    page.insert_text((56, 72), f'Page {i + 1}\n' + '\n'.join(lines), fontsize = 10)
+
+  doc.save(path, garbage = 4)
+  doc.close()
+
+  return path
+
+
+def scan_image(width: int, height: int, seed = 0):
+  """
+  模拟扫描件：光照不均、有噪点的灰底黑字
+  """
+  import cv2
+  import numpy as np
+
+  rng = np.random.default_rng(seed)
+  text = np.zeros((height, width), np.uint8)
+  scale = width / 1240
+  line_height = int(32 * scale)
+
+  for j, y in enumerate(range(int(120 * scale), height - int(80 * scale), line_height)):
+    words = ' '.join(WORDS[(seed + j * 5 + k) % len(WORDS)] for k in range(8))
+    cv2.putText(text, words, (int(90 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 0.8 * scale, 255,
+                max(1, int(2 * scale)), cv2.LINE_AA,
+                )
+
+  light = np.linspace(0.85, 1.0, width, dtype = np.float32)[None, :] * np.linspace(1.0, 0.9, height,
+                                                                                   dtype = np.float32)[:, None]
+  image = 240 * light - text.astype(np.float32) * (210 / 255)
+  image += rng.normal(0, 8, image.shape).astype(np.float32)
+  image = np.clip(image, 0, 255).astype(np.uint8)
+
+  return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def scan_png(path: str, size: Tuple[int, int], seed = 0):
+  import cv2
+
+  if not os.path.exists(path):
+    cv2.imwrite(path, scan_image(size[0], size[1], seed))
+
+  return path
+
+
+def scan_pdf(path: str, pages: int, size: Tuple[int, int]):
+  """
+  每页一张扫描图片，没有文字层
+  """
+  import cv2
+  import fitz
+
+  if os.path.exists(path):
+    return path
+
+  images = [cv2.imencode('.jpg', scan_image(size[0], size[1], seed), [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+            for seed in range(min(pages, 3))]
+  doc = fitz.open()
+
+  for i in range(pages):
+    page = doc.new_page()
+    page.insert_image(page.rect, stream = images[i % len(images)])
+
+  doc.save(path)
+  doc.close()
+
+  return path
+
+
+def word_doc(path: str, paragraphs: int, seed = 0):
+  from docx import Document
+
+  if os.path.exists(path):
+    return path
+
+  doc = Document()
+  doc.add_heading(f'Document {seed}', 1)
+
+  for i in range(paragraphs):
+    doc.add_paragraph(' '.join(WORDS[(seed + i + k) % len(WORDS)] for k in range(30)))
+
+    if i % 50 == 49:
+      table = doc.add_table(rows = 5, cols = 4)
+
+      for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+          cell.text = WORDS[(r * 4 + c) % len(WORDS)]
+
+  doc.save(path)
+
+  return path
+
+
+# 各函数的测试用例，输入文件在 inputs 中生成，case 在测试进程中读取输入
+def split_inputs(scale: Scale, work: str):
+  return { 'pdf': text_pdf(os.path.join(work, f'text-{scale.pages}.pdf'), scale.pages) }
+
+
+def split_case(inputs: dict, scale: Scale, work: str, opts: dict):
+  from util.pdf import split_pdf
+
+  out = os.path.join(work, 'split-out')
+
+  return Case(run = lambda: split_pdf(inputs['pdf'], 1, out = out, workers = opts['workers']),
+              reset = lambda: shutil.rmtree(out, ignore_errors = True),
+              input = { 'pages': scale.pages, 'bytes': os.path.getsize(inputs['pdf']) },
+              )
+
+
+def merge_inputs(scale: Scale, work: str):
+  pages = max(1, scale.pages // scale.files)
+  folder = os.path.join(work, f'merge-{scale.files}-{pages}')
+  os.makedirs(folder, exist_ok = True)
+
+  return { 'pdfs': [text_pdf(os.path.join(folder, f'{i}.pdf'), pages, i) for i in range(scale.files)] }
+
+
+def merge_case(inputs: dict, scale: Scale, work: str, opts: dict):
+  from util.pdf import merge_pdf
+
+  pdfs = inputs['pdfs']
+  out = os.path.join(os.path.dirname(pdfs[0]), 'bench-merged.pdf')
+
+  def reset():
+    if os.path.exists(out):
+      os.remove(out)
+
+  return Case(run = lambda: merge_pdf(pdfs, 'bench-merged', workers = opts['workers']), reset = reset,
+              input = { 'files': len(pdfs), 'bytes': sum(os.path.getsize(pdf) for pdf in pdfs) },
+              )
+
+
+def scan_inputs(scale: Scale, work: str):
+  name = f'scan-{scale.scan_pages}-{scale.image[0]}x{scale.image[1]}.pdf'
+
+  return { 'pdf': scan_pdf(os.path.join(work, name), scale.scan_pages, scale.image) }
+
+
+def render_case(inputs: dict, scale: Scale, work: str, opts: dict):
+  from util.render import pdf_2_image
+
+  def run():
+    for page in range(scale.scan_pages):
+      pdf_2_image(inputs['pdf'], page, scale.dpi)
+
+  return Case(run = run, input = { 'pages': scale.scan_pages, 'dpi': scale.dpi })
+
+
+def ocr_case(inputs: dict, scale: Scale, work: str, opts: dict):
+  import util.ocr
+  from util.cache import ResultCache
+
+  try:
+    version = str(util.ocr.tesseract().get_tesseract_version())
+    langs = util.ocr.tesseract().get_languages()
+  except OSError as e:
+    raise Skipped(f'tesseract 不可用：{e}')
+
+  if opts['lang'] not in langs:
+    raise Skipped(f'tesseract 缺少语言 {opts['lang']}')
+
+  # 结果缓存会让重复执行直接命中，放到工作目录中并在每次执行前清空
+  util.ocr.RESULT_CACHE = ResultCache(os.path.join(work, 'ocr-cache.db'))
+
+  def run():
+    for page in range(scale.scan_pages):
+      util.ocr.ocr_pdf(inputs['pdf'], page, scale.dpi, opts['lang'])
+
+  return Case(run = run, reset = util.ocr.RESULT_CACHE.clear,
+              input = { 'pages': scale.scan_pages, 'dpi': scale.dpi, 'lang': opts['lang'], 'tesseract': version },
+              )
+
+
+def compress_case(inputs: dict, scale: Scale, work: str, opts: dict):
+  from util.compress import compress_pdf
+
+  out = os.path.join(os.path.dirname(inputs['pdf']), 'bench-small.pdf')
+
+  def reset():
+    if os.path.exists(out):
+      os.remove(out)
+
+  return Case(run = lambda: compress_pdf(inputs['pdf'], 'bench-small', workers = opts['workers'] or None),
+              reset = reset, input = { 'pages': scale.scan_pages, 'bytes': os.path.getsize(inputs['pdf']) },
+              )
+
+
+def image_inputs(scale: Scale, work: str):
+  return { 'png': scan_png(os.path.join(work, f'scan-{scale.image[0]}x{scale.image[1]}.png'), scale.image) }
+
+
+def image_case(fn_name: str, **kwargs):
+  def case(inputs: dict, scale: Scale, work: str, opts: dict):
+    import util
+
+    fn = getattr(util, fn_name)
+    image = util.read_img(inputs['png'])
+
+    return Case(run = lambda: fn(image, **kwargs), input = { 'shape': list(image.shape), **kwargs })
+
+  return case
+
+
+def word_inputs(scale: Scale, work: str):
+  folder = os.path.join(work, f'word-{scale.docs}-{scale.paragraphs}')
+  os.makedirs(folder, exist_ok = True)
+
+  return { 'docs': [word_doc(os.path.join(folder, f'{i}.docx'), scale.paragraphs, i) for i in range(scale.docs)] }
+
+
+def word_case(inputs: dict, scale: Scale, work: str, opts: dict):
+  from util.office import merge_word
+
+  docs = inputs['docs']
+
+  return Case(run = lambda: merge_word(docs, 'bench-merged'),
+              input = { 'files': len(docs), 'paragraphs': scale.paragraphs },
+              )
+
+
+def fees_inputs(scale: Scale, work: str):
+  return { }
+
+
+def fees_case(inputs: dict, scale: Scale, work: str, opts: dict):
+  import numpy as np
+
+  from util.data import cal_fees
+
+  nums = np.random.default_rng(0).uniform(0, 5e7, scale.fees).tolist()
+
+  def run():
+    for num in nums:
+      cal_fees(num)
+
+  return Case(run = run, input = { 'count': scale.fees })
+
+
+OPS: Dict[str, Tuple[Callable, Callable]] = {
+  'split_pdf'   : (split_inputs, split_case),
+  'merge_pdf'   : (merge_inputs, merge_case),
+  'pdf_2_image' : (scan_inputs, render_case),
+  'ocr_pdf'     : (scan_inputs, ocr_case),
+  'compress_pdf': (scan_inputs, compress_case),
+  'img_bleach'  : (image_inputs, image_case('img_bleach')),
+  'rotate_img'  : (image_inputs, image_case('rotate_img', angle = 90)),
+  'rotate_img_3': (image_inputs, image_case('rotate_img', angle = 3)),
+  'deskew_img'  : (image_inputs, image_case('deskew_img')),
+  'merge_word'  : (word_inputs, word_case),
+  'cal_fees'    : (fees_inputs, fees_case),
+}
+
+
+# 执行
+def max_rss_mb():
+  import resource
+
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+  # macOS 的单位为字节，Linux 为 KB
+  return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_case(op: str, scale: Scale, inputs: dict, work: str, opts: dict):
+  """
+  在测试进程中执行，返回计时与内存
+  """
+  try:
+    case = OPS[op][1](inputs, scale, work, opts)
+  except Skipped as e:
+    return { 'status': 'skipped', 'reason': str(e) }
+
+  times = []
+  rss_base = max_rss_mb()
+
+  for i in range(opts['warmup'] + opts['repeat']):
+    if case.reset:
+      case.reset()
+
+    start = time.perf_counter()
+    case.run()
+    seconds = time.perf_counter() - start
+
+    if i >= opts['warmup']:
+      times.append(seconds)
+
+  rss_peak = max_rss_mb()
+
+  if case.reset:
+    case.reset()
+
+  tracemalloc.start()
+  case.run()
+  _, py_peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  return {
+    'status'     : 'ok',
+    'input'      : case.input,
+    'times'      : [round(t, 6) for t in times],
+    'min'        : round(min(times), 6),
+    'median'     : round(statistics.median(times), 6),
+    'mean'       : round(statistics.fmean(times), 6),
+    'stdev'      : round(statistics.stdev(times), 6) if len(times) > 1 else 0.0,
+    'py_peak_mb' : round(py_peak / (1 << 20), 3),
+    'rss_base_mb': round(rss_base, 1),
+    'rss_peak_mb': round(max(rss_peak, max_rss_mb()), 1),
+  }
+
+
+def isolated(op: str, scale: Scale, inputs: dict, work: str, opts: dict):
+  """
+  每个用例使用新的进程，互不影响内存峰值与缓存
+  """
+  ctx = multiprocessing.get_context('spawn')
+
+  with ProcessPoolExecutor(max_workers = 1, mp_context = ctx) as pool:
+    return pool.submit(run_case, op, scale, inputs, work, opts).result()
+
+
+def versions():
+  result = {
+    'python'  : platform.python_version(),
+    'platform': platform.platform(),
+    'machine' : platform.machine(),
+    'cpus'    : os.cpu_count(),
+  }
+
+  for name in PACKAGES:
+    try:
+      result[name] = metadata.version(name)
+    except metadata.PackageNotFoundError:
+      pass
+
+  try:
+    result['tesseract'] = subprocess.run(['tesseract', '--version'], capture_output = True, text = True,
+                                         ).stdout.split('\n')[0] or None
+  except OSError:
+    result['tesseract'] = None
+
+  try:
+    result['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True,
+                                      cwd = os.path.dirname(os.path.abspath(__file__)),
+                                      ).stdout.strip() or None
+  except OSError:
+    result['commit'] = None
+
+  return result
+
+
+def log(msg: str):
+  print(msg, file = sys.stderr, flush = True)
+
+
+def cmd_run(args):
+  ops = args.op or list(OPS)
+  scales = args.scale or ['small', 'medium']
+  unknown = [op for op in ops if op not in OPS] + [scale for scale in scales if scale not in SCALES]
+
+  if unknown:
+    log(f'未知的函数或规模：{'、'.join(unknown)}')
+    return 2
+
+  work = args.work or tempfile.mkdtemp(prefix = 'layer_helper_bench_')
+  os.makedirs(work, exist_ok = True)
+  opts = { 'repeat': args.repeat, 'warmup': args.warmup, 'workers': args.workers, 'lang': args.lang }
+  results = []
+
+  try:
+    for scale_name in scales:
+      scale = parse_scale(SCALES[scale_name], args.set)
+      scale_work = os.path.join(work, scale_name)
+      os.makedirs(scale_work, exist_ok = True)
+
+      for op in ops:
+        log(f'{scale_name} {op} ...')
+        start = time.perf_counter()
+
+        try:
+          inputs = OPS[op][0](scale, scale_work)
+          result = isolated(op, scale, inputs, scale_work, opts)
+        except Exception as e:
+          result = { 'status': 'failed', 'error': f'{type(e).__name__}: {e}' }
+
+        result = { 'op': op, 'scale': scale_name, 'params': asdict(scale), **result }
+        results.append(result)
+
+        if result['status'] == 'ok':
+          log(f'  median {result['median']:.4f}s  min {result['min']:.4f}s  '
+              f'py_peak {result['py_peak_mb']}MB  rss_peak {result['rss_peak_mb']}MB  '
+              f'（共 {time.perf_counter() - start:.1f}s）'
+              )
+        else:
+          log(f'  {result['status']}：{result.get('reason') or result.get('error')}')
+  finally:
+    if not args.work and not args.keep:
+      shutil.rmtree(work, ignore_errors = True)
+
+  out = args.output or f'bench-{time.strftime('%Y%m%d-%H%M%S')}.json'
+  data = {
+    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'env'    : versions(),
+    'options': opts,
+    'results': results,
+  }
+
+  with open(out, 'w', encoding = 'utf-8') as f:
+    json.dump(data, f, ensure_ascii = False, indent = 2)
+
+  log(f'结果已写入 {out}')
+
+  return EXIT_OK
+
+
+def cmd_compare(args):
+  with open(args.old, encoding = 'utf-8') as f:
+    old = { (r['op'], r['scale']): r for r in json.load(f)['results'] }
+
+  with open(args.new, encoding = 'utf-8') as f:
+    new = { (r['op'], r['scale']): r for r in json.load(f)['results'] }
+
+  regressed = []
+  print(f'{'函数':<14}{'规模':<8}{'之前(s)':>12}{'之后(s)':>12}{'变化':>10}{'内存之前(MB)':>16}{'内存之后(MB)':>16}')
+
+  for key in [key for key in old if key in new] + [key for key in new if key not in old]:
+    a, b = old.get(key), new[key]
+
+    if not a or a['status'] != 'ok' or b['status'] != 'ok':
+      print(f'{key[0]:<14}{key[1]:<8}{'':>12}{'':>12}{(b.get('status') if b else ''):>10}')
+      continue
+
+    ratio = b['median'] / a['median'] if a['median'] else float('inf')
+    mark = ''
+
+    if ratio > 1 + args.threshold:
+      mark = ' ▲'
+      regressed.append(key)
+    elif ratio < 1 - args.threshold:
+      mark = ' ▼'
+
+    if a['params'] != b['params']:
+      mark += '（规模参数不同）'
+
+    print(f'{key[0]:<14}{key[1]:<8}{a['median']:>12.4f}{b['median']:>12.4f}{(ratio - 1) * 100:>+9.1f}%'
+          f'{a['py_peak_mb']:>16.1f}{b['py_peak_mb']:>16.1f}{mark}'
+          )
+
+  if regressed:
+    print(f'变慢超过 {args.threshold:.0%}：{'、'.join(f'{op}/{scale}' for op, scale in regressed)}')
+    return EXIT_REGRESSED
+
+  return EXIT_OK
+
+
+def build_parser():
+  parser = argparse.ArgumentParser(prog = 'bench.py', description = 'util 基准测试')
+  subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+  run = subparsers.add_parser('run', help = '执行基准测试')
+  run.add_argument('--op', action = 'append', help = f'要测试的函数，可指定多次：{'、'.join(OPS)}')
+  run.add_argument('--scale', action = 'append', help = f'规模，可指定多次：{'、'.join(SCALES)}')
+  run.add_argument('--set', action = 'append', metavar = 'NAME=VALUE',
+                   help = f'修改规模参数，如 pages=500、image=2480x3508，可用：{'、'.join(Scale.__dataclass_fields__)}',
+                   )
+  run.add_argument('--repeat', type = int, default = 3, help = '计时次数')
+  run.add_argument('--warmup', type = int, default = 1, help = '预热次数，不计时')
+  run.add_argument('-j', '--workers', type = int, default = 0, help = '传给 split_pdf、merge_pdf、compress_pdf 的进程数')
+  run.add_argument('--lang', default = 'eng', help = 'ocr_pdf 使用的语言')
+  run.add_argument('--work', help = '存放输入文件的目录，指定后保留以便下次复用')
+  run.add_argument('--keep', action = 'store_true', help = '保留临时目录')
+  run.add_argument('-o', '--output', help = '结果文件，默认为 bench-时间.json')
+  run.set_defaults(fn = cmd_run)
+
+  compare = subparsers.add_parser('compare', help = '对比两次结果')
+  compare.add_argument('old')
+  compare.add_argument('new')
+  compare.add_argument('--threshold', type = float, default = 0.1, help = '中位数变化超过该比例时视为变慢，默认 0.1')
+  compare.set_defaults(fn = cmd_compare)
+
+  return parser
+
+
+def main(argv: List[str] = None):
+  args = build_parser().parse_args(argv)
+
+  return args.fn(args)
+
+
+if __name__ == '__main__':
+  multiprocessing.freeze_support()
+  sys.exit(main())
@@ -0,0 +1,471 @@
+# -*- encoding: utf-8 -*-
+"""
+命令行入口，不依赖 Qt，执行子命令时才导入对应的依赖
+
+  python cli.py split a.pdf b.pdf --step 2
+  python cli.py merge -m files.txt --name 合并
+  python cli.py ocr-rename -m files.txt --pattern "（\\d{4}）.*?号" --table 案件.txt --col 0 --rule "{1}-判决书"
+  python cli.py batch D:/案件 --op pdf
+  python cli.py compress a.pdf --dpi 150 --quality 60
+
+文件可直接列出，也可通过 -m 指定清单：一行一个路径，忽略空行与 # 开头的行；.json 清单为路径数组；- 表示从标准输入读取
+进度以 JSON Lines 输出到标准输出，每行一个事件：
+  {"event": "start", "total": 3}
+  {"event": "progress", "i": 0, "done": 1, "total": 3, "file": "...", "ok": true, ...}
+  {"event": "end", "ok": 3, "failed": 0, "seconds": 1.2}
+退出码：0 全部成功，1 有文件失败，2 参数错误，130 被中断
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+OFFICE_EXTS = ('.doc', '.docx', '.xls', '.xlsx')
+BATCH_EXTS = {
+  'pdf'   : ['.doc', '.docx', '.xls', '.xlsx', '.jpg', '.png'],
+  'orient': ['.jpg', '.png', '.pdf'],
+}
+
+
+class Progress:
+  """
+  以 JSON Lines 输出进度，并统计成功、失败的数量
+  """
+  stream = None
+
+  def __init__(self, total: int, out = None):
+    self.out = out or self.stream or sys.stdout
+    self.total = total
+    self.done = 0
+    self.ok = 0
+    self.failed = 0
+    self.start = time.perf_counter()
+    self.emit('start', total = total)
+
+  def emit(self, event: str, **data):
+    self.out.write(json.dumps({ 'event': event, **data }, ensure_ascii = False) + '\n')
+    self.out.flush()
+
+  def item(self, i: int, file: str, ok = True, **data):
+    self.done += 1
+
+    if ok:
+      self.ok += 1
+    else:
+      self.failed += 1
+
+    self.emit('progress', i = i, done = self.done, total = self.total, file = file, ok = ok, **data)
+
+  def end(self, **data):
+    seconds = round(time.perf_counter() - self.start, 3)
+    self.emit('end', ok = self.ok, failed = self.failed, seconds = seconds, **data)
+
+    return EXIT_OK if self.failed == 0 else EXIT_FAILED
+
+
+def progress_stream():
+  """
+  标准输出只留给进度，依赖库的警告、子进程的打印等改到标准错误
+  """
+  sys.stdout.flush()
+  out = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding = 'utf-8')
+  os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+  return out
+
+
+def read_manifest(manifest: str):
+  if manifest == '-':
+    lines = sys.stdin.read().splitlines()
+  else:
+    with open(manifest, encoding = 'utf-8-sig') as f:
+      if manifest.lower().endswith('.json'):
+        return [str(file) for file in json.load(f)]
+
+      lines = f.read().splitlines()
+
+  return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+
+def collect_files(args):
+  files = list(args.files)
+
+  for manifest in args.manifest or []:
+    files += read_manifest(manifest)
+
+  return files
+
+
+def existing(progress: Progress, files: List[str], check = os.path.isfile):
+  """
+  不存在的文件直接记为失败，返回剩余文件的序号
+  """
+  idxs = []
+
+  for i, file in enumerate(files):
+    if check(file):
+      idxs.append(i)
+    else:
+      progress.item(i, file, False, error = '文件不存在')
+
+  return idxs
+
+
+# 子进程按名称找到任务函数，避免传递闭包
+def split_task(pdf_file: str, step: int, s: int, e: int | None, out: str | None, new_name: str | None,
+               workers = 0,
+               ):
+  from util.pdf import split_pdf
+
+  return { 'outputs': split_pdf(pdf_file, step, s, e, out, new_name, workers) }
+
+
+def batch_task(op: str, file: str):
+  ext = os.path.splitext(file)[1].lower()
+
+  if op == 'orient':
+    if ext == '.pdf':
+      from util.ocr import correct_pdf_orient
+
+      new_name = file[:-len(ext)] + '-校正方向.pdf'
+      correct_pdf_orient(file, new_name = new_name)
+    else:
+      from util.image import read_img, write_img
+      from util.ocr import correct_img_orient
+
+      new_name = file[:-len(ext)] + '-校正方向' + ext
+      write_img(correct_img_orient(read_img(file)), new_name)
+
+    return { 'output': new_name }
+
+  from util.common import file_2_type
+  from util.image import img_2_pdf
+
+  new_name = file_2_type(file)
+  img_2_pdf(file, new_name)
+
+  return { 'output': new_name }
+
+
+TASKS: Dict[str, Callable[..., Dict[str, Any]]] = {
+  'split': split_task,
+  'batch': batch_task,
+}
+
+
+def run_task(task: str, *args):
+  try:
+    return True, TASKS[task](*args)
+  except Exception as e:
+    return False, { 'error': f'{type(e).__name__}: {e}' }
+
+
+def run_each(progress: Progress, files: List[str], idxs: List[int], task: str, args_list: List[tuple], workers = 0):
+  """
+  逐个执行任务，workers 大于 1 时在进程池中执行，先完成的先输出
+  """
+  if workers > 1 and len(idxs) > 1:
+    from util.pool import pool_map
+
+    results = pool_map(run_task, [(task, *args) for args in args_list], workers)
+  else:
+    results = ((j, run_task(task, *args)) for j, args in enumerate(args_list))
+
+  for j, (ok, data) in results:
+    i = idxs[j]
+    progress.item(i, files[i], ok, **data)
+
+
+def run_office(progress: Progress, files: List[str], idxs: List[int], args):
+  """
+  Word、Excel 在常驻的转换进程中同时转换，每个进程只启动一次 Office（LibreOffice 需要能导入 uno）
+  """
+  if not idxs:
+    return
+
+  from util.common import file_2_type
+  from util.convert import ConvertError, DOC_TIMEOUT, OfficePool
+
+  try:
+    pool = OfficePool(args.office, args.office_workers, args.timeout or DOC_TIMEOUT)
+  except ConvertError as e:
+    for i in idxs:
+      progress.item(i, files[i], False, error = str(e))
+
+    return
+
+  outs = [file_2_type(files[i]) for i in idxs]
+
+  try:
+    for j, error in pool.map([(files[i], out) for i, out in zip(idxs, outs)]):
+      i = idxs[j]
+
+      if error:
+        progress.item(i, files[i], False, error = error)
+      else:
+        progress.item(i, files[i], True, output = outs[j])
+  finally:
+    pool.close()
+
+
+def default_workers(workers: int | None):
+  return (os.cpu_count() or 1) if workers is None else workers
+
+
+def cmd_split(args):
+  files = collect_files(args)
+  progress = Progress(len(files))
+  idxs = existing(progress, files)
+  workers = default_workers(args.workers)
+
+  if len(idxs) == 1:
+    # 只有一个文件时在文件内部分块并行
+    args_list = [(files[idxs[0]], args.step, args.start, args.end, args.out, args.name, workers)]
+    run_each(progress, files, idxs, 'split', args_list)
+  else:
+    args_list = [(files[i], args.step, args.start, args.end, args.out, args.name) for i in idxs]
+    run_each(progress, files, idxs, 'split', args_list, workers)
+
+  return progress.end()
+
+
+def cmd_merge(args):
+  files = collect_files(args)
+  progress = Progress(len(files))
+  idxs = existing(progress, files)
+
+  if progress.failed or not idxs:
+    return progress.end()
+
+  from util.pdf import merge_pdf
+
+  def merged(n: int):
+    progress.emit('progress', done = n, total = progress.total)
+
+  try:
+    full = merge_pdf(files, args.name, bookmarks = not args.no_bookmarks, workers = default_workers(args.workers),
+                     chunk_size = args.chunk_size, callback = merged,
+                     )
+  except Exception as e:
+    progress.failed = len(files)
+    return progress.end(error = f'{type(e).__name__}: {e}')
+
+  progress.ok = len(files)
+
+  return progress.end(output = full)
+
+
+def free_name(file: str, taken: set):
+  """
+  目标文件已存在或已分给本次的其他文件时加上序号，如 判决书-1.pdf，不覆盖已有的文件
+  """
+  name, ext = os.path.splitext(file)
+  n = 0
+  new_name = file
+
+  while os.path.exists(new_name) or os.path.normcase(new_name) in taken:
+    n += 1
+    new_name = f'{name}-{n}{ext}'
+
+  return new_name
+
+
+def cmd_ocr_rename(args):
+  from util.common import content_new_name, parse_name_rule, parse_table
+
+  try:
+    pattern = re.compile(args.pattern)
+  except re.error as e:
+    print(f'正则表达式无效：{e}', file = sys.stderr)
+    return EXIT_USAGE
+
+  files = collect_files(args)
+
+  with open(args.table, encoding = 'utf-8-sig') as f:
+    rows = parse_table(f.read(), not args.keep_first)
+
+  rules = parse_name_rule(args.rule)
+  clip = tuple(float(val) for val in args.clip.split(',')) if args.clip else None
+  progress = Progress(len(files))
+  idxs = existing(progress, files)
+
+  if not idxs:
+    return progress.end()
+
+  from util.ocr import ocr_pdfs
+
+  pdf_files = [files[i] for i in idxs]
+  taken = set()
+
+  for j, content in ocr_pdfs(pdf_files, args.page, workers = default_workers(args.workers), clip = clip):
+    i = idxs[j]
+    file = files[i]
+
+    try:
+      matched, new_name = content_new_name(file, content, pattern, rows, args.col, rules)
+
+      if matched is None:
+        progress.item(i, file, False, error = '未识别到相关信息')
+        continue
+
+      if new_name is None:
+        progress.item(i, file, False, matched = matched, error = '无法匹配')
+        continue
+
+      # 已是该名称时不用重命名
+      if os.path.normcase(os.path.abspath(new_name)) != os.path.normcase(os.path.abspath(file)):
+        new_name = free_name(new_name, taken)
+
+        if not args.dry_run:
+          os.rename(file, new_name)
+
+      taken.add(os.path.normcase(new_name))
+      progress.item(i, file, True, matched = matched, output = new_name)
+    except Exception as e:
+      progress.item(i, file, False, error = f'{type(e).__name__}: {e}')
+
+  return progress.end()
+
+
+def cmd_compress(args):
+  from util.compress import compress_pdf, CompressProfile
+
+  files = collect_files(args)
+  progress = Progress(len(files))
+  profile = CompressProfile(dpi = args.dpi, quality = args.quality, mode = args.mode)
+
+  # 文件内的图片已按页并行处理，文件依次执行
+  for i in existing(progress, files):
+    new_name = args.name
+
+    # 多个文件在同一目录时不能用同一个名称，加上原文件名前缀
+    if new_name and len(files) > 1:
+      new_name = f'{os.path.splitext(os.path.basename(files[i]))[0]}-{new_name}'
+
+    try:
+      report = compress_pdf(files[i], new_name, profile, default_workers(args.workers) or None)
+    except Exception as e:
+      progress.item(i, files[i], False, error = f'{type(e).__name__}: {e}')
+      continue
+
+    progress.item(i, files[i], True, output = report.out, before = report.before, after = report.after)
+
+  return progress.end()
+
+
+def cmd_batch(args):
+  from util.scan import scan_files
+
+  folders = collect_files(args)
+  exts = args.ext or BATCH_EXTS[args.op]
+  exts = [ext if ext.startswith('.') else '.' + ext for ext in exts]
+  missing = [folder for folder in folders if not os.path.isdir(folder)]
+  files = scan_files([folder for folder in folders if folder not in missing], exts, args.recursive)
+  files = sorted(set(os.path.normpath(file) for file in files))
+  progress = Progress(len(files))
+
+  for folder in missing:
+    progress.emit('warning', file = folder, error = '目录不存在')
+
+  # 转为 PDF 时 Word、Excel 交给转换进程池，其余文件在共享进程池中执行
+  is_office = [args.op == 'pdf' and file.lower().endswith(OFFICE_EXTS) for file in files]
+  office = [i for i, flag in enumerate(is_office) if flag]
+  others = [i for i, flag in enumerate(is_office) if not flag]
+  run_each(progress, files, others, 'batch', [(args.op, files[i]) for i in others], default_workers(args.workers))
+  run_office(progress, files, office, args)
+
+  return progress.end()
+
+
+def build_parser():
+  parser = argparse.ArgumentParser(prog = 'cli.py', description = '律师助手命令行')
+  subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+  def add_files(sub: argparse.ArgumentParser, help_str = '文件'):
+    sub.add_argument('files', nargs = '*', help = help_str)
+    sub.add_argument('-m', '--manifest', action = 'append', help = '清单文件，可指定多次')
+    sub.add_argument('-j', '--workers', type = int, help = '进程数，默认为 cpu 核数')
+
+  split = subparsers.add_parser('split', help = '规则分割 PDF')
+  add_files(split, 'PDF 文件')
+  split.add_argument('--step', type = int, default = 1, help = '每份页数')
+  split.add_argument('--start', type = int, default = 0, help = '起始页，从 0 开始')
+  split.add_argument('--end', type = int, help = '结束页（不含）')
+  split.add_argument('--out', help = '保存目录，默认为与文件同名的目录')
+  split.add_argument('--name', help = '新文件名，将加上序号前缀')
+  split.set_defaults(fn = cmd_split)
+
+  merge = subparsers.add_parser('merge', help = '合并 PDF，每个文件添加一个书签')
+  add_files(merge, 'PDF 文件，按顺序合并')
+  merge.add_argument('--name', help = '新文件名，保存在第一个文件所在目录')
+  merge.add_argument('--chunk-size', type = int, default = 50, help = '每组文件数')
+  merge.add_argument('--no-bookmarks', action = 'store_true', help = '不添加书签')
+  merge.set_defaults(fn = cmd_merge)
+
+  ocr = subparsers.add_parser('ocr-rename', help = '识别要素并重命名')
+  add_files(ocr, 'PDF 文件')
+  ocr.add_argument('--pattern', required = True, help = '需要识别的内容，正则表达式')
+  ocr.add_argument('--table', required = True, help = '从 Excel 复制的数据，制表符分隔')
+  ocr.add_argument('--col', type = int, default = 0, help = '使用第几列数据进行匹配')
+  ocr.add_argument('--rule', required = True, help = '命名规则，如 2025-{1}-{2}-判决书')
+  ocr.add_argument('--keep-first', action = 'store_true', help = '不跳过第一行')
+  ocr.add_argument('--page', type = int, default = 0, help = '识别第几页')
+  ocr.add_argument('--clip', help = '识别区域，页面比例 x0,y0,x1,y1')
+  ocr.add_argument('--dry-run', action = 'store_true', help = '只输出新文件名，不重命名')
+  ocr.set_defaults(fn = cmd_ocr_rename)
+
+  batch = subparsers.add_parser('batch', help = '批量处理目录中的文件')
+  add_files(batch, '目录')
+  batch.add_argument('--op', choices = list(BATCH_EXTS), default = 'pdf', help = 'pdf：转为 PDF，orient：校正方向')
+  batch.add_argument('--ext', action = 'append', help = '文件类型，可指定多次，默认为该操作支持的全部类型')
+  batch.add_argument('--no-recursive', dest = 'recursive', action = 'store_false', help = '不查找子目录')
+  batch.add_argument('--office', choices = ['msoffice', 'libreoffice'],
+                     help = 'Word、Excel 的转换方式，默认 Windows 上使用 Office，其次为 LibreOffice',
+                     )
+  batch.add_argument('--office-workers', type = int, help = '同时转换的 Word、Excel 数，默认为 cpu 核数，最多 4 个')
+  batch.add_argument('--timeout', type = float, help = '单个 Word、Excel 的转换时间上限（秒），默认 300')
+  batch.set_defaults(fn = cmd_batch)
+
+  compress = subparsers.add_parser('compress', help = '减小 PDF 文件大小')
+  add_files(compress, 'PDF 文件')
+  compress.add_argument('--dpi', type = int, default = 150, help = '图片超过该分辨率时缩小')
+  compress.add_argument('--quality', type = int, default = 60, help = 'JPEG 质量')
+  compress.add_argument('--mode', choices = ['auto', 'color', 'gray', 'bilevel'], default = 'auto',
+                        help = 'auto：按内容转为灰度或黑白，也可指定全部转为某一种',
+                        )
+  compress.add_argument('--name', help = '新文件名，默认为 原文件名-small；多个文件时为 原文件名-新文件名')
+  compress.set_defaults(fn = cmd_compress)
+
+  return parser
+
+
+def main(argv: List[str] = None):
+  parser = build_parser()
+  args = parser.parse_args(argv)
+  Progress.stream = progress_stream()
+
+  if not args.files and not args.manifest:
+    parser.error('请指定文件或清单')
+
+  try:
+    return args.fn(args)
+  except OSError as e:
+    print(f'执行失败：{e}', file = sys.stderr)
+    return EXIT_FAILED
+  except KeyboardInterrupt:
+    return EXIT_INTERRUPTED
+
+
+if __name__ == '__main__':
+  multiprocessing.freeze_support()
+  sys.exit(main())
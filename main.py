@@ -1,35 +1,36 @@
+import importlib
+import multiprocessing
 import sys
 
-from PySide6.QtCore import QLocale, QSettings, QTranslator
+# 最先导入，启动耗时从这里开始计算
+from ui.timing import TIMING
+
+from PySide6.QtCore import QLocale, QSettings, QTimer, QTranslator
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget
 
-from ui.about import AboutWidget
-from ui.cal import CalWidget
-from ui.file import FileWidget
-from ui.folder_batch import FolderBatchWidget
-from ui.image import ImageWidget
-from ui.pdf import PDFWidget
 from ui.signal import TAB_IDX, update_tab_idx
-from ui.word import WordWidget
 
 
 class MainWindow(QMainWindow):
   tabs = ['PDF', 'Word', 'Excel', '图片', '批处理', '文件处理', '新版诉状', '常规文书', '计算器', '设置', '关于']
+  # 第一次切换到该页时才导入模块并创建界面
   tab_widgets = {
-    'PDF'     : PDFWidget,
-    '批处理'  : FolderBatchWidget,
-    '图片'    : ImageWidget,
-    'Word'    : WordWidget,
-    '文件处理': FileWidget,
-    '计算器'  : CalWidget,
-    '关于'    : AboutWidget,
+    'PDF'     : 'ui.pdf.PDFWidget',
+    '批处理'  : 'ui.folder_batch.FolderBatchWidget',
+    '图片'    : 'ui.image.ImageWidget',
+    'Word'    : 'ui.word.WordWidget',
+    '文件处理': 'ui.file.FileWidget',
+    '计算器'  : 'ui.cal.CalWidget',
+    '关于'    : 'ui.about.AboutWidget',
   }
 
   def __init__(self):
     super().__init__()
 
     self.settings = QSettings('ecuplxd', 'layer_helper')
+    self.tab_widget = None
+    self.loaded = set()
 
     center_widget = QWidget()
     center_widget.setLayout(QVBoxLayout())
@@ -39,14 +40,18 @@ class MainWindow(QMainWindow):
     self.restoreGeometry(self.settings.value('geometry'))
     self.restoreState(self.settings.value('windowState'))
     self.show()
+    TIMING.mark('显示窗口')
+    # 窗口先显示出来，再创建当前页
+    QTimer.singleShot(0, self.load_current_tab)
 
   def init_ui(self) -> None:
     self.init_copyright()
 
-    tab_widget = self.init_tab()
-    self.centralWidget().layout().addWidget(tab_widget)
-    tab_widget.setCurrentIndex(TAB_IDX)
-    tab_widget.currentChanged.connect(update_tab_idx)
+    self.tab_widget = self.init_tab()
+    self.centralWidget().layout().addWidget(self.tab_widget)
+    self.tab_widget.setCurrentIndex(TAB_IDX)
+    self.tab_widget.currentChanged.connect(update_tab_idx)
+    self.tab_widget.currentChanged.connect(self.load_tab)
 
   def init_copyright(self):
     self.setWindowTitle('律师小助手——by 超萌超可爱')
@@ -56,13 +61,37 @@ class MainWindow(QMainWindow):
     tab_widget = QTabWidget()
 
     for name in self.tabs:
-      factory = self.tab_widgets.get(name) or QWidget
-      tab = factory()
+      tab = QWidget()
       tab.setObjectName(name)
+      layout = QVBoxLayout()
+      layout.setContentsMargins(0, 0, 0, 0)
+      tab.setLayout(layout)
       tab_widget.addTab(tab, name)
 
     return tab_widget
 
+  def load_tab(self, idx: int):
+    name = self.tabs[idx]
+    path = self.tab_widgets.get(name)
+
+    if path is None or idx in self.loaded:
+      return
+
+    self.loaded.add(idx)
+    module, cls = path.rsplit('.', 1)
+
+    with TIMING.measure(f'导入 {module}'):
+      factory = getattr(importlib.import_module(module), cls)
+
+    with TIMING.measure(f'创建 {name}'):
+      widget = factory()
+
+    self.tab_widget.widget(idx).layout().addWidget(widget)
+
+  def load_current_tab(self):
+    self.load_tab(self.tab_widget.currentIndex())
+    TIMING.mark('当前页可用')
+
   def closeEvent(self, event):
     self.settings.setValue('geometry', self.saveGeometry())
     self.settings.setValue('windowState', self.saveState())
@@ -87,9 +116,17 @@ def init_tr(app: QApplication):
 
 
 def main():
-  app = QApplication(sys.argv)
+  # 打包后进程池需要
+  multiprocessing.freeze_support()
+
+  with TIMING.measure('创建 QApplication'):
+    app = QApplication(sys.argv)
+
   init_tr(app)
-  window = MainWindow()
+
+  with TIMING.measure('创建主窗口'):
+    window = MainWindow()
+
   # w, h = restore_size(app)
   # window.resize(w, h)
 
@@ -4,7 +4,7 @@ from PySide6.QtWidgets import (QComboBox, QHBoxLayout, QPlainTextEdit,
 
 from ui.helper import clear_layout, Field, Fields, VarType
 from ui.signal import get_tab_idx, NOTIFY
-from util import cal_fees, cal_fenqi
+from util.data import cal_fees, cal_fenqi
 
 
 class CalWidget(QWidget):
@@ -20,6 +20,7 @@ class CalWidget(QWidget):
   def __init__(self):
     super().__init__()
 
+    self.notify = NOTIFY.channel(8)
     self.funcs = QComboBox()
     self.form_container = QHBoxLayout()
     self.l_input = QPlainTextEdit(placeholderText = '粘贴标的额，一行一个')
@@ -51,7 +52,7 @@ class CalWidget(QWidget):
     self.funcs.currentIndexChanged.connect(self.update_config)
     clear.pressed.connect(self.clear_input)
     ok.pressed.connect(self.cal)
-    NOTIFY.field_updated.connect(self.cal)
+    self.notify.updated.connect(self.cal)
 
     layout.addLayout(header)
     layout.addLayout(center)
@@ -72,7 +73,7 @@ class CalWidget(QWidget):
   def update_config(self, i = 0):
     clear_layout(self.form_container)
     fields = self.form[i]
-    self.form_container.addWidget(Fields.render(fields.items))
+    self.form_container.addWidget(Fields.render(fields.items, channel = self.notify))
 
     if i == 0:
       self.l_input.show()
@@ -91,7 +92,7 @@ class CalWidget(QWidget):
     return idx, val
 
   def cal(self):
-    if get_tab_idx() != 8:
+    if get_tab_idx() != self.notify.tab:
       return
 
     idx, val = self.get_form_val()
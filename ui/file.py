@@ -1,19 +1,26 @@
 import os
-import re
 import shutil
 import time
-from typing import Any, List
+from typing import Any, Callable, List
 
-from PySide6.QtCore import QThread, Signal
-from PySide6.QtWidgets import (QComboBox, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableWidget, QTreeWidget,
+from PySide6.QtWidgets import (QComboBox, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableView, QTreeWidget,
                                QTreeWidgetItem, QVBoxLayout,
                                QWidget,
                                )
 
 from ui.drag import DragDropWidget
 from ui.helper import clear_layout, Field, Fields, VarType
+from ui.job import bind_status, each, Job, JobKind, JOBS, Priority
+from ui.model import TableModel
 from ui.signal import get_tab_idx, NOTIFY
-from util import file_name_and_ext, filename_with_parent_dir, filter_file_by_glob, normal_join, normal_path, ocr_pdf
+from util.common import (content_new_name, file_name_and_ext, filename_with_parent_dir, normal_join, normal_path,
+                         parse_name_rule, parse_table,
+                         )
+from util.ocr import ocr_pdfs
+from util.scan import FileCatalog, GlobMatcher
+
+# 修改规则时，距上次刷新目录超过该秒数才在后台检查目录的变化
+REFRESH_SECS = 2
 
 
 class FileWidget(QWidget):
@@ -25,6 +32,9 @@ class FileWidget(QWidget):
                                 Field(label = '跳过第一行', type = VarType.BOOL, val = True),
                                 Field(label = '命名规则',
                                       hint = '选填，如：2025-{1}-{2}-判决书，将用第 1、2 列数据替换 {} 内容',
+                                      ),
+                                Field(label = '识别区域',
+                                      hint = '选填，页面比例 x0,y0,x1,y1，如 0,0,1,0.3 只识别页面顶部 30%',
                                       )]
            ),
     Fields('按规则挑选文件',
@@ -45,14 +55,21 @@ class FileWidget(QWidget):
   def __init__(self):
     super().__init__()
 
+    self.notify = NOTIFY.channel(5)
+    self.catalog: FileCatalog | None = None
+    self.catalog_job: Job | None = None
+    self.result = []
+
     self.config = QVBoxLayout()
     self.funcs = QComboBox()
     self.center = QHBoxLayout()
     self.toggle_btn = QPushButton('全部收起')
     self.status = QLabel()
     self.c_left = DragDropWidget()
-    self.l_table = QTableWidget()
-    self.r_table = QTableWidget()
+    self.l_table = QTableView()
+    self.l_model = TableModel(['原文件', '识别结果', '状态'])
+    self.r_table = QTableView()
+    self.r_model = TableModel(['移入目录'])
     self.file_tree = QTreeWidget()
     self.l_table.setLayout(QVBoxLayout())
     self.r_table.setLayout(QVBoxLayout())
@@ -69,13 +86,11 @@ class FileWidget(QWidget):
     self.file_tree.setColumnCount(1)
     self.file_tree.setHeaderLabels(['名称', '保存信息', '状态'])
     self.file_tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
-    self.l_table.setColumnCount(3)
-    self.l_table.setHorizontalHeaderLabels(['原文件', '识别结果', '状态'])
+    self.l_table.setModel(self.l_model)
     self.l_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
     self.l_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
     self.l_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
-    self.r_table.setColumnCount(1)
-    self.r_table.setHorizontalHeaderLabels(['移入目录'])
+    self.r_table.setModel(self.r_model)
     self.r_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
 
     c_right = DragDropWidget()
@@ -94,18 +109,21 @@ class FileWidget(QWidget):
     footer = QHBoxLayout()
     clear = QPushButton('清空')
     ok = QPushButton('执行')
+    stop = QPushButton('停止')
     footer.addStretch()
     footer.addWidget(self.status)
     footer.addWidget(self.toggle_btn)
+    footer.addWidget(stop)
     footer.addWidget(clear)
     footer.addWidget(ok)
 
     self.funcs.currentIndexChanged.connect(self.update_config)
     self.c_left.dropped.connect(self.update_l_table)
-    NOTIFY.field_updated.connect(self.update_file_tree)
+    self.notify.updated.connect(self.update_file_tree)
     c_right.dropped.connect(self.update_r_table)
     self.toggle_btn.pressed.connect(self.toggle_file_tree)
     clear.pressed.connect(self.clear)
+    stop.pressed.connect(lambda: JOBS.cancel(self))
     ok.pressed.connect(self.exec)
 
     layout.addLayout(header)
@@ -119,7 +137,7 @@ class FileWidget(QWidget):
   def update_config(self):
     i = self.funcs.currentIndex()
     clear_layout(self.config)
-    self.config.addWidget(Fields.render(self.configs[i].items, vertical = True))
+    self.config.addWidget(Fields.render(self.configs[i].items, vertical = True, channel = self.notify))
     self.toggle_btn.hide()
     self.file_tree.hide()
 
@@ -140,75 +158,106 @@ class FileWidget(QWidget):
       self.update_file_tree()
 
   def update_l_table(self, files: List[str] = None):
-    self.l_table.setRowCount(0)
-    self.l_table.setRowCount(len(files))
-
-    for r, file in enumerate(files):
-      self.l_table.setCellWidget(r, 0, QLabel(os.path.normpath(file)))
-      self.l_table.setCellWidget(r, 2, QLabel('待执行'))
+    self.l_model.set_rows([[os.path.normpath(file) for file in files], [''] * len(files), ['待执行'] * len(files)])
 
   def update_r_table(self, files: List[str] = None):
-    self.r_table.setRowCount(0)
-    self.r_table.setRowCount(len(files))
-
-    for r, file in enumerate(files):
-      self.r_table.setCellWidget(r, 0, QLabel(os.path.normpath(file)))
+    self.r_model.set_rows([[os.path.normpath(file) for file in files]])
 
   def update_file_tree(self):
-    if get_tab_idx() != 5:
+    if get_tab_idx() != self.notify.tab:
       return
 
-    idx = self.funcs.currentIndex()
+    if self.funcs.currentIndex() != 2:
+      return
+
+    target = self.update_cur_config()['待整理目录'] or ''
+
+    if target and os.path.isdir(target):
+      if self.catalog is None or self.catalog.root != os.path.normpath(target):
+        self.catalog = FileCatalog(target)
+        self.start_catalog_job()
+      elif self.catalog_job is None and time.monotonic() - self.catalog.refreshed > REFRESH_SECS:
+        self.start_catalog_job(refresh = True)
+
+    self.render_file_tree()
+
+  def start_catalog_job(self, refresh = False, then: Callable[[], None] = None):
+    """
+    :param then: 读取完成且未被新的任务取代时调用
+    """
+    if self.catalog_job:
+      self.catalog_job.cancel()
+
+    job = Job(catalog_job, self.catalog, refresh, kind = JobKind.IO, priority = Priority.HIGH, owner = self)
+    job.finished.connect(lambda changed, cur = job: self.catalog_done(cur, changed, then))
+    job.failed.connect(lambda _, cur = job: self.catalog_done(cur, None))
+    job.cancelled.connect(lambda cur = job: self.catalog_done(cur, None))
+    self.catalog_job = JOBS.start(job)
+
+  def catalog_done(self, job: Job, changed: int | None, then: Callable[[], None] = None):
+    # 已被新的任务取代
+    if job is not self.catalog_job:
+      return
+
+    self.catalog_job = None
+
+    # 没有读取完时丢弃，下次重新读取
+    if changed is None and not self.catalog.refreshed:
+      self.catalog = None
 
-    if idx == 2:
-      result = self.collect_files()
-      self.file_tree.clear()
+    if then and changed is not None:
+      then()
+    elif changed or changed is None:
+      self.render_file_tree()
+
+  def render_file_tree(self):
+    result = self.collect_files()
+    self.file_tree.clear()
+
+    if self.catalog_job and not self.catalog.refreshed:
+      self.status.setText('读取目录中...')
+    else:
       self.status.setText(f'共 {self.total} 个文件')
 
-      for item in result:
-        row = QTreeWidgetItem(self.file_tree)
-        name = item['name']
-        out = item['out']
-        size = len(item['files'])
-        row.setText(0, f'{name} - 共找出 {size} 个文件')
-        row.setText(1, f'{out}')
+    for item in result:
+      row = QTreeWidgetItem(self.file_tree)
+      name = item['name']
+      out = item['out']
+      size = len(item['files'])
+      row.setText(0, f'{name} - 共找出 {size} 个文件')
+      row.setText(1, f'{out}')
 
-        for file in item['files']:
-          child = QTreeWidgetItem(row)
-          child.setText(0, f'{file['src']}')
-          child.setText(1, f'    {file['name']}')
+      for file in item['files']:
+        child = QTreeWidgetItem(row)
+        child.setText(0, f'{file['src']}')
+        child.setText(1, f'    {file['name']}')
 
-        row.setExpanded(self.expanded)
+      row.setExpanded(self.expanded)
 
   def collect_files(self):
     self.update_cur_config()
     self.total = 0
-    result = []
+    self.result = []
     target = self.cur_config['待整理目录'] or ''
     out: str = self.cur_config['保存目录'] or ''
     rules = self.cur_config['规则'] or ''
 
-    if not target or not out or not rules:
-      return result
+    if not target or not out or not rules or self.catalog is None or self.catalog.root != os.path.normpath(target):
+      return self.result
 
-    rules = [line.split(' ') for line in rules.strip().split('\n')]
+    rules = [line.split() for line in rules.strip().split('\n') if line.strip()]
 
     for rule in rules:
-      files: list[str] = []
-      globs = rule[1:]
-
-      for glob in globs:
-        files += filter_file_by_glob(target, glob)
-
-      files = list(set(files))
+      # 规则编译后在目录索引中匹配，不再读取磁盘
+      files = self.catalog.match([GlobMatcher(glob) for glob in rule[1:]])
       self.total += len(files)
-      result.append({
+      self.result.append({
         'name' : rule[0],
         'out'  : os.path.join(out, rule[0]),
-        'files': [filename_with_parent_dir(file) for file in files]
+        'files': [filename_with_parent_dir(file.path) for file in files]
       })
 
-    return result
+    return self.result
 
   def update_cur_config(self):
     idx = self.funcs.currentIndex()
@@ -219,54 +268,79 @@ class FileWidget(QWidget):
     return val
 
   def exec(self):
+    self.notify.flush()
     idx = self.funcs.currentIndex()
     val = self.update_cur_config()
 
     self.status.setText('执行中，请稍后...')
+    job = None
+
     if idx == 0:
       lefts = self.l_table.selectedIndexes()
       rights = self.r_table.selectedIndexes()
       new_name = val['重命名为']
+      moves = []
 
       for i, item in enumerate(lefts):
-        file = self.l_table.cellWidget(item.row(), 0).text()
+        file = self.l_model.text(item.row(), 0)
         name, ext = file_name_and_ext(file)
         name = new_name or name
-        dest = self.r_table.cellWidget(rights[i].row(), 0).text()
-        dest_name = normal_join(dest, name + ext)
-
-        if os.path.exists(dest_name):
-          os.rename(dest_name, dest_name + '.bak')
-
-        shutil.move(file, dest_name)
+        dest = self.r_model.text(rights[i].row(), 0)
+        moves.append((file, normal_join(dest, name + ext)))
 
-      lefts.reverse()
-      for item in lefts:
-        self.l_table.removeRow(item.row())
-
-      self.status.setText('完成！')
+      rows = sorted([item.row() for item in lefts], reverse = True)
+      job = Job(move_job, moves, kind = JobKind.IO, owner = self)
+      job.finished.connect(lambda _: self.remove_moved(rows))
 
     elif idx == 1:
       self.parse_excel_data()
-      self.thread = Worker(self.c_left.files)
-      self.thread.updated.connect(self.match_content)
-      self.thread.start()
-
-    elif idx == 2:
-      self.expanded = False
-      self.toggle_file_tree()
-      result = self.collect_files()
       self.cur = 0
-      self.thread = Worker2(result)
-      self.thread.updated.connect(self.mark_done)
-      self.thread.start()
-
-  def mark_done(self, i: int, j: int):
-    self.cur += 1
-    item = self.file_tree.topLevelItem(i)
-    child = item.child(j)
-    child.setText(2, '√')
+      job = Job(ocr_job, self.c_left.files, clip = self.parse_clip(), owner = self)
+      job.progress.connect(each(self.match_content))
 
+    elif idx == 2:
+      if self.catalog_job:
+        self.status.setText('读取目录中，请稍后...')
+        return
+
+      # 执行前在后台同步目录的变化，完成后再复制，树中显示的即为要复制的文件
+      if self.catalog:
+        self.status.setText('同步目录中...')
+        self.start_catalog_job(refresh = True, then = self.start_copy)
+      else:
+        self.start_copy()
+
+    if job:
+      bind_status(job, self.status)
+      JOBS.start(job)
+
+  def start_copy(self):
+    self.expanded = False
+    self.toggle_file_tree()
+    self.render_file_tree()
+    self.cur = 0
+    job = Job(copy_job, self.result, kind = JobKind.IO, owner = self)
+    job.progress.connect(self.mark_done)
+    bind_status(job, self.status)
+    JOBS.start(job)
+
+  def remove_moved(self, rows: List[int]):
+    self.l_model.remove_rows(rows)
+
+    self.status.setText('完成！')
+
+  def mark_done(self, items: List[tuple]):
+    item = None
+    child = None
+    j = 0
+
+    for i, j in items:
+      self.cur += 1
+      item = self.file_tree.topLevelItem(i)
+      child = item.child(j)
+      child.setText(2, '√')
+
+    # 每批只滚动一次
     if item.child(j + 1):
       self.file_tree.scrollToItem(item.child(j + 1))
     else:
@@ -276,77 +350,50 @@ class FileWidget(QWidget):
 
   def parse_excel_data(self):
     data: str = self.cur_config['粘贴 Excel 数据'] or ''
-    rule: str = self.cur_config['命名规则'].strip()
-    self.excel_data = [line.split('\t') for line in data.strip().split('\n')]
-
-    token = ''
-    rules = []
-    for ch in rule:
-      if ch == '{':
-        if token:
-          rules.append(token)
-          token = ''
-      elif ch == '}':
-        rules.append(int(token))
-        token = ''
-      else:
-        token += ch
+    self.excel_data = parse_table(data, self.cur_config['跳过第一行'])
+    self.rules = parse_name_rule(self.cur_config['命名规则'] or '')
+
+  def parse_clip(self):
+    clip: str = (self.cur_config['识别区域'] or '').strip()
+
+    if not clip:
+      return None
 
-    if token:
-      rules.append(token)
+    try:
+      vals = [float(val) for val in clip.replace('，', ',').split(',')]
+    except ValueError:
+      return None
 
-    self.rules = rules
+    if len(vals) != 4:
+      return None
+
+    return tuple(vals)
 
   def match_content(self, r: int, content: str):
+    self.cur += 1
     self.l_table.selectRow(r)
-    self.status.setText(f'{r + 1}/{len(self.c_left.files)}')
+    self.status.setText(f'{self.cur}/{len(self.c_left.files)}')
 
     config = self.cur_config
-    pattern = re.compile(config['需要识别的内容'])
-    result = re.search(pattern, content)
+    file = self.c_left.files[r]
+    matched, new_name = content_new_name(file, content, config['需要识别的内容'], self.excel_data,
+                                         config['使用第几列数据进行匹配'], self.rules,
+                                         )
 
-    if config['跳过第一行']:
-      rows = self.excel_data[1:]
+    if matched is None:
+      self.l_model.set_cell(r, 1, '未识别到相关信息，请手动重命名')
     else:
-      rows = self.excel_data[:]
-
-    if result:
-      i = config['使用第几列数据进行匹配']
-      matched = result.group()
-      in_list = None
-      self.l_table.setCellWidget(r, 1, QLabel(matched))
-
-      for row in rows:
-        if row[i] in matched:
-          in_list = row
-          break
-
-      if in_list is not None:
-        file = self.c_left.files[r]
-        file_name, _ = file_name_and_ext(file)
-        new_name = ''
-
-        for rule in self.rules:
-          if isinstance(rule, int):
-            new_name += in_list[rule]
-          else:
-            new_name += rule
-
-        new_name = file.replace(file_name, new_name)
+      self.l_model.set_cell(r, 1, matched)
+
+      if new_name:
         os.rename(file, new_name)
-        self.l_table.setCellWidget(r, 2, QLabel(f'重名为：{new_name}'))
+        self.l_model.set_cell(r, 2, f'重名为：{new_name}')
       else:
-        self.l_table.setCellWidget(r, 2, QLabel('无法匹配，请手动重命名'))
-
-    else:
-      self.l_table.setCellWidget(r, 1, QLabel('未识别到相关信息，请手动重命名'))
-
-    self.l_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-    self.l_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
+        self.l_model.set_cell(r, 2, '无法匹配，请手动重命名')
 
   def clear(self):
-    self.l_table.setRowCount(0)
-    self.r_table.setRowCount(0)
+    self.l_model.clear()
+    self.r_model.clear()
 
   def toggle_file_tree(self):
     self.expanded = not self.expanded
@@ -358,36 +405,40 @@ class FileWidget(QWidget):
       self.file_tree.collapseAll()
 
 
-class Worker(QThread):
-  updated = Signal(int, str)
+def move_job(job: Job, moves: List[tuple]):
+  for i, (file, dest_name) in enumerate(moves):
+    if os.path.exists(dest_name):
+      os.rename(dest_name, dest_name + '.bak')
 
-  def __init__(self, files: List[str], page = 0):
-    super().__init__()
-    self.files = files
-    self.page = page
+    shutil.move(file, dest_name)
+    job.report(i)
 
-  def run(self):
-    for r, file in enumerate(self.files):
-      content = ocr_pdf(file, self.page)
-      self.updated.emit(r, content)
 
+def ocr_job(job: Job, files: List[str], page = 0, workers: int = None, clip = None):
+  # 先识别完的先处理，有文字层的直接读取
+  for r, content in ocr_pdfs(files, page, workers = workers, clip = clip):
+    job.report(r, content)
 
-class Worker2(QThread):
-  updated = Signal(int, int)
 
-  def __init__(self, result: List[Any]):
-    super().__init__()
-    self.result = result
+def copy_job(job: Job, result: List[Any]):
+  for r, item in enumerate(result):
+    out: str = item['out']
+
+    if not os.path.exists(out):
+      os.mkdir(out)
+
+    for j, file in enumerate(item['files']):
+      dst = normal_path(os.path.join(out, file['name']))
+      shutil.copyfile(file['src'], dst)
+      job.report(r, j)
 
-  def run(self):
-    for r, item in enumerate(self.result):
-      out: str = item['out']
 
-      if not os.path.exists(out):
-        os.mkdir(out)
+def catalog_job(job: Job, catalog: FileCatalog, refresh = False):
+  """
+  读取或刷新目录索引
+  :return: 重新读取的目录数
+  """
+  if refresh:
+    return catalog.refresh(job)
 
-      for j, file in enumerate(item['files']):
-        dst = normal_path(os.path.join(out, file['name']))
-        shutil.copyfile(file['src'], dst)
-        self.updated.emit(r, j)
-        time.sleep(0.03)
+  return len(catalog.scan(job).dirs)
@@ -1,14 +1,20 @@
 import os.path
-import time
 from typing import List
 
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt
 from PySide6.QtWidgets import (QCheckBox, QComboBox, QHBoxLayout,
-                               QHeaderView, QLabel, QPushButton, QSplitter, QTableWidget, QVBoxLayout, )
+                               QHeaderView, QLabel, QPushButton, QSplitter, QTableView, QVBoxLayout, )
 
 from ui.drag import DragDropWidget
-from ui.helper import clear_layout, Status
-from util import correct_img_orient, correct_pdf_orient, excel_2_pdf, file_2_type, find_files, img_2_pdf, word_2_pdf
+from ui.helper import clear_layout
+from ui.job import bind_status, Job, JobKind, JOBS, Priority
+from ui.model import DONE, TableModel
+from util.common import file_2_type
+from util.convert import office_2_pdf
+from util.image import img_2_pdf
+from util.ocr import correct_img_orient, correct_pdf_orient
+from util.office import excel_2_pdf, word_2_pdf
+from util.scan import FileIndex
 
 
 class FolderBatchWidget(DragDropWidget):
@@ -29,21 +35,29 @@ class FolderBatchWidget(DragDropWidget):
     },
     'Excel'     : {
       'tran_fun': [None, excel_2_pdf],
-      'exts'    : [['.xls', True], ['.xlxs', True]]
+      'exts'    : [['.xls', True], ['.xlsx', True]]
     },
   }
 
   folders = []
 
-  matched_files = []
-
   def __init__(self):
     super().__init__()
 
-    self.thread = None
+    # 拖入目录时扫描一次，之后切换操作、文件类型、递归都从索引中筛选
+    self.index: FileIndex | None = None
+    self.scan_job: Job | None = None
+    # 扫描期间修改了筛选条件，扫描结束后重新筛选
+    self.dirty = False
+    self.recur_flag = QCheckBox('递归')
+    self.status = QLabel()
     self.file_type_layout = QVBoxLayout()
-    self.folder_table = QTableWidget()
-    self.file_table = QTableWidget()
+    self.folder_table = QTableView()
+    self.folder_model = TableModel(['目录'])
+    self.file_table = QTableView()
+    self.file_model = TableModel(['原文件', '新文件', '状态'])
+    # 与 file_model 的行一一对应
+    self.tran_funs = []
     self.funcs_select = QComboBox()
     self.init_ui()
 
@@ -56,12 +70,10 @@ class FolderBatchWidget(DragDropWidget):
     header.addWidget(self.funcs_select)
     header.addStretch()
 
-    self.folder_table.setColumnCount(1)
-    self.folder_table.setHorizontalHeaderLabels(['目录'])
+    self.folder_table.setModel(self.folder_model)
     self.folder_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
 
-    self.file_table.setColumnCount(3)
-    self.file_table.setHorizontalHeaderLabels(['原文件', '新文件', '状态'])
+    self.file_table.setModel(self.file_model)
     self.file_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
     self.file_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
     self.file_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
@@ -69,10 +81,12 @@ class FolderBatchWidget(DragDropWidget):
 
     footer = QHBoxLayout()
     ok_btn = QPushButton('执行')
-    recur_flag = QCheckBox('递归')
-    recur_flag.setChecked(True)
+    stop_btn = QPushButton('停止')
+    self.recur_flag.setChecked(True)
     footer.addStretch()
-    footer.addWidget(recur_flag)
+    footer.addWidget(self.status)
+    footer.addWidget(self.recur_flag)
+    footer.addWidget(stop_btn)
     footer.addWidget(ok_btn)
 
     splitter = QSplitter(Qt.Vertical)
@@ -87,7 +101,10 @@ class FolderBatchWidget(DragDropWidget):
     self.setLayout(layout)
 
     self.funcs_select.currentIndexChanged.connect(self.show_file_type)
+    self.funcs_select.currentIndexChanged.connect(lambda _: self.update_file_table())
+    self.recur_flag.stateChanged.connect(lambda _: self.update_file_table())
     ok_btn.pressed.connect(self.exec_fun)
+    stop_btn.pressed.connect(lambda: JOBS.cancel(self))
     self.dropped.connect(self.update_table)
     self.funcs_select.setCurrentIndex(1)
 
@@ -115,67 +132,132 @@ class FolderBatchWidget(DragDropWidget):
     self.update_file_table()
 
   def update_folder_table(self, folders):
-    self.folder_table.setRowCount(0)
-    self.folder_table.setRowCount(len(folders))
+    self.folder_model.set_rows([[os.path.normpath(folder) for folder in folders]])
+
+  def wanted_exts(self):
+    """
+    当前操作下勾选的扩展名及对应的转换函数
+    """
+    op_idx = self.funcs_select.currentIndex()
+    wanted = { }
+
+    for file_type in self.op_file_types[op_idx]:
+      config = self.file_type_map[file_type]
+
+      for ext, checked in config['exts']:
+        if checked:
+          wanted[ext] = config['tran_fun'][op_idx]
+
+    return wanted
+
+  def add_file_rows(self, files: List[tuple]):
+    """
+    :param files: [(路径, 扩展名), ...]
+    """
+    wanted = self.wanted_exts()
+    self.tran_funs += [wanted[ext] for _, ext in files]
+    self.file_model.append_rows([[os.path.normpath(file) for file, _ in files],
+                                 [file_2_type(file) for file, _ in files],
+                                 ['待执行'] * len(files)]
+                                )
+
+  def start_scan(self):
+    if self.scan_job:
+      self.scan_job.cancel()
+
+    self.index = None
+    self.dirty = False
+    self.tran_funs = []
+    self.file_model.clear()
+    self.file_table.show()
+    self.status.setText('扫描中...')
+
+    exts = [ext for config in self.file_type_map.values() for ext, _ in config['exts']]
+    job = Job(scan_job, self.folders[:], exts, kind = JobKind.IO, priority = Priority.HIGH, owner = self)
+    job.progress.connect(self.add_scanned)
+    job.finished.connect(lambda index, cur = job: self.scan_done(cur, index))
+    bind_status(job, self.status)
+    self.scan_job = JOBS.start(job)
+
+  def add_scanned(self, items: List[tuple]):
+    if self.dirty:
+      return
+
+    wanted = self.wanted_exts()
+    rec = self.recur_flag.isChecked()
+    self.add_file_rows([(file, ext) for _, (file, ext, top) in items if ext in wanted and (rec or top)])
+    self.status.setText(f'扫描中：{self.file_model.rowCount()} 个')
+
+  def scan_done(self, job: Job, index: FileIndex):
+    # 已被新的扫描取代
+    if job is not self.scan_job:
+      return
+
+    self.index = index
 
-    for r, folder in enumerate(folders):
-      self.folder_table.setCellWidget(r, 0, QLabel(os.path.normpath(folder)))
+    if self.dirty:
+      self.update_file_table()
+
+    self.status.setText(f'共 {self.file_model.rowCount()} 个')
 
   def update_file_table(self):
     if len(self.folders) == 0:
       return
 
-    self.file_table.setRowCount(0)
-    self.file_table.show()
-
-    self.matched_files = []
-    op_idx = self.funcs_select.currentIndex()
+    if self.index is None:
+      self.dirty = True
+      return
 
-    for file_type in self.op_file_types[op_idx]:
-      config = self.file_type_map.get(file_type)
-      exts = config['exts']
-      tran_fun = config['tran_fun'][op_idx]
-      filters = [f'**/*{ext[0]}' for ext in exts if ext[1]]
-      for file in find_files(self.folders, filters):
-        self.matched_files.append({
-          'name'    : os.path.normpath(file),
-          'new_name': file_2_type(file),
-          'status'  : '待执行',
-          'tran_fun': tran_fun
-        }
-        )
-
-    self.file_table.setRowCount(len(self.matched_files))
-
-    for r, matched in enumerate(self.matched_files):
-      self.file_table.setCellWidget(r, 0, QLabel(matched['name']))
-      self.file_table.setCellWidget(r, 1, QLabel(matched['new_name']))
-      self.file_table.setCellWidget(r, 2, QLabel(matched['status']))
+    self.tran_funs = []
+    self.file_model.clear()
+    self.file_table.show()
+    self.add_file_rows(self.index.files(self.wanted_exts(), self.recur_flag.isChecked()))
+    self.status.setText(f'共 {self.file_model.rowCount()} 个')
 
   def exec_fun(self):
-    self.thread = Worker(self.matched_files[:])
-    self.thread.updated.connect(self.update_file_table_status)
-    self.thread.start()
+    items = list(zip(self.file_model.column(0), self.file_model.column(1), self.tran_funs))
+    job = Job(batch_job, items, kind = JobKind.IO, owner = self)
+    job.progress.connect(self.update_file_table_status)
+    job.finished.connect(lambda _: self.status.setText('完成！'))
+    bind_status(job, self.status)
+    JOBS.start(job)
 
-  def update_file_table_status(self, r):
-    self.file_table.setCellWidget(r, 2, Status(True))
+  def update_file_table_status(self, items: List[tuple]):
+    self.file_model.set_cells(2, [(r, DONE if error is None else f'失败：{error}') for r, error in items])
+
+    r = items[-1][0]
     self.file_table.selectRow(r)
+    self.status.setText(f'{r + 1}/{self.file_model.rowCount()}')
 
   def update_table(self, folders: List[str]):
     self.folders = folders
     self.update_folder_table(self.folders)
-    self.update_file_table()
+    self.start_scan()
 
 
-class Worker(QThread):
-  updated = Signal(int)
+def scan_job(job: Job, folders: List[str], exts: List[str]):
+  return FileIndex(exts).scan(folders, lambda seq, file, ext, top: job.report(seq, (file, ext, top)))
 
-  def __init__(self, items):
-    super().__init__()
-    self.items = items
 
-  def run(self):
-    for (r, item) in enumerate(self.items):
-      item['tran_fun'](item['name'], item['new_name'])
-      time.sleep(0.03)
-      self.updated.emit(r)
+def batch_job(job: Job, items: List[tuple]):
+  """
+  Word、Excel 在常驻的转换进程中同时转换，其余文件依次执行
+  进度为 (行, 错误信息)，成功时错误信息为 None
+  :param items: [(原文件, 新文件, 转换函数), ...]
+  """
+  office = [r for r, (_, _, tran_fun) in enumerate(items) if tran_fun in (word_2_pdf, excel_2_pdf)]
+
+  for j, error in office_2_pdf([items[r][:2] for r in office]):
+    job.report(office[j], error)
+
+  for r, (name, new_name, tran_fun) in enumerate(items):
+    if tran_fun in (word_2_pdf, excel_2_pdf):
+      continue
+
+    try:
+      tran_fun(name, new_name)
+    except Exception as e:
+      job.report(r, f'{type(e).__name__}: {e}')
+      continue
+
+    job.report(r)
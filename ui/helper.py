@@ -1,9 +1,7 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, TypeVar
+from typing import List, TYPE_CHECKING, TypeVar
 
-import cv2
-from cv2.typing import MatLike
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QImage, QPixmap
 from PySide6.QtWidgets import (QCheckBox, QHBoxLayout, QLabel, QLineEdit, QPlainTextEdit, QPushButton,
@@ -11,8 +9,10 @@ from PySide6.QtWidgets import (QCheckBox, QHBoxLayout, QLabel, QLineEdit, QPlain
                                QVBoxLayout, QWidget,
                                )
 
-from ui.signal import NOTIFY
-from util import read_img
+if TYPE_CHECKING:
+  from cv2.typing import MatLike
+
+  from ui.signal import Channel
 
 
 class Status(QLabel):
@@ -66,6 +66,8 @@ class Field:
   default: T = None
 
   changed = Signal(T)
+  # 渲染时绑定所在页的通知，见 ui.signal.Channel
+  channel = None
 
   def set_val(self, val: T):
     if self.type == VarType.BOOL:
@@ -73,13 +75,15 @@ class Field:
     else:
       self.val = val
 
-    NOTIFY.field_updated.emit()
+    if self.channel:
+      self.channel.touch()
 
-  def render(self):
+  def render(self, channel: 'Channel' = None):
     label = QLabel(self.label + '：')
     val = self.val
     val_type = self.type
     control = QWidget()
+    self.channel = channel
     h = QHBoxLayout()
 
     if val is None:
@@ -127,7 +131,7 @@ class Fields:
     self.items.pop(i)
 
   @staticmethod
-  def render(fields: List[Field], i = None, vertical = False):
+  def render(fields: List[Field], i = None, vertical = False, channel: 'Channel' = None):
     widget = QWidget()
 
     if vertical:
@@ -138,7 +142,7 @@ class Fields:
     layout.setAlignment(Qt.AlignLeft)
 
     for field in fields:
-      label, control, h = field.render()
+      label, control, h = field.render(channel)
       layout.addLayout(h)
 
     if i is not None:
@@ -178,21 +182,25 @@ class Fields:
     return result
 
 
-def cv_2_qimage(image):
-  image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-  height, width, channel = image_rgb.shape
-  bytes_per_line = channel * width
-  q_image = QImage(image_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
+def cv_2_qimage(image: 'MatLike'):
+  # Qt 直接读取 BGR 与灰度数据，不需要为转换颜色导入 cv2
+  if not image.flags['C_CONTIGUOUS']:
+    image = image.copy()
+
+  height, width = image.shape[:2]
+  fmt = QImage.Format_Grayscale8 if image.ndim == 2 else QImage.Format_BGR888
+  q_image = QImage(image.data, width, height, image.strides[0], fmt)
   pixmap = QPixmap.fromImage(q_image)
 
   return pixmap
 
 
-def read_img_as_qt_thumb(image: str | MatLike, size = (300, 300)):
+def read_img_as_qt_thumb(image: 'str | MatLike', size = (300, 300)):
   if isinstance(image, str):
-    image = read_img(image)
+    pixmap = QPixmap(image)
+  else:
+    pixmap = cv_2_qimage(image)
 
-  pixmap = cv_2_qimage(image)
   thumbnail = pixmap.scaled(size[0], size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
   label = QLabel()
   label.setPixmap(thumbnail)
@@ -1,24 +1,30 @@
 import os.path
-from typing import Any, List
+from typing import List
 
-from cv2.typing import MatLike
-from PySide6.QtCore import QThread, Signal
-from PySide6.QtWidgets import QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableWidget, QVBoxLayout, QWidget
+from PySide6.QtCore import QSize, Qt
+from PySide6.QtGui import QImage
+from PySide6.QtWidgets import QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableView, QVBoxLayout
 
 from ui.drag import DragDropWidget
-from ui.helper import read_img_as_qt_thumb
-from util import (correct_img_orient, cv_img_2_pdf, file_name_and_ext, get_file_folder, img_bleach, merge_pdf,
-                  read_img, rotate_img, write_img,
-                  )
+from ui.job import bind_status, each, Job, JOBS, Priority
+from ui.model import ButtonsDelegate, DONE, TableModel
+from ui.thumb import THUMBS
+from util.chain import CHAIN_CACHE, merge_chains, Op, push_op, try_save_chain
+from util.common import file_2_type, file_name_and_ext, get_file_folder
+from util.pool import pool_map
 
 
 class ImageWidget(DragDropWidget):
   funcs = [{ 'name'  : '漂白',
-             'exec'  : '',
+             'exec'  : 'img_bleach',
              'config': { }
              },
            { 'name'  : '校正方向',
-             'exec'  : '',
+             'exec'  : 'correct_img_orient',
+             'config': { }
+             },
+           { 'name'  : '纠偏',
+             'exec'  : 'deskew_img',
              'config': { }
              },
            { 'name'  : '清晰增强',
@@ -42,17 +48,19 @@ class ImageWidget(DragDropWidget):
              'config': { }
              },
            { 'name'  : '减小文件大小',
-             'fun'   : '',
+             'exec'  : 'reduce_img',
              'config': { }
              }
            ]
-  last_images: List[MatLike] = []
-  rendered = False
+  # 每张图片的处理链，预览时在缩小的副本上执行，保存时才按原图执行
+  chains: List[tuple] = []
 
   def __init__(self):
     super().__init__()
 
-    self.table = QTableWidget()
+    self.table = QTableView()
+    self.model = TableModel(['原文件', '原图', '预览', '状态'])
+    self.rotate_btns = ButtonsDelegate(['顺时针', '逆时针'], self.table)
     self.config_layout = QVBoxLayout()
     self.status = QLabel()
     self.init_ui()
@@ -68,8 +76,12 @@ class ImageWidget(DragDropWidget):
       header.addWidget(btn)
     header.addStretch()
 
-    self.table.setColumnCount(4)
-    self.table.setHorizontalHeaderLabels(['原文件', '原图', '预览', '状态'])
+    self.table.setModel(self.model)
+    self.table.setItemDelegateForColumn(0, self.rotate_btns)
+    self.table.setIconSize(QSize(300, 240))
+    self.model.align[0] = Qt.AlignLeft | Qt.AlignTop
+    # 原图的缩略图滚动到可见时才加载
+    self.model.set_loader(1, lambda r, callback: THUMBS.request(self.files[r], callback))
     self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
     self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
     self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
@@ -77,13 +89,17 @@ class ImageWidget(DragDropWidget):
     self.table.verticalHeader().setDefaultSectionSize(250)
 
     h2 = QHBoxLayout()
+    undo = QPushButton('撤销')
     reset = QPushButton('重置')
     clear = QPushButton('清空')
     save = QPushButton('保存')
     save_as_pdf = QPushButton('转为 PDF')
     save_as_merge_pdf = QPushButton('合并为 PDF')
+    stop = QPushButton('停止')
     h2.addStretch()
     h2.addWidget(self.status)
+    h2.addWidget(stop)
+    h2.addWidget(undo)
     h2.addWidget(reset)
     h2.addWidget(clear)
     h2.addWidget(save)
@@ -95,138 +111,152 @@ class ImageWidget(DragDropWidget):
     layout.addWidget(self.table)
     layout.addLayout(h2)
 
+    undo.pressed.connect(self.undo_op)
     reset.pressed.connect(self.reset_ops)
     clear.pressed.connect(self.clear_table)
     save.pressed.connect(self.save_result)
     save_as_pdf.pressed.connect(self.save_pdf)
     save_as_merge_pdf.pressed.connect(self.save_merged_pdf)
+    stop.pressed.connect(lambda: JOBS.cancel(self))
+    self.rotate_btns.clicked.connect(lambda r, i: self.rotate_img(r, 90 if i == 0 else -90))
     self.dropped.connect(self.update_table)
     self.setLayout(layout)
 
   def reset_ops(self):
-    self.last_images = []
-    for r, file in enumerate(self.files):
-      self.last_images.append(read_img(file))
-      self.table.setCellWidget(r, 2, QLabel())
+    self.chains = [() for _ in self.files]
 
-  def save_pdf(self):
-    total = len(self.files)
+    for r in range(len(self.files)):
+      self.model.clear_icon(r, 2)
+
+  def undo_op(self):
+    self.chains = [ops[:-1] for ops in self.chains]
+    self.start_preview(range(len(self.files)))
+
+  def start_preview(self, rows):
+    rows = list(rows)
+
+    for r in rows:
+      if not self.chains[r]:
+        self.model.clear_icon(r, 2)
+
+    rows = [r for r in rows if self.chains[r]]
 
-    for r, image in enumerate(self.last_images):
-      cv_img_2_pdf(self.files[r], image)
-      self.table.selectRow(r)
-      self.table.setCellWidget(r, 3, QLabel('√'))
-      self.status.setText(f'{r + 1}/{total}')
+    if not rows:
+      return
+
+    job = Job(preview_job, self.files[:], [self.chains[r] for r in rows], rows, priority = Priority.HIGH, owner = self)
+    job.progress.connect(each(self.preview_result))
+    bind_status(job, self.status)
+    JOBS.start(job)
+
+  def start_save_job(self, fn):
+    job = Job(fn, self.files[:], self.chains[:], owner = self)
+    job.progress.connect(self.mark_done)
+    bind_status(job, self.status)
+    JOBS.start(job)
+
+    return job
+
+  def mark_done(self, items: List[tuple]):
+    self.model.set_cells(3, [(r, DONE if error is None else f'失败：{error}') for r, (_, error) in items])
+
+    r, (count, _) = items[-1]
+    self.table.selectRow(r)
+    self.status.setText(f'{count}/{len(self.files)}')
+
+  def save_pdf(self):
+    self.start_save_job(pdf_job)
 
   def save_merged_pdf(self):
     self.status.setText('合并中，请稍后...')
-    pdf_files = []
-    for r, image in enumerate(self.last_images):
-      pdf_files.append(cv_img_2_pdf(self.files[r], image))
-    merge_pdf(pdf_files, del_raw = True)
-    self.status.setText('合并完成！')
+    job = self.start_save_job(merged_pdf_job)
+    job.finished.connect(lambda _: self.status.setText('合并完成！'))
 
   def preview_op(self, name: str):
-    fn = None
-
-    if name == '漂白':
-      fn = img_bleach
-    elif name == '校正方向':
-      fn = correct_img_orient
-    else:
-      pass
+    fn = next((fun.get('exec') for fun in self.funcs if fun['name'] == name), None)
 
     if not fn:
       return
 
-    last_images = self.last_images[:]
-    self.last_images = []
-    self.thread = Worker(last_images, fn, name)
-    self.thread.updated.connect(self.preview_result)
-    self.thread.start()
+    op = Op(fn)
+    self.chains = [push_op(ops, op) for ops in self.chains]
+    self.start_preview(range(len(self.files)))
 
   def save_result(self):
-    total = len(self.files)
-
-    for r, image in enumerate(self.last_images):
-      out = get_file_folder(self.files[r])
-      name, ext = file_name_and_ext(self.files[r])
-      new_name = f'{out}/{name}-new{ext}'
-      write_img(image, os.path.normpath(new_name))
-
-      self.table.selectRow(r)
-      self.table.setCellWidget(r, 3, QLabel('√'))
-      self.status.setText(f'{r + 1}/{total}')
+    self.start_save_job(save_job)
 
   def clear_table(self):
     self.files = []
-    self.rendered = False
-    self.last_images = []
-    self.table.setRowCount(0)
+    self.chains = []
+    self.model.clear()
     self.status.setText('')
 
   def update_table(self, files: List[str] = None):
-    self.table.setRowCount(0)
-    self.table.setRowCount(len(self.files))
-
-    if files is not None:
-      self.rendered = False
-      self.last_images = []
-
-    for r, file in enumerate(self.files):
-      widget = QWidget()
-      layout = QVBoxLayout()
-      widget.setLayout(layout)
-
-      op_layout = QHBoxLayout()
-      layout.addWidget(QLabel(file))
-      layout.addLayout(op_layout)
-      l_btn = QPushButton('顺时针')
-      r_btn = QPushButton('逆时针')
-      op_layout.addWidget(l_btn)
-      op_layout.addWidget(r_btn)
-
-      l_btn.pressed.connect(lambda x = r: self.rotate_img(x, 90))
-      r_btn.pressed.connect(lambda x = r: self.rotate_img(x, -90))
-
-      self.table.setCellWidget(r, 0, widget)
-      self.table.setCellWidget(r, 3, QLabel('待执行'))
-
-    if not self.rendered:
-      self.thread = Worker(self.files)
-      self.thread.updated.connect(self.preview_result)
-      self.thread.start()
-      self.rendered = True
+    size = len(self.files)
+    self.model.set_rows([self.files, [''] * size, [''] * size, ['待执行'] * size])
+
+    if files is not None or len(self.chains) != len(self.files):
+      self.chains = [() for _ in self.files]
 
+    self.start_preview(range(len(self.files)))
     self.status.setText(f'共 {len(self.files)} 个')
 
   def rotate_img(self, r: int, angle: float):
-    self.last_images[r] = rotate_img(self.last_images[r], angle)
-    self.table.setCellWidget(r, 2, read_img_as_qt_thumb(self.last_images[r]))
+    self.chains[r] = push_op(self.chains[r], Op.of('rotate_img', angle = angle))
+    self.start_preview([r])
+
+  def preview_result(self, r: int, data: tuple):
+    ops, image, resolved = data
+
+    # 预览期间又修改了处理链，结果已过时
+    if r >= len(self.chains) or self.chains[r] not in (ops, resolved):
+      return
+
+    # 记下检测出的方向、角度，保存时不用在原图上重新检测
+    self.chains[r] = resolved
 
-  def preview_result(self, r: int, image: MatLike, col: bool):
-    self.last_images.append(image)
-    self.table.setCellWidget(r, col + 1, read_img_as_qt_thumb(image))
+    # 无法读取的图片显示为 无法预览
+    if image is None:
+      self.model.icon_setter(r, 2)(QImage())
+    else:
+      THUMBS.request(image, self.model.icon_setter(r, 2))
     self.table.selectRow(r)
     self.status.setText(f'{r + 1}/{len(self.files)}')
 
 
-class Worker(QThread):
-  updated = Signal(int, Any, bool)
+def preview_job(job: Job, files: List[str], chains: List[tuple], rows: List[int]):
+  for r, ops in zip(rows, chains):
+    try:
+      image, resolved = CHAIN_CACHE.run(files[r], ops)
+    except (OSError, ValueError) as e:
+      print(f'预览失败：{e}')
+      image, resolved = None, ops
+
+    job.report(r, (ops, image, resolved))
+
+
+def save_chains(job: Job, files: List[str], chains: List[tuple], outs: List[str]):
+  """
+  在进程池中按原图执行每张图片的处理链并保存，逐行报告 (已完成的张数, 错误信息)
+  """
+  for count, (r, error) in enumerate(pool_map(try_save_chain, list(zip(files, chains, outs))), 1):
+    job.report(r, (count, error))
+
+
+def pdf_job(job: Job, files: List[str], chains: List[tuple]):
+  save_chains(job, files, chains, [file_2_type(file) for file in files])
+
+
+def merged_pdf_job(job: Job, files: List[str], chains: List[tuple]):
+  return merge_chains(files, chains, callback = lambda r, count: job.report(r, (count, None)))
 
-  def __init__(self, files, func = None, fun_name: str = None):
-    super().__init__()
-    self.files = files
-    self.func = func
-    self.fun_name = fun_name
-    self.col = func is not None
 
-  def run(self):
-    for r, image in enumerate(self.files):
-      if isinstance(image, str):
-        image = read_img(image)
+def save_job(job: Job, files: List[str], chains: List[tuple]):
+  outs = []
 
-      if self.func:
-        image = self.func(image)
+  for file in files:
+    out = get_file_folder(file)
+    name, ext = file_name_and_ext(file)
+    outs.append(os.path.normpath(f'{out}/{name}-new{ext}'))
 
-      self.updated.emit(r, image, self.col)
+  save_chains(job, files, chains, outs)
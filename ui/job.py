@@ -0,0 +1,186 @@
+import os
+import threading
+import traceback
+from enum import Enum, IntEnum
+from typing import Any, Callable, List
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+from PySide6.QtWidgets import QLabel
+
+
+# 进度每秒最多推送到界面的次数
+PROGRESS_HZ = 20
+
+
+class Priority(IntEnum):
+  LOW = 0
+  NORMAL = 5
+  # 预览等需要马上看到结果的任务
+  HIGH = 10
+
+
+class JobKind(Enum):
+  # 读写文件、调用 Office 等，主要在等待
+  IO = 1
+  # 渲染、识别等，耗时的部分会再交给 util.process_pool
+  CPU = 2
+
+
+class JobCancelled(Exception):
+  pass
+
+
+class Job(QObject):
+  """
+  fn(job, *args, **kwargs) 在后台线程执行，通过 job.report 汇报进度，取消后 job.report / job.check 会抛出 JobCancelled
+  信号在界面线程接收：progress([(序号, 数据), ...])、finished(结果)、failed(错误信息)、cancelled()
+  进度先攒在 job 中，由 JobEngine 按 PROGRESS_HZ 成批推送，结束前会推送完剩余的进度
+  """
+  progress = Signal(list)
+  finished = Signal(object)
+  failed = Signal(str)
+  cancelled = Signal()
+  # 后台线程结束时发出，由 JobEngine 转为上面的信号
+  done = Signal(str, object)
+
+  def __init__(self, fn: Callable, *args, kind = JobKind.CPU, priority = Priority.NORMAL, owner: Any = None,
+               **kwargs,
+               ):
+    super().__init__()
+
+    self.fn = fn
+    self.args = args
+    self.kwargs = kwargs
+    self.kind = kind
+    self.priority = priority
+    self.owner = owner
+    self.stopped = False
+    self.pending = []
+    self.lock = threading.Lock()
+
+  def cancel(self):
+    self.stopped = True
+
+  def check(self):
+    if self.stopped:
+      raise JobCancelled()
+
+  def report(self, i: int, data: Any = None):
+    self.check()
+
+    with self.lock:
+      self.pending.append((i, data))
+
+  def flush(self):
+    with self.lock:
+      items = self.pending
+      self.pending = []
+
+    if items:
+      self.progress.emit(items)
+
+  def run(self):
+    if self.stopped:
+      self.done.emit('cancelled', None)
+      return
+
+    try:
+      result = self.fn(self, *self.args, **self.kwargs)
+    except JobCancelled:
+      self.done.emit('cancelled', None)
+    except Exception as e:
+      traceback.print_exc()
+      self.done.emit('failed', str(e))
+    else:
+      self.done.emit('finished', result)
+
+
+class JobRunnable(QRunnable):
+  def __init__(self, job: Job):
+    super().__init__()
+    self.job = job
+
+  def run(self):
+    self.job.run()
+
+
+class JobEngine(QObject):
+  """
+  IO 与 CPU 任务分别放入有上限的线程池，按优先级执行
+  """
+
+  def __init__(self, io_threads = 4, cpu_threads: int = None):
+    super().__init__()
+
+    self.pools = {
+      JobKind.IO : QThreadPool(),
+      JobKind.CPU: QThreadPool(),
+    }
+    self.pools[JobKind.IO].setMaxThreadCount(io_threads)
+    self.pools[JobKind.CPU].setMaxThreadCount(cpu_threads or max(2, (os.cpu_count() or 2) // 2))
+    self.jobs: List[Job] = []
+    self.timer = None
+
+  def start(self, job: Job):
+    """
+    先连接好 job 的信号再调用，避免漏掉
+    """
+    if self.timer is None:
+      self.timer = QTimer(self)
+      self.timer.setInterval(1000 // PROGRESS_HZ)
+      self.timer.timeout.connect(self.flush)
+
+    self.jobs.append(job)
+    job.done.connect(lambda state, payload, cur = job: self.on_done(cur, state, payload))
+    self.timer.start()
+    self.pools[job.kind].start(JobRunnable(job), int(job.priority))
+
+    return job
+
+  def flush(self):
+    for job in self.jobs[:]:
+      job.flush()
+
+  def on_done(self, job: Job, state: str, payload: Any):
+    job.flush()
+
+    if job in self.jobs:
+      self.jobs.remove(job)
+
+    if not self.jobs:
+      self.timer.stop()
+
+    if state == 'finished':
+      job.finished.emit(payload)
+    elif state == 'failed':
+      job.failed.emit(payload)
+    else:
+      job.cancelled.emit()
+
+  def cancel(self, owner: Any = None):
+    for job in self.jobs:
+      if owner is None or job.owner is owner:
+        job.cancel()
+
+  def running(self, owner: Any = None):
+    return any(owner is None or job.owner is owner for job in self.jobs)
+
+
+def each(fn: Callable[[int, Any], None]):
+  """
+  将逐条处理进度的函数转为接收一批进度
+  """
+
+  def handle(items: List[tuple]):
+    for i, data in items:
+      fn(i, data)
+
+  return handle
+
+
+def bind_status(job: Job, status: QLabel):
+  job.failed.connect(lambda msg: status.setText(f'执行失败：{msg}'))
+  job.cancelled.connect(lambda: status.setText('已停止'))
+
+
+JOBS = JobEngine()
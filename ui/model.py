@@ -0,0 +1,276 @@
+import bisect
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+from PySide6.QtCore import QAbstractTableModel, QEvent, QModelIndex, QRect, Qt, QTimer, Signal
+from PySide6.QtGui import QColor, QImage, QPixmap
+from PySide6.QtWidgets import QApplication, QStyle, QStyledItemDelegate, QStyleOptionButton
+
+DONE = '√'
+# 加载中的图标
+LOADING = object()
+
+
+class TableModel(QAbstractTableModel):
+  """
+  按列保存的表格数据，视图只绘制可见的行，不再为每个单元格创建 QLabel
+  修改状态时按连续的行发出 dataChanged，整列相同的文字（如 待执行）共用同一个字符串
+  """
+
+  def __init__(self, headers: List[str], parent = None):
+    super().__init__(parent)
+
+    self.headers = headers
+    self.columns: List[List[str]] = [[] for _ in headers]
+    self.align: Dict[int, Qt.AlignmentFlag] = { }
+    # (行, 列) -> QPixmap，None 表示无法预览
+    self.icons: Dict[tuple, QPixmap | None] = { }
+    self.tokens: Dict[tuple, object] = { }
+    # 列 -> (loader, 最多保留的图标数)，可见时才调用 loader(行, 回调) 加载
+    self.loaders: Dict[int, tuple] = { }
+    self.lazy: OrderedDict[tuple, None] = OrderedDict()
+
+  def rowCount(self, parent = QModelIndex()):
+    return 0 if parent.isValid() else len(self.columns[0])
+
+  def columnCount(self, parent = QModelIndex()):
+    return 0 if parent.isValid() else len(self.headers)
+
+  def headerData(self, section: int, orientation: Qt.Orientation, role = Qt.DisplayRole):
+    if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+      return self.headers[section]
+
+    return super().headerData(section, orientation, role)
+
+  def data(self, index: QModelIndex, role = Qt.DisplayRole):
+    if not index.isValid():
+      return None
+
+    r, c = index.row(), index.column()
+    key = (r, c)
+
+    if role == Qt.DecorationRole:
+      if c in self.loaders and key not in self.icons and key not in self.tokens:
+        self.load_icon(r, c)
+
+      icon = self.icons.get(key)
+
+      if icon is not None and key in self.lazy:
+        self.lazy.move_to_end(key)
+
+      return icon
+
+    if role in (Qt.DisplayRole, Qt.ToolTipRole):
+      if key in self.tokens:
+        return '加载中...'
+
+      if key in self.icons:
+        return '无法预览' if self.icons[key] is None and role == Qt.DisplayRole else None
+
+      return self.columns[c][r]
+
+    if role == Qt.ForegroundRole and self.columns[c][r] == DONE:
+      return QColor('green')
+
+    if role == Qt.TextAlignmentRole and c in self.align:
+      return self.align[c]
+
+    return None
+
+  def column(self, c: int):
+    return self.columns[c]
+
+  def text(self, r: int, c: int):
+    return self.columns[c][r]
+
+  def set_rows(self, columns: List[List[str]]):
+    """
+    替换全部数据
+    :param columns: 每列的数据，与 headers 一一对应
+    """
+    self.beginResetModel()
+    self.columns = [list(column) for column in columns]
+    self.icons.clear()
+    self.tokens.clear()
+    self.lazy.clear()
+    self.endResetModel()
+
+  def append_rows(self, columns: List[List[str]]):
+    count = len(columns[0])
+
+    if not count:
+      return
+
+    start = self.rowCount()
+    self.beginInsertRows(QModelIndex(), start, start + count - 1)
+
+    for column, values in zip(self.columns, columns):
+      column += values
+
+    self.endInsertRows()
+
+  def clear(self):
+    self.set_rows([[] for _ in self.headers])
+
+  def set_cells(self, c: int, items: List[tuple]):
+    """
+    修改一列中的多行，连续的行只发出一次 dataChanged
+    :param items: [(行, 值), ...]
+    """
+    column = self.columns[c]
+
+    for r, val in items:
+      column[r] = val
+
+    for start, end in row_ranges(sorted(r for r, _ in items)):
+      self.dataChanged.emit(self.index(start, c), self.index(end, c))
+
+  def set_cell(self, r: int, c: int, val: str):
+    self.set_cells(c, [(r, val)])
+
+  def remove_rows(self, rows: List[int]):
+    """
+    删除多行，图标按新的行号移动
+    """
+    removed = sorted(set(rows))
+
+    for start, end in reversed(list(row_ranges(removed))):
+      self.beginRemoveRows(QModelIndex(), start, end)
+
+      for column in self.columns:
+        del column[start:end + 1]
+
+      self.endRemoveRows()
+
+    rows = set(removed)
+
+    def shift(r: int):
+      return r - bisect.bisect_left(removed, r)
+
+    # 按需加载的图标直接丢弃，显示时重新加载
+    self.icons = { (shift(r), c): icon for (r, c), icon in self.icons.items()
+                   if (r, c) not in self.lazy and r not in rows
+                   }
+    self.lazy.clear()
+    self.tokens.clear()
+
+  def set_loader(self, c: int, loader: Callable[[int, Callable[[QImage], None]], None], keep = 200):
+    """
+    第 c 列的图标在可见时才加载，超过 keep 个时释放最久未显示的，再次显示时重新加载
+    :param loader: loader(行, 回调)，加载完调用 回调(QImage)
+    """
+    self.loaders[c] = (loader, keep)
+
+  def load_icon(self, r: int, c: int):
+    key = (r, c)
+    self.tokens[key] = LOADING
+
+    def load():
+      # 期间表格已重置
+      if self.tokens.get(key) is LOADING:
+        self.loaders[c][0](r, self.icon_setter(r, c))
+
+    # 绘制期间不修改数据，之后再加载
+    QTimer.singleShot(0, self, load)
+
+  def icon_setter(self, r: int, c: int):
+    """
+    返回设置 (r, c) 图标的回调，之后又请求了该单元格或重置了表格时，回调失效
+    """
+    token = object()
+    key = (r, c)
+    self.tokens[key] = token
+
+    def set_icon(image: QImage):
+      if self.tokens.get(key) is not token:
+        return
+
+      del self.tokens[key]
+      self.icons[key] = None if image.isNull() else QPixmap.fromImage(image)
+
+      if c in self.loaders:
+        self.lazy[key] = None
+
+        while len(self.lazy) > self.loaders[c][1]:
+          old, _ = self.lazy.popitem(last = False)
+          self.icons.pop(old, None)
+
+      index = self.index(r, c)
+      self.dataChanged.emit(index, index)
+
+    return set_icon
+
+  def clear_icon(self, r: int, c: int):
+    key = (r, c)
+    self.tokens.pop(key, None)
+
+    if self.icons.pop(key, False) is not False:
+      index = self.index(r, c)
+      self.dataChanged.emit(index, index)
+
+
+def row_ranges(rows: List[int]):
+  """
+  有序的行号合并为连续的区间 (开始, 结束)
+  """
+  start = end = None
+
+  for r in rows:
+    if start is None:
+      start = end = r
+    elif r == end + 1:
+      end = r
+    elif r != end:
+      yield start, end
+      start = end = r
+
+  if start is not None:
+    yield start, end
+
+
+class ButtonsDelegate(QStyledItemDelegate):
+  """
+  在单元格文字下方绘制一排按钮，点击时发出 clicked(行, 第几个按钮)，不用为每行创建按钮控件
+  """
+  clicked = Signal(int, int)
+
+  def __init__(self, labels: List[str], parent = None, width = 80, height = 28, gap = 6):
+    super().__init__(parent)
+
+    self.labels = labels
+    self.width = width
+    self.height = height
+    self.gap = gap
+
+  def button_rects(self, rect: QRect):
+    top = rect.bottom() - self.height - self.gap
+
+    return [QRect(rect.left() + self.gap + i * (self.width + self.gap), top, self.width, self.height)
+            for i in range(len(self.labels))]
+
+  def paint(self, painter, option, index: QModelIndex):
+    super().paint(painter, option, index)
+    style = QApplication.style()
+
+    for label, rect in zip(self.labels, self.button_rects(option.rect)):
+      button = QStyleOptionButton()
+      button.rect = rect
+      button.text = label
+      button.state = QStyle.State_Enabled | QStyle.State_Raised
+      style.drawControl(QStyle.CE_PushButton, button, painter)
+
+  def sizeHint(self, option, index: QModelIndex):
+    size = super().sizeHint(option, index)
+    size.setWidth(max(size.width(), len(self.labels) * (self.width + self.gap) + self.gap))
+    size.setHeight(size.height() + self.height + self.gap * 2)
+
+    return size
+
+  def editorEvent(self, event: QEvent, model: Any, option, index: QModelIndex):
+    if event.type() == QEvent.MouseButtonRelease:
+      for i, rect in enumerate(self.button_rects(option.rect)):
+        if rect.contains(event.position().toPoint()):
+          self.clicked.emit(index.row(), i)
+          return True
+
+    return super().editorEvent(event, model, option, index)
@@ -1,18 +1,32 @@
-import time
-from typing import Any, List
+import os
+from dataclasses import dataclass
+from functools import partial
+from typing import List
 
 from cv2.typing import MatLike
-from PySide6.QtCore import QThread, Signal
-from PySide6.QtWidgets import (QComboBox, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTreeWidget, QTreeWidgetItem,
-                               QVBoxLayout,
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, Qt
+from PySide6.QtGui import QColor
+from PySide6.QtWidgets import (QComboBox, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTreeView, QTreeWidget,
+                               QTreeWidgetItem, QVBoxLayout,
                                )
 
 from ui.drag import DragDropWidget
-from ui.helper import (clear_all_children, clear_layout, Field, Fields, read_img_as_qt_thumb, VarType)
+from ui.helper import (clear_all_children, clear_layout, Field, Fields, VarType)
+from ui.job import bind_status, each, Job, JobKind, JOBS, Priority
+from ui.model import DONE, row_ranges
 from ui.signal import get_tab_idx, NOTIFY
-from util import (extract_name, extract_pdf, get_pdf_page, get_rotate_angle, list_at, merge_pdf, pdf_2_image,
-                  rotate_img, rotate_pdf, split_name, split_pdf,
-                  )
+from ui.thumb import THUMBS
+from util.common import list_at
+from util.compress import compress_pdf, COMPRESS_PROFILE, CompressProfile
+from util.ocr import get_rotate_angle
+from util.pdf import (extract_name, get_pdf_page, merge_pdf, PDF_META, rotate_pdf, split_count, split_part, split_pdf,
+                      split_pdf_parts,
+                      )
+from util.render import render_pdf
+from util.rotate import rotate_img
+
+# 分割份数达到该值时才启用进程池，避免进程启动开销大于收益
+POOL_MIN_PARTS = 64
 
 
 def regular_config():
@@ -29,6 +43,162 @@ def un_regular_config():
   ]
 
 
+@dataclass
+class SplitFile:
+  file: str
+  pages: int
+  step: int
+  new_name: str
+  # 每份是否已写出
+  done: bytearray
+
+  @property
+  def count(self):
+    return split_count(self.pages, self.step)
+
+
+class SplitTreeModel(QAbstractItemModel):
+  """
+  规则分割的预览树，顶层为文件，子节点为分割出的每一份
+  只保存每个文件的 (页数, 每份页数, 新文件名)，子节点的文件名在显示时才计算，
+  视图只会请求展开且可见的行，修改每份页数时只增删差额的行
+  """
+
+  def __init__(self, headers: List[str], parent = None):
+    super().__init__(parent)
+
+    self.headers = headers
+    self.files: List[SplitFile] = []
+
+  # 子节点的 internalId 为所属文件的行号 + 1，顶层为 0
+  def index(self, row: int, column: int, parent = QModelIndex()):
+    if not self.hasIndex(row, column, parent):
+      return QModelIndex()
+
+    return self.createIndex(row, column, parent.row() + 1 if parent.isValid() else 0)
+
+  def parent(self, index: QModelIndex):
+    if not index.isValid() or index.internalId() == 0:
+      return QModelIndex()
+
+    return self.createIndex(index.internalId() - 1, 0, 0)
+
+  def rowCount(self, parent = QModelIndex()):
+    if not parent.isValid():
+      return len(self.files)
+
+    if parent.internalId() == 0 and parent.column() == 0:
+      return self.files[parent.row()].count
+
+    return 0
+
+  def columnCount(self, parent = QModelIndex()):
+    return len(self.headers)
+
+  def headerData(self, section: int, orientation: Qt.Orientation, role = Qt.DisplayRole):
+    if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+      return self.headers[section]
+
+    return None
+
+  def data(self, index: QModelIndex, role = Qt.DisplayRole):
+    if not index.isValid() or role not in (Qt.DisplayRole, Qt.ForegroundRole):
+      return None
+
+    c = index.column()
+
+    if index.internalId() == 0:
+      item = self.files[index.row()]
+
+      if role == Qt.DisplayRole and c == 0:
+        return f'{item.file} - {item.pages} 页 {item.count} 份'
+
+      return None
+
+    item = self.files[index.internalId() - 1]
+    j = index.row()
+
+    if role == Qt.ForegroundRole:
+      return QColor('green') if c == 4 and item.done[j] else None
+
+    if c == 0:
+      i = j * item.step
+      return split_part(item.file, i, item.pages, item.step, new_name = item.new_name)['full']
+
+    if c == 4:
+      return DONE if item.done[j] else '待执行'
+
+    return None
+
+  def set_files(self, files: List[tuple]):
+    """
+    :param files: [(文件, 页数, 每份页数, 新文件名), ...]，文件不变时只更新修改过的行
+    :return: 是否重建了整棵树
+    """
+    if [item.file for item in self.files] != [file for file, *_ in files]:
+      self.beginResetModel()
+      self.files = [SplitFile(file, pages, step, new_name, bytearray(split_count(pages, step)))
+                    for file, pages, step, new_name in files]
+      self.endResetModel()
+      return True
+
+    for r, (_, pages, step, new_name) in enumerate(files):
+      self.update_file(r, pages, step, new_name)
+
+    return False
+
+  def update_file(self, r: int, pages: int, step: int, new_name: str):
+    item = self.files[r]
+
+    if (item.pages, item.step, item.new_name) == (pages, step, new_name):
+      return
+
+    parent = self.index(r, 0)
+    old = item.count
+    new = split_count(pages, step)
+
+    if new < old:
+      self.beginRemoveRows(parent, new, old - 1)
+    elif new > old:
+      self.beginInsertRows(parent, old, new - 1)
+
+    item.pages, item.step, item.new_name = pages, step, new_name
+    item.done = bytearray(new)
+
+    if new < old:
+      self.endRemoveRows()
+    elif new > old:
+      self.endInsertRows()
+
+    self.dataChanged.emit(parent, self.index(r, len(self.headers) - 1))
+
+    # 只通知一个区间，视图只重新读取可见的行
+    if min(old, new):
+      self.dataChanged.emit(self.index(0, 0, parent), self.index(min(old, new) - 1, len(self.headers) - 1, parent))
+
+  def total(self):
+    return sum(item.count for item in self.files)
+
+  def child(self, r: int, j: int):
+    return self.index(j, 0, self.index(r, 0))
+
+  def mark_done(self, items: List[tuple]):
+    """
+    :param items: [(文件的行号, 第几份), ...]
+    """
+    rows = { }
+
+    for r, j in items:
+      self.files[r].done[j] = 1
+      rows.setdefault(r, []).append(j)
+
+    for r, js in rows.items():
+      parent = self.index(r, 0)
+
+      for start, end in row_ranges(sorted(js)):
+        self.dataChanged.emit(self.index(start, 4, parent), self.index(end, 4, parent))
+
+
 class PDFWidget(DragDropWidget):
   config_map = {
     '规则分割'  : Fields('规则分割', [regular_config()]),
@@ -36,7 +206,11 @@ class PDFWidget(DragDropWidget):
     '合并'      : Fields('合并', [
       Field(label = '新文件名', hint = '默认名为：merged-年月日时分秒')],
                          ),
-    '校正方向'  : Fields('校正方向', [Field(label = '基准页', type = VarType.NUM, val = 1)])
+    '校正方向'  : Fields('校正方向', [Field(label = '基准页', type = VarType.NUM, val = 1)]),
+    '减小文件大小': Fields('减小文件大小', [
+      Field(label = '分辨率', type = VarType.NUM, val = COMPRESS_PROFILE.dpi),
+      Field(label = '质量', type = VarType.NUM, val = COMPRESS_PROFILE.quality)],
+                           ),
   }
 
   files: List[str] = []
@@ -47,11 +221,15 @@ class PDFWidget(DragDropWidget):
 
   def __init__(self):
     super().__init__()
-    self.thread = None
+    self.notify = NOTIFY.channel(0)
+    self.preview_job = None
     self.config_layout = QVBoxLayout()
     self.funcs = QComboBox()
     self.add_btn = QPushButton('增加')
     self.file_tree = QTreeWidget()
+    # 规则分割的预览树，可能有上万个子节点，使用按需计算的模型
+    self.split_tree = QTreeView()
+    self.split_model = SplitTreeModel(['原文件', '配置', '缩略', '预览', '状态'])
     self.status = QLabel()
     self.init_ui()
 
@@ -59,7 +237,7 @@ class PDFWidget(DragDropWidget):
     layout = QVBoxLayout()
 
     h = QHBoxLayout()
-    self.funcs.addItems(['规则分割', '不规则分割', '合并', '校正方向'])
+    self.funcs.addItems(['规则分割', '不规则分割', '合并', '校正方向', '减小文件大小'])
     h.addWidget(self.funcs)
     h.addWidget(self.add_btn)
     h.addStretch()
@@ -67,32 +245,57 @@ class PDFWidget(DragDropWidget):
     self.file_tree.setColumnCount(5)
     self.file_tree.setHeaderLabels(['原文件', '配置', '缩略', '预览', '状态'])
     self.file_tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
+    self.split_tree.setModel(self.split_model)
+    # 行高相同时不用逐行计算行高，定位、滚动与子节点数量无关
+    self.split_tree.setUniformRowHeights(True)
+    self.split_tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
+    # 只按可见的行计算列宽
+    self.split_tree.header().setResizeContentsPrecision(0)
 
     h2 = QHBoxLayout()
     ok = QPushButton('执行')
     clear = QPushButton('清空')
+    stop = QPushButton('停止')
     h2.addStretch()
     h2.addWidget(self.status)
+    h2.addWidget(stop)
     h2.addWidget(clear)
     h2.addWidget(ok)
 
     layout.addLayout(h)
     layout.addLayout(self.config_layout)
     layout.addWidget(self.file_tree)
+    layout.addWidget(self.split_tree)
     layout.addLayout(h2)
 
     self.funcs.currentIndexChanged.connect(self.update_config_ui)
     self.add_btn.pressed.connect(self.add_field)
     ok.pressed.connect(self.exe_fun)
     clear.pressed.connect(self.clear_files)
-    self.dropped.connect(self.update_table)
-    NOTIFY.field_updated.connect(self.update_table)
-    NOTIFY.extracted_pdf.connect(self.mark_extract_done)
+    stop.pressed.connect(lambda: JOBS.cancel(self))
+    self.dropped.connect(self.load_files)
+    self.notify.updated.connect(self.update_table)
 
     self.update_config_ui()
     self.update_table()
     self.setLayout(layout)
 
+  def load_files(self, files: List[str]):
+    self.file_tree.clear()
+    self.files = files
+    pdf_files = [file for file in files if '.pdf' in file]
+
+    # 后台读取页数等信息，读完再渲染，避免界面线程逐个打开文件
+    job = Job(meta_job, pdf_files, kind = JobKind.IO, priority = Priority.HIGH, owner = self)
+    job.progress.connect(lambda items: self.status.setText(f'读取文件信息：{items[-1][0] + 1}/{len(pdf_files)}'))
+    job.finished.connect(self.meta_loaded)
+    bind_status(job, self.status)
+    JOBS.start(job)
+
+  def meta_loaded(self, _ = None):
+    self.status.setText('')
+    self.update_table()
+
   def add_field(self, idx = None):
     fields = self.cur_config_fields()
 
@@ -100,7 +303,7 @@ class PDFWidget(DragDropWidget):
       fields.append(un_regular_config())
       idx = fields.size() - 1
 
-    widget = Fields.render(fields.get_item(idx), idx)
+    widget = Fields.render(fields.get_item(idx), idx, channel = self.notify)
     btn = widget.findChild(QPushButton)
     btn.pressed.connect(lambda: self.field_change(idx))
 
@@ -121,6 +324,8 @@ class PDFWidget(DragDropWidget):
     if clear_table:
       self.clear_files()
     self.add_btn.hide()
+    self.split_tree.setVisible(idx == 0)
+    self.file_tree.setVisible(idx != 0)
 
     if idx != 0:
       if idx == 1:
@@ -129,10 +334,10 @@ class PDFWidget(DragDropWidget):
         for i in range(fields.size()):
           self.add_field(i)
       else:
-        self.config_layout.addWidget(Fields.render(fields.items))
+        self.config_layout.addWidget(Fields.render(fields.items, channel = self.notify))
 
   def update_table(self, files: List[str] = None):
-    if get_tab_idx() != 0:
+    if get_tab_idx() != self.notify.tab:
       return
 
     if files:
@@ -145,9 +350,10 @@ class PDFWidget(DragDropWidget):
     fun_name = self.funcs.currentText()
 
     if fun_name == '规则分割':
+      fields = self.cur_config_fields()
+      rows = []
+
       for r, file in enumerate(files):
-        item = self.file_tree.topLevelItem(r)
-        fields = self.cur_config_fields()
         items = list_at(fields.items, r)
 
         if not items:
@@ -155,27 +361,19 @@ class PDFWidget(DragDropWidget):
           fields.append(items)
 
         config = Fields.get_val(items)
+        rows.append((file, get_pdf_page(file), max(1, config['页数'] or 1), config['新文件名']))
 
-        if not item:
-          item = QTreeWidgetItem(self.file_tree)
-          self.file_tree.setItemWidget(item, 1, Fields.render(items))
+      # 文件不变时只增删差额的行，配置控件保留，正在输入的内容不会丢失
+      if self.split_model.set_files(rows):
+        for r in range(len(rows)):
+          widget = Fields.render(fields.items[r], channel = self.notify)
+          # 去掉边距，与文字行等高
+          widget.layout().setContentsMargins(0, 0, 0, 0)
+          self.split_tree.setIndexWidget(self.split_model.index(r, 1), widget)
 
-        # Perf：解决渲染过慢的问题
-        item.setExpanded(False)
-        page_num = get_pdf_page(file)
-        output_files = split_name(file, config['页数'], e = page_num, new_name = config['新文件名'])
-        first_child = item.child(0)
-        item.setText(0, f'{file} - {page_num} 页 {len(output_files)} 份')
-        self.total += len(output_files)
-
-        if not first_child or first_child.text(0) != output_files[0]:
-          clear_all_children(item)
-          for out_file in output_files:
-            child = QTreeWidgetItem(item)
-            child.setText(0, out_file)
-            child.setText(4, '待执行')
+        self.split_tree.expandToDepth(0)
 
-        item.setExpanded(True)
+      self.total = self.split_model.total()
     else:
       self.file_tree.clear()
       vals = self.cur_config_fields().get_vals()
@@ -206,29 +404,53 @@ class PDFWidget(DragDropWidget):
       elif fun_name == '校正方向':
         val = vals[0]
         page_num = val['基准页'] - 1
-        self.last_images = []
-        self.angles = []
+        self.last_images = [None] * len(self.files)
+        self.angles = [0.0] * len(self.files)
 
-        for i, file in enumerate(self.files):
+        for i in range(len(self.files)):
           tree_item = self.file_tree.topLevelItem(i)
-          pdf_img = pdf_2_image(file, page_num)
-          self.last_images.append(pdf_2_image(file, page_num, reset_angle = True))
-          self.angles.append(0.0)
-          self.file_tree.setItemWidget(tree_item, 2, read_img_as_qt_thumb(pdf_img))
           tree_item.setText(3, '校正中...')
           tree_item.setText(4, '待执行')
 
-        self.thread2 = Worker2(self.last_images)
-        self.thread2.updated.connect(self.preview_pdf)
-        self.thread2.start()
+        if self.preview_job:
+          self.preview_job.cancel()
+
+        job = Job(orient_render_job, self.files, page_num, priority = Priority.HIGH, owner = self)
+        job.progress.connect(each(self.show_pdf_thumb))
+        job.finished.connect(self.detect_orient)
+        bind_status(job, self.status)
+        self.preview_job = JOBS.start(job)
+      elif fun_name == '减小文件大小':
+        for i in range(len(self.files)):
+          self.file_tree.topLevelItem(i).setText(4, '待执行')
+
+  def show_pdf_thumb(self, i: int, images):
+    tree_item = self.file_tree.topLevelItem(i)
+
+    if tree_item is None:
+      return
+
+    pdf_img, preview_img = images
+    self.last_images[i] = preview_img
+    self.file_tree.setItemWidget(tree_item, 2, THUMBS.label(pdf_img))
+
+  def detect_orient(self, osd_images: List[MatLike]):
+    job = Job(orient_detect_job, osd_images, priority = Priority.HIGH, owner = self)
+    job.progress.connect(each(self.preview_pdf))
+    bind_status(job, self.status)
+    self.preview_job = JOBS.start(job)
 
   def preview_pdf(self, i: int, angle: float = 0.0):
     tree_item = self.file_tree.topLevelItem(i)
+
+    if tree_item is None:
+      return
+
     image = self.last_images[i]
     rotated_img = rotate_img(image, angle)
 
     self.angles[i] = angle
-    self.file_tree.setItemWidget(tree_item, 3, read_img_as_qt_thumb(rotated_img))
+    self.file_tree.setItemWidget(tree_item, 3, THUMBS.label(rotated_img))
 
   def parse_range(self, pdf_file: str):
     vals = self.cur_config_fields().get_vals()
@@ -261,16 +483,28 @@ class PDFWidget(DragDropWidget):
 
     return result
 
-  def mark_extract_done(self, i: int, j: int):
-    self.cur += 1
-    item = self.file_tree.topLevelItem(i)
-    child = item.child(j)
-    child.setText(4, '√')
+  def mark_split_done(self, items: List[tuple]):
+    self.cur += len(items)
+    self.split_model.mark_done(items)
+    r, j = items[-1]
+    # 每批只滚动一次
+    self.split_tree.scrollTo(self.split_model.child(r, min(j + 1, self.split_model.files[r].count - 1)))
+    self.status.setText(f'{self.cur}/{self.total}')
+
+  def mark_extract_done(self, items: List[tuple]):
+    item = None
+    j = 0
+
+    for i, j in items:
+      self.cur += 1
+      item = self.file_tree.topLevelItem(i)
+      item.child(j).setText(4, '√')
 
+    # 每批只滚动一次
     if item.child(j + 1):
       self.file_tree.scrollToItem(item.child(j + 1))
     else:
-      self.file_tree.scrollToItem(child)
+      self.file_tree.scrollToItem(item.child(j))
 
     self.status.setText(f'{self.cur}/{self.total}')
 
@@ -279,63 +513,109 @@ class PDFWidget(DragDropWidget):
 
     return fields
 
+  def pool_size(self):
+    return (os.cpu_count() or 1) if self.total >= POOL_MIN_PARTS else 0
+
   def clear_files(self):
     self.files = []
     self.file_tree.clear()
+    self.split_model.set_files([])
     self.status.setText('')
 
+  def mark_compress_done(self, items: List[tuple]):
+    for i, report in items:
+      self.file_tree.topLevelItem(i).setText(4, str(report))
+
+    self.status.setText(f'{items[-1][0] + 1}/{len(self.files)}')
+
+  def mark_rotate_done(self, items: List[tuple]):
+    for i, _ in items:
+      self.file_tree.topLevelItem(i).setText(4, '√')
+
+    self.status.setText(f'{items[-1][0] + 1}/{len(self.files)}')
+
   def exe_fun(self):
+    self.notify.flush()
     self.cur = 0
     fields = self.cur_config_fields()
     fun_name = self.funcs.currentText()
+    job = None
 
     if fun_name == '规则分割':
       vals = [Fields.get_val(item) for item in fields.items]
-      self.thread = Worker(self.files, vals)
-      self.thread.start()
+      job = Job(split_job, self.files, vals, self.pool_size(), owner = self)
+      job.progress.connect(self.mark_split_done)
     elif fun_name == '不规则分割':
-      for i, file in enumerate(self.files):
-        metas = self.parse_range(file)
-        for j, meta in enumerate(metas):
-          extract_pdf(file, meta['s'], meta['e'], new_name = meta['new_name'])
-          self.mark_extract_done(i, j)
-          time.sleep(0.03)
+      metas = [self.parse_range(file) for file in self.files]
+      job = Job(split_job, self.files, metas, self.pool_size(), owner = self)
+      job.progress.connect(self.mark_extract_done)
     elif fun_name == '合并':
       self.status.setText('合并中，请稍后...')
       vals = fields.get_vals()
       val = vals[0]
-      merge_pdf(self.files, val['新文件名'])
-      self.status.setText('合并完成！')
+      job = Job(merge_job, self.files, val['新文件名'], self.pool_size(), owner = self)
+      job.progress.connect(lambda items: self.status.setText(f'合并中：{items[-1][0]}/{len(self.files)}'))
+      job.finished.connect(lambda _: self.status.setText('合并完成！'))
     elif fun_name == '校正方向':
-      for i, file in enumerate(self.files):
-        rotate_pdf(file, self.angles[i])
-        item = self.file_tree.topLevelItem(i)
-        item.setText(4, '√')
+      job = Job(rotate_job, self.files, self.angles[:], kind = JobKind.IO, owner = self)
+      job.progress.connect(self.mark_rotate_done)
+    elif fun_name == '减小文件大小':
+      val = fields.get_vals()[0]
+      profile = CompressProfile(dpi = int(val['分辨率']), quality = int(val['质量']))
+      job = Job(compress_job, self.files, profile, owner = self)
+      job.progress.connect(self.mark_compress_done)
     else:
       pass
 
+    if job:
+      bind_status(job, self.status)
+      JOBS.start(job)
 
-class Worker(QThread):
-  def __init__(self, files: List[str], configs: List):
-    super().__init__()
-    self.files = files
-    self.configs = configs
 
-  def run(self):
-    for r, file in enumerate(self.files):
-      config = self.configs[r]
-      split_pdf(file, config['页数'], new_name = config['新文件名'], r = r)
+def split_job(job: Job, files: List[str], configs: List, workers = 0):
+  for r, file in enumerate(files):
+    config = configs[r]
+    callback = partial(job.report, r)
 
+    # 不规则分割传入的是 parse_range 的结果
+    if isinstance(config, list):
+      split_pdf_parts(file, config, workers, callback)
+    else:
+      split_pdf(file, config['页数'], new_name = config['新文件名'], workers = workers, callback = callback)
 
-class Worker2(QThread):
-  updated = Signal(Any, int)
 
-  def __init__(self, images: List[MatLike]):
-    super().__init__()
-    self.images = images
+def merge_job(job: Job, files: List[str], new_name: str = None, workers = 0):
+  merge_pdf(files, new_name, workers = workers, callback = job.report)
+
+
+def rotate_job(job: Job, files: List[str], angles: List[float]):
+  for i, file in enumerate(files):
+    rotate_pdf(file, angles[i])
+    job.report(i)
+
+
+def compress_job(job: Job, files: List[str], profile: CompressProfile):
+  for i, file in enumerate(files):
+    report = compress_pdf(file, profile = profile, callback = lambda *_: job.check())
+    job.report(i, report)
+
+
+def meta_job(job: Job, files: List[str]):
+  PDF_META.prefetch(files, job.report)
+
+
+def orient_render_job(job: Job, files: List[str], page = 0):
+  osd_images = []
+
+  for i, file in enumerate(files):
+    # 一次渲染同时得到缩略图、预览图和方向识别用的灰度图
+    pdf_img, preview_img, osd_img = render_pdf(file, page, 'thumbnail', 'preview', 'osd')
+    osd_images.append(osd_img)
+    job.report(i, (pdf_img, preview_img))
+
+  return osd_images
+
 
-  def run(self):
-    for i, image in enumerate(self.images):
-      out = get_rotate_angle(image)
-      self.updated.emit(i, out['rotate'])
-      time.sleep(0.03)
+def orient_detect_job(job: Job, images: List[MatLike]):
+  for i, image in enumerate(images):
+    job.report(i, get_rotate_angle(image)['rotate'])
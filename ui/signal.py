@@ -1,9 +1,62 @@
-from PySide6.QtCore import QObject, Signal
+from typing import Dict
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+# 最后一次修改后等待该毫秒数再通知，连续输入、连续点击数字框只重新计算一次
+DEBOUNCE_MS = 200
+
+
+class Channel(QObject):
+  """
+  某一页的字段修改通知，只有该页的字段会触发
+  一段时间内的多次修改合并为一次 updated，该页不可见时推迟到切换回该页
+  """
+  updated = Signal()
+
+  def __init__(self, tab: int, delay = DEBOUNCE_MS):
+    super().__init__()
+
+    self.tab = tab
+    self.pending = False
+    self.timer = QTimer(self)
+    self.timer.setSingleShot(True)
+    self.timer.setInterval(delay)
+    self.timer.timeout.connect(self.flush)
+
+  def touch(self):
+    self.pending = True
+
+    if TAB_IDX == self.tab:
+      self.timer.start()
+
+  def shown(self):
+    if self.pending:
+      self.timer.start(0)
+
+  def flush(self):
+    """
+    立即发出推迟的通知，执行前调用，保证界面与字段一致
+    """
+    self.timer.stop()
+
+    if not self.pending or TAB_IDX != self.tab:
+      return
+
+    self.pending = False
+    self.updated.emit()
 
 
 class Notify(QObject):
-  field_updated = Signal()
-  extracted_pdf = Signal(int, int)
+  def __init__(self):
+    super().__init__()
+
+    self.channels: Dict[int, Channel] = { }
+
+  def channel(self, tab: int):
+    if tab not in self.channels:
+      self.channels[tab] = Channel(tab)
+
+    return self.channels[tab]
 
 
 NOTIFY = Notify()
@@ -14,6 +67,10 @@ def update_tab_idx(idx: int):
   global TAB_IDX
 
   TAB_IDX = idx
+  channel = NOTIFY.channels.get(idx)
+
+  if channel:
+    channel.shown()
 
 
 def get_tab_idx():
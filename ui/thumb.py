@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import cv2
+import shiboken6
+from cv2.typing import MatLike
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QImage, QPixmap
+from PySide6.QtWidgets import QLabel
+
+from util.cache import CACHE_DIR, file_digest
+from util.image import fit_img, read_img_thumb
+from util.render import render_pdf
+
+THUMB_DIR = os.path.join(CACHE_DIR, 'thumbs')
+# 磁盘上的缩略图总大小上限，超过时删除最久未使用的，超过 THUMB_MAX_DAYS 天未使用的也删除
+THUMB_MAX_BYTES = 256 << 20
+THUMB_MAX_DAYS = 30
+# 每保存该数量的缩略图检查一次，启动后第一次保存时也检查
+PRUNE_EVERY = 200
+
+_saved = 0
+_saved_lock = threading.Lock()
+
+
+def cv_2_qimg(image: MatLike):
+  if image.ndim == 2:
+    height, width = image.shape
+    fmt = QImage.Format_Grayscale8
+  else:
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    height, width, _ = image.shape
+    fmt = QImage.Format_RGB888
+
+  # QImage 不持有 numpy 的内存，需要复制一份
+  return QImage(image.data, width, height, image.strides[0], fmt).copy()
+
+
+def make_thumb(source: str | MatLike, size = 300, page = 0):
+  if not isinstance(source, str):
+    return cv_2_qimg(fit_img(source, size))
+
+  name = f'{file_digest(source)}-{page}-{size}.jpg'
+  cached = os.path.join(THUMB_DIR, name)
+
+  if os.path.exists(cached):
+    image = QImage(cached)
+
+    if not image.isNull():
+      # 修改时间作为最近使用时间，清理时保留常用的
+      try:
+        os.utime(cached)
+      except OSError:
+        pass
+
+      return image
+
+  if source.lower().endswith('.pdf'):
+    image, = render_pdf(source, page, 'thumbnail')
+    image = fit_img(image, size)
+  else:
+    image = read_img_thumb(source, size)
+
+  if image is None:
+    return QImage()
+
+  q_image = cv_2_qimg(image)
+  os.makedirs(THUMB_DIR, exist_ok = True)
+  q_image.save(cached, 'JPG', 85)
+  saved()
+
+  return q_image
+
+
+def saved():
+  global _saved
+
+  with _saved_lock:
+    prune = _saved % PRUNE_EVERY == 0
+    _saved += 1
+
+  if prune:
+    prune_thumbs()
+
+
+def prune_thumbs(max_bytes = THUMB_MAX_BYTES, max_days = THUMB_MAX_DAYS):
+  """
+  删除超过 max_days 天未使用的缩略图，总大小仍超过 max_bytes 时按最近使用时间淘汰到上限的 90%
+  """
+  try:
+    with os.scandir(THUMB_DIR) as it:
+      files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in it if entry.is_file()]
+  except OSError:
+    return
+
+  expired = time.time() - max_days * 86400
+  total = sum(size for _, size, _ in files)
+  target = max_bytes * 0.9 if total > max_bytes else total
+
+  for mtime, size, path in sorted(files):
+    if mtime >= expired and total <= target:
+      break
+
+    try:
+      os.remove(path)
+      total -= size
+    except OSError:
+      pass
+
+
+class ThumbTask(QRunnable):
+  def __init__(self, service: 'ThumbService', seq: int, source: str | MatLike, size = 300, page = 0):
+    super().__init__()
+    self.service = service
+    self.seq = seq
+    self.source = source
+    self.size = size
+    self.page = page
+
+  def run(self):
+    try:
+      image = make_thumb(self.source, self.size, self.page)
+    except Exception as e:
+      print(f'生成缩略图失败：{e}')
+      image = QImage()
+
+    self.service.done.emit(self.seq, image)
+
+
+class ThumbService(QObject):
+  """
+  后台线程生成缩略图，文件来源的缩略图同时缓存在内存和 CACHE_DIR/thumbs 中
+  """
+  done = Signal(int, QImage)
+
+  def __init__(self, max_bytes = 64 << 20, threads: int = None):
+    super().__init__()
+
+    self.pool = QThreadPool()
+    self.pool.setMaxThreadCount(threads or max(2, (os.cpu_count() or 2) // 2))
+    self.max_bytes = max_bytes
+    self.size = 0
+    self.cache: OrderedDict[tuple, QImage] = OrderedDict()
+    self.pending: dict[int, tuple[tuple | None, Callable]] = { }
+    self.seq = 0
+    self.done.connect(self.on_done)
+
+  @staticmethod
+  def key(source: str | MatLike, size = 300, page = 0):
+    # 处理中的图片只是临时结果，不缓存
+    if not isinstance(source, str):
+      return None
+
+    try:
+      stat = os.stat(source)
+    except OSError:
+      return None
+
+    return os.path.normcase(os.path.abspath(source)), stat.st_size, stat.st_mtime_ns, page, size
+
+  def request(self, source: str | MatLike, callback: Callable[[QImage], None], size = 300, page = 0):
+    key = self.key(source, size, page)
+
+    if key is not None and key in self.cache:
+      self.cache.move_to_end(key)
+      callback(self.cache[key])
+      return
+
+    self.seq += 1
+    self.pending[self.seq] = (key, callback)
+    self.pool.start(ThumbTask(self, self.seq, source, size, page))
+
+  def on_done(self, seq: int, image: QImage):
+    key, callback = self.pending.pop(seq)
+
+    if key is not None and not image.isNull():
+      self.put(key, image)
+
+    callback(image)
+
+  def put(self, key: tuple, image: QImage):
+    # 同一缩略图同时请求了多次
+    old = self.cache.pop(key, None)
+
+    if old is not None:
+      self.size -= old.sizeInBytes()
+
+    self.cache[key] = image
+    self.size += image.sizeInBytes()
+
+    while self.size > self.max_bytes and len(self.cache) > 1:
+      _, old = self.cache.popitem(last = False)
+      self.size -= old.sizeInBytes()
+
+  def label(self, source: str | MatLike, size = 300, page = 0):
+    label = QLabel('加载中...')
+
+    def show(image: QImage):
+      # 表格可能已清空
+      if not shiboken6.isValid(label):
+        return
+
+      if image.isNull():
+        label.setText('无法预览')
+      else:
+        label.setPixmap(QPixmap.fromImage(image))
+
+    self.request(source, show, size, page)
+
+    return label
+
+
+THUMBS = ThumbService()
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# 启动参数带 --timing 或设置环境变量 LAYER_HELPER_TIMING=1 时，在标准错误输出各步骤耗时
+ENABLED = '--timing' in sys.argv or bool(os.environ.get('LAYER_HELPER_TIMING'))
+
+# 导入时会明显拖慢启动的依赖，计时时列出每一步新加载了哪些
+HEAVY_MODULES = ['cv2', 'fitz', 'numpy', 'pandas', 'scipy', 'pytesseract', 'docx', 'docxcompose', 'natsort',
+                 'win32com',
+                 ]
+
+
+class Timing:
+  """
+  记录启动过程中导入模块、创建界面等步骤的耗时
+  """
+
+  def __init__(self, enabled = ENABLED):
+    self.enabled = enabled
+    self.start = time.perf_counter()
+    self.records: List[Tuple[str, float]] = []
+
+  def add(self, label: str, seconds: float):
+    self.records.append((label, seconds))
+
+    if self.enabled:
+      print(f'[启动耗时] {label}：{seconds * 1000:.1f} ms', file = sys.stderr)
+
+  @contextmanager
+  def measure(self, label: str):
+    loaded = set(sys.modules)
+    start = time.perf_counter()
+
+    try:
+      yield
+    finally:
+      seconds = time.perf_counter() - start
+      heavy = [name for name in HEAVY_MODULES if name in sys.modules and name not in loaded]
+      self.add(f'{label}（加载 {'、'.join(heavy)}）' if heavy else label, seconds)
+
+  def mark(self, label: str):
+    """
+    记录从启动到现在的总耗时
+    """
+    self.add(label, time.perf_counter() - self.start)
+
+
+TIMING = Timing()
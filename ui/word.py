@@ -1,13 +1,17 @@
 import os.path
 from typing import List
 
-from PySide6.QtCore import QThread, Signal
-from PySide6.QtWidgets import QComboBox, QHBoxLayout, QLabel, QPushButton, QTableWidget, QVBoxLayout
+from PySide6.QtWidgets import QComboBox, QHBoxLayout, QLabel, QPushButton, QTableView, QVBoxLayout
 
 from ui.drag import DragDropWidget
 from ui.helper import clear_layout, Field, Fields
+from ui.job import bind_status, Job, JobKind, JOBS
+from ui.model import DONE, TableModel
 from ui.signal import get_tab_idx, NOTIFY
-from util import file_2_type, get_file_folder, merge_pdf, merge_word, normal_join, word_2_pdf
+from util.common import file_2_type, file_name_and_ext, get_file_folder, normal_join
+from util.convert import ConvertError, office_2_pdf
+from util.office import merge_word
+from util.pdf import merge_pdf
 
 
 class WordWidget(DragDropWidget):
@@ -20,7 +24,9 @@ class WordWidget(DragDropWidget):
   def __init__(self):
     super().__init__()
 
-    self.table = QTableWidget()
+    self.notify = NOTIFY.channel(1)
+    self.table = QTableView()
+    self.model = TableModel(['原文件', '输出', '状态'])
     self.config = QVBoxLayout()
     self.funcs = QComboBox()
     self.status = QLabel()
@@ -35,22 +41,24 @@ class WordWidget(DragDropWidget):
     header.addLayout(self.config)
     header.addStretch()
 
-    self.table.setColumnCount(3)
-    self.table.setHorizontalHeaderLabels(['原文件', '输出', '状态'])
+    self.table.setModel(self.model)
 
     footer = QHBoxLayout()
     clear = QPushButton('清空')
     exe = QPushButton('执行')
+    stop = QPushButton('停止')
     footer.addStretch()
     footer.addWidget(self.status)
+    footer.addWidget(stop)
     footer.addWidget(clear)
     footer.addWidget(exe)
 
     clear.pressed.connect(self.clear_table)
     exe.pressed.connect(self.exec_fun)
+    stop.pressed.connect(lambda: JOBS.cancel(self))
     self.funcs.currentIndexChanged.connect(self.update_config)
     self.dropped.connect(self.update_table)
-    NOTIFY.field_updated.connect(self.update_table)
+    self.notify.updated.connect(self.update_table)
 
     layout.addLayout(header)
     layout.addWidget(self.table)
@@ -61,7 +69,7 @@ class WordWidget(DragDropWidget):
   def update_config(self, files: List[str] = None):
     i = self.funcs.currentIndex()
     clear_layout(self.config)
-    self.config.addWidget(Fields.render(self.configs[i].items))
+    self.config.addWidget(Fields.render(self.configs[i].items, channel = self.notify))
     self.update_table()
 
   def clear_table(self):
@@ -69,16 +77,13 @@ class WordWidget(DragDropWidget):
     self.update_table()
 
   def update_table(self):
-    if get_tab_idx() != 1:
+    if get_tab_idx() != self.notify.tab:
       return
 
-    self.table.setRowCount(0)
-    self.table.setRowCount(len(self.files))
-
-    for r, file in enumerate(self.files):
-      self.table.setCellWidget(r, 0, QLabel(os.path.normpath(file)))
-      self.table.setCellWidget(r, 1, QLabel(file_2_type(file)))
-      self.table.setCellWidget(r, 2, QLabel('待执行'))
+    self.model.set_rows([[os.path.normpath(file) for file in self.files],
+                         [file_2_type(file) for file in self.files],
+                         ['待执行'] * len(self.files)]
+                        )
 
     self.status.setText(f'共 {len(self.files)} 个')
 
@@ -97,62 +102,76 @@ class WordWidget(DragDropWidget):
       self.status.setText(f'新文件名：{val['新文件名'] or '使用默认'}')
 
   def exec_fun(self):
+    self.notify.flush()
     i = self.funcs.currentIndex()
     val = self.configs[i].get_vals()[0]
     new_name = val['新文件名']
 
-    if i == 0 or i == 2:
-      self.thread = Worker(self.files)
-
-      if i == 2:
-        self.thread.new_name = 'temp'
-        self.status.setText('合并中，请稍后...')
-        self.thread.all_done.connect(self.merge_pdf)
+    job = None
 
-      self.thread.updated.connect(self.mark_done)
-      self.thread.start()
+    if i == 0:
+      job = Job(word_job, self.files[:], kind = JobKind.IO, owner = self)
+      job.progress.connect(self.mark_done)
+    elif i == 2:
+      self.status.setText('合并中，请稍后...')
+      job = Job(word_job, self.files[:], 'temp', new_name, kind = JobKind.IO, owner = self)
+      job.progress.connect(self.mark_done)
+      job.finished.connect(lambda _: self.status.setText('合并完成！'))
     elif i == 1:
       self.status.setText('合并中，请稍后...')
-      merge_word(self.files, new_name)
-      self.status.setText('合并完成！')
+      job = Job(merge_word_job, self.files[:], new_name, kind = JobKind.IO, owner = self)
+      job.finished.connect(lambda _: self.status.setText('合并完成！'))
     else:
       pass
 
-  def merge_pdf(self, pdf_files: List[str]):
-    i = self.funcs.currentIndex()
-    val = self.configs[i].get_vals()[0]
-    new_name = val['新文件名']
-    merge_pdf(pdf_files, new_name, True)
-    self.status.setText('合并完成！')
+    if job:
+      bind_status(job, self.status)
+      JOBS.start(job)
+
+  def mark_done(self, items: List[tuple]):
+    self.model.set_cells(2, [(r, DONE if error is None else f'失败：{error}') for r, error in items])
 
-  def mark_done(self, r: int):
-    self.table.setCellWidget(r, 2, QLabel('√'))
+    r = items[-1][0]
     self.status.setText(f'{r + 1}/{len(self.files)}')
     self.table.selectRow(r)
 
 
-class Worker(QThread):
-  updated = Signal(int)
-  all_done = Signal(list)
-  files: List[str]
+def word_job(job: Job, files: List[str], temp_name: str = None, merged_name: str = None):
+  """
+  在常驻的转换进程中同时转为 PDF，指定 temp_name 时转为临时文件并合并为 merged_name
+  进度为 (行, 错误信息)，成功时错误信息为 None
+  """
+  outs = [None] * len(files)
 
-  def __init__(self, files: List[str], new_name: str = None):
-    super().__init__()
-    self.files = files
-    self.new_name = new_name
+  if temp_name is not None:
+    outs = [normal_join(get_file_folder(file), f'{temp_name}-{r}.pdf') for r, file in enumerate(files)]
+
+  failed = 0
+  results = office_2_pdf(list(zip(files, outs)))
+
+  try:
+    for r, error in results:
+      failed += error is not None
+      job.report(r, error)
 
-  def run(self):
-    outs = []
+    if temp_name is not None:
+      if failed:
+        raise ConvertError(f'{failed} 个文件转换失败，未合并')
 
-    for r, file in enumerate(self.files):
-      new_name = self.new_name
+      titles = [file_name_and_ext(file)[0] for file in files]
+      merge_pdf(outs, merged_name, True, titles)
+  finally:
+    # 先结束仍在转换的文件，再删除失败、取消时留下的临时文件，合并成功时已由 merge_pdf 删除
+    results.close()
 
-      if new_name is not None:
-        out = get_file_folder(file)
-        new_name = normal_join(out, f'{new_name}-{r}.pdf')
-        outs.append(new_name)
+    for out in outs if temp_name is not None else []:
+      try:
+        os.remove(out)
+      except FileNotFoundError:
+        pass
+      except OSError as e:
+        print(f'删除临时文件失败：{e}')
 
-      word_2_pdf(file, new_name)
-      self.updated.emit(r)
 
-    self.all_done.emit(outs)
+def merge_word_job(job: Job, files: List[str], new_name: str = None):
+  merge_word(files, new_name)
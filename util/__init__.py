@@ -0,0 +1,65 @@
+# -*- encoding: utf-8 -*-
+"""
+按用途拆分的工具函数，`from util import xxx` 时才导入 xxx 所在的子模块
+命令行、进程池中的子进程只会加载实际用到的依赖（cv2、pandas、pytesseract、win32com 等）
+"""
+
+import importlib
+
+_MODULES = {
+  'common'  : ['list_at', 'make_dir', 'del_folder', 'get_file_name', 'file_name_and_ext', 'get_file_folder',
+               'file_2_type', 'normal_join', 'find_file', 'find_files', 'del_files', 'normal_path',
+               'filename_with_parent_dir', 'filter_file_by_glob', 'json_file_2_json', 'merge_name', 'parse_name_rule',
+               'parse_table', 'content_new_name',
+               ],
+  'data'    : ['parse_sfz', 'parse_date', 'format_date', 'excel_2_json', 'cal_fees', 'cal_fenqi'],
+  'scan'    : ['FileIndex', 'scan_files', 'CatalogFile', 'CatalogDir', 'GlobMatcher', 'FileCatalog'],
+  'pool'    : ['process_pool', 'pool_map', 'thread_pool'],
+  'cache'   : ['CACHE_DIR', 'file_digest', 'image_digest', 'ResultCache', 'RESULT_CACHE'],
+  'pdf'     : ['merge_pdf', 'save_pdf', 'extract_pdf', 'extract_name', 'split_count', 'split_part', 'split_parts',
+               'split_pdf_parts', 'split_pdf', 'PDFMeta', 'read_pdf_meta', 'PDFMetaCache', 'PDF_META', 'get_pdf_meta',
+               'get_pdf_page', 'split_name', 'page_clip', 'usable_text', 'pdf_text', 'rotate_pdf',
+               ],
+  'render'  : ['RenderProfile', 'RENDER_PROFILES', 'pixmap_2_image', 'pdf_2_image', 'render_pdf'],
+  'ocr'     : ['ocr_pdf', 'read_pdf_text', 'ocr_pdfs', 'OSD_CONFIG', 'get_rotate_angle', 'correct_img_orient',
+               'get_pdf_rotate_angle', 'correct_pdf_orient',
+               ],
+  'image'   : ['img_bleach', 'img_bleach_batch', 'float_convertor', 'resize_im', 'fit_img', 'read_img',
+               'read_img_proxy', 'read_img_thumb', 'write_img', 'JPEG_QUALITY', 'DEFAULT_DPI', 'encode_img', 'img_dpi',
+               'PAGE_INCHES', 'page_dpi', 'add_img_page', 'insert_img_file', 'insert_cv_img', 'img_2_pdf',
+               'cv_img_2_pdf',
+               ],
+  'rotate'  : ['MAX_SKEW', 'rotate_right', 'warp_img', 'rotate_img', 'get_skew_angle', 'deskew_img'],
+  'chain'   : ['PROXY_SIZE', 'Op', 'FUNCS', 'RESOLVERS', 'PIXEL_ARGS', 'push_op', 'lossless_angle', 'run_chain',
+               'compress_profile', 'chain_doc', 'chain_pdf_bytes', 'save_chain', 'try_save_chain', 'merge_chains',
+               'ChainCache', 'CHAIN_CACHE',
+               ],
+  'compress': ['CompressProfile', 'COMPRESS_PROFILE', 'SizeReport', 'page_mode', 'reduce_colors', 'downsample_img',
+               'reduce_img', 'compress_pdf',
+               ],
+  'convert' : ['WORD_EXTS', 'EXCEL_EXTS', 'OFFICE_EXTS', 'DOC_TIMEOUT', 'ConvertError', 'Converter',
+               'MSOfficeConverter', 'LibreOfficeConverter', 'BACKENDS', 'default_backend', 'OfficePool', 'office_pool',
+               'office_2_pdf',
+               ],
+  'office'  : ['word_2_pdf', 'excel_2_pdf', 'merge_word', 'split_word'],
+}
+
+_EXPORTS = { name: module for module, names in _MODULES.items() for name in names }
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+  module = _EXPORTS.get(name)
+
+  if module is None:
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+  value = getattr(importlib.import_module(f'{__name__}.{module}'), name)
+  globals()[name] = value
+
+  return value
+
+
+def __dir__():
+  return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,213 @@
+# -*- encoding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+
+# 缓存相关
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.layer_helper')
+
+# 命中的记录距上次使用超过该秒数才更新使用时间
+TOUCH_SECS = 600
+# 攒够该数量的命中、未命中次数再写入统计
+STATS_FLUSH = 100
+
+_digests: OrderedDict[tuple, str] = OrderedDict()
+_digests_lock = threading.Lock()
+
+
+def file_digest(file: str, chunk_size = 1 << 20):
+  stat = os.stat(file)
+  key = (os.path.normcase(os.path.abspath(file)), stat.st_size, stat.st_mtime_ns)
+
+  with _digests_lock:
+    digest = _digests.get(key)
+
+  if digest is not None:
+    return digest
+
+  h = hashlib.blake2b(digest_size = 20)
+
+  with open(file, 'rb') as f:
+    while chunk := f.read(chunk_size):
+      h.update(chunk)
+
+  digest = h.hexdigest()
+
+  with _digests_lock:
+    _digests[key] = digest
+
+    while len(_digests) > 4096:
+      _digests.popitem(last = False)
+
+  return digest
+
+
+def image_digest(image):
+  h = hashlib.blake2b(digest_size = 20)
+  h.update(str(image.shape).encode())
+  h.update(np.ascontiguousarray(image).data)
+
+  return h.hexdigest()
+
+
+class ResultCache:
+  """
+  基于 sqlite 的识别结果缓存，总大小超过 max_bytes 时淘汰最久未使用的记录
+  """
+
+  def __init__(self, path: str = None, max_bytes = 256 << 20):
+    self.path = path or os.path.join(CACHE_DIR, 'result_cache.sqlite3')
+    self.max_bytes = max_bytes
+    self.local = threading.local()
+    self.counts: Dict[str, int] = { }
+    self.lock = threading.Lock()
+
+  def conn(self):
+    conn = getattr(self.local, 'conn', None)
+
+    if conn is None:
+      os.makedirs(os.path.dirname(self.path), exist_ok = True)
+      # 多个识别进程同时读写
+      conn = sqlite3.connect(self.path, timeout = 30)
+      conn.execute('PRAGMA journal_mode = WAL')
+      conn.execute('CREATE TABLE IF NOT EXISTS result '
+                   '(kind TEXT, key TEXT, val TEXT, size INTEGER, used REAL, PRIMARY KEY (kind, key))'
+                   )
+      conn.execute('CREATE INDEX IF NOT EXISTS result_used ON result (used)')
+      conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, val INTEGER)')
+      conn.commit()
+      self.local.conn = conn
+
+    return conn
+
+  @staticmethod
+  def key(*parts):
+    return ':'.join(str(part) for part in parts)
+
+  def count(self, name: str):
+    with self.lock:
+      self.counts[name] = self.counts.get(name, 0) + 1
+      full = sum(self.counts.values()) >= STATS_FLUSH
+
+    if full:
+      with self.conn() as conn:
+        self.flush_stats(conn)
+
+  def flush_stats(self, conn):
+    """
+    命中、未命中次数先记在内存中，写入结果或攒够 STATS_FLUSH 次时再写入
+    """
+    with self.lock:
+      counts = self.counts
+      self.counts = { }
+
+    conn.executemany('INSERT INTO stats VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET val = val + excluded.val',
+                     list(counts.items()),
+                     )
+
+  def get(self, kind: str, key: str):
+    conn = self.conn()
+    # 只读查询，多个进程同时命中时不争抢写锁
+    row = conn.execute('SELECT val, used FROM result WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+
+    if row is None:
+      self.count('misses')
+      return None
+
+    self.count('hits')
+    now = time.time()
+
+    # 淘汰只需要大致的使用时间，超过 TOUCH_SECS 才更新
+    if now - row[1] > TOUCH_SECS:
+      with conn:
+        conn.execute('UPDATE result SET used = ? WHERE kind = ? AND key = ?', (now, kind, key))
+
+    return json.loads(row[0])
+
+  def put(self, kind: str, key: str, val):
+    conn = self.conn()
+    val = json.dumps(val, ensure_ascii = False)
+
+    with conn:
+      # 先取得写锁再读旧记录的大小，多个进程同时写入时总大小也准确
+      conn.execute('BEGIN IMMEDIATE')
+      old = conn.execute('SELECT size FROM result WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+      conn.execute('INSERT OR REPLACE INTO result VALUES (?, ?, ?, ?, ?)', (kind, key, val, len(val), time.time()))
+      total = self.add_bytes(conn, len(val) - (old[0] if old else 0))
+      self.flush_stats(conn)
+
+      if total > self.max_bytes:
+        self.evict(conn, total)
+
+  @staticmethod
+  def add_bytes(conn, delta: int):
+    """
+    总大小记在 stats 中，写入时按大小的变化更新，不用每次都统计整张表
+    :return: 更新后的总大小
+    """
+    row = conn.execute("SELECT val FROM stats WHERE name = 'bytes'").fetchone()
+
+    # 旧版本的缓存文件或清空后没有记录，统计一次
+    if row is None:
+      total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM result').fetchone()[0]
+    else:
+      total = row[0] + delta
+
+    conn.execute("INSERT OR REPLACE INTO stats VALUES ('bytes', ?)", (total,))
+
+    return total
+
+  def evict(self, conn, total: int):
+    # 一次淘汰到上限的 90%，避免每次写入都触发
+    target = total - self.max_bytes * 0.9
+    removed = []
+
+    # 按使用时间逐行读取，够了就停止
+    for kind, key, size in conn.execute('SELECT kind, key, size FROM result ORDER BY used'):
+      if target <= 0:
+        break
+
+      removed.append((kind, key))
+      target -= size
+      total -= size
+
+    conn.executemany('DELETE FROM result WHERE kind = ? AND key = ?', removed)
+    conn.execute("UPDATE stats SET val = ? WHERE name = 'bytes'", (total,))
+
+  def stats(self):
+    conn = self.conn()
+
+    with conn:
+      self.flush_stats(conn)
+
+    result = dict(conn.execute('SELECT name, val FROM stats').fetchall())
+    count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result').fetchone()
+
+    return {
+      'hits'  : result.get('hits', 0),
+      'misses': result.get('misses', 0),
+      'count' : count,
+      'bytes' : size,
+    }
+
+  def clear(self):
+    conn = self.conn()
+
+    with conn:
+      conn.execute('DELETE FROM result')
+      conn.execute('DELETE FROM stats')
+
+    with self.lock:
+      self.counts = { }
+
+
+RESULT_CACHE = ResultCache()
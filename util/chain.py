@@ -0,0 +1,384 @@
+# -*- encoding: utf-8 -*-
+"""
+图片处理链：记录每张图片要执行的操作，预览时在缩小的副本上执行，保存时才按原图执行一次
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import List, Tuple
+
+import fitz
+
+from .compress import COMPRESS_PROFILE, downsample_img, page_mode, reduce_colors
+from .common import file_name_and_ext, make_dir, merge_name, normal_join
+from .image import (DEFAULT_DPI, img_bleach, img_dpi, insert_cv_img, insert_img_file, JPEG_QUALITY, page_dpi, read_img,
+                    read_img_proxy, write_img,
+                    )
+from .pool import pool_map
+from .rotate import get_skew_angle, rotate_img
+
+# 预览副本的最长边，足够看清效果与检测方向
+PROXY_SIZE = 1600
+
+
+@dataclass(frozen = True)
+class Op:
+  """
+  处理链中的一步，fn 为 FUNCS 中的函数名，args 为 ((参数名, 值), ...)，可以作为缓存的键
+  """
+  fn: str
+  args: tuple = ()
+
+  @classmethod
+  def of(cls, fn: str, **kwargs):
+    return cls(fn, tuple(sorted(kwargs.items())))
+
+  def kwargs(self, scale = 1.0):
+    kwargs = dict(self.args)
+
+    # 以像素为单位的参数在缩小的副本上按比例缩小，取奇数
+    for name, default in PIXEL_ARGS.get(self.fn, { }).items():
+      kwargs[name] = max(3, int(kwargs.get(name, default) * scale) | 1)
+
+    return kwargs
+
+  def resolve(self, image):
+    """
+    需要先检测的操作（如方向、倾斜角度）按当前图片检测后，转为确定的操作
+    """
+    resolver = RESOLVERS.get(self.fn)
+
+    return resolver(self, image) if resolver else self
+
+  def __call__(self, image, scale = 1.0):
+    return FUNCS[self.fn](image, **self.kwargs(scale))
+
+
+def _resolve_orient(_, image):
+  from .ocr import get_rotate_angle
+
+  return Op.of('rotate_img', angle = get_rotate_angle(image)['rotate'])
+
+
+def _resolve_skew(_, image):
+  return Op.of('rotate_img', angle = get_skew_angle(image), expand = False)
+
+
+def _resolve_reduce(op: Op, image):
+  args = dict(op.args)
+
+  if args.get('mode', 'auto') != 'auto':
+    return op
+
+  return Op.of('reduce_img', **{ **args, 'mode': page_mode(image) })
+
+
+def _reduce_img(image, mode = 'auto', dpi = None, quality = None):
+  # 缩小分辨率与 JPEG 质量在保存时按原图计算，见 compress_profile
+  return reduce_colors(image, mode)
+
+
+FUNCS = {
+  'img_bleach': img_bleach,
+  'rotate_img': rotate_img,
+  'reduce_img': _reduce_img,
+}
+
+RESOLVERS = {
+  'correct_img_orient': _resolve_orient,
+  'deskew_img'        : _resolve_skew,
+  'reduce_img'        : _resolve_reduce,
+}
+
+PIXEL_ARGS = {
+  'img_bleach': { 'window_size': 15 },
+}
+
+
+def push_op(ops: tuple, op: Op):
+  """
+  追加一步，相邻的直角旋转合并为一次，转回原样时直接去掉
+  """
+  last = ops[-1] if ops else None
+
+  if last is None or last.fn != 'rotate_img' or op.fn != 'rotate_img' or len(last.args) > 1 or len(op.args) > 1:
+    return ops + (op,)
+
+  angle = (dict(last.args).get('angle', 0) + dict(op.args).get('angle', 0)) % 360
+
+  if angle % 90:
+    return ops + (op,)
+
+  return ops[:-1] + ((Op.of('rotate_img', angle = angle),) if angle else ())
+
+
+def lossless_angle(ops: tuple):
+  """
+  处理链只有直角旋转时返回旋转的角度，转为 PDF 时旋转页面即可，原图原样嵌入
+  """
+  angle = 0
+
+  for op in ops:
+    if op.fn != 'rotate_img' or dict(op.args).get('angle', 0) % 90:
+      return None
+
+    angle += dict(op.args).get('angle', 0)
+
+  return angle % 360
+
+
+def _run_ops(image, ops: tuple):
+  for op in ops:
+    image = op.resolve(image)(image)
+
+  return image
+
+
+def run_chain(source: str, ops: tuple):
+  """
+  按原图执行整条处理链
+  """
+  return _run_ops(read_img(source), ops)
+
+
+def compress_profile(ops: tuple):
+  """
+  处理链中减小文件大小的参数，没有该操作时为 None
+  """
+  for op in ops:
+    if op.fn == 'reduce_img':
+      args = dict(op.args)
+      return replace(COMPRESS_PROFILE, **{ key: args[key] for key in ('dpi', 'quality') if args.get(key) })
+
+  return None
+
+
+def _run_for_save(source: str, ops: tuple, quality = JPEG_QUALITY):
+  """
+  按原图执行处理链，有减小文件大小的操作时再按原图的分辨率缩小
+  :return: (图片, 分辨率, JPEG 质量)
+  """
+  image = read_img(source)
+
+  if image is None:
+    raise ValueError(f'无法读取图片：{source}')
+
+  h, w = image.shape[:2]
+  dpi = img_dpi(source, w)
+  image = _run_ops(image, ops)
+  profile = compress_profile(ops)
+
+  if profile:
+    # 没有记录分辨率时为 DEFAULT_DPI，按纸张大小估计，否则大图也不会缩小
+    if round(dpi) == DEFAULT_DPI:
+      dpi = max(dpi, page_dpi(w, h))
+
+    image, dpi = downsample_img(image, dpi, profile.dpi)
+    quality = profile.quality
+
+  return image, dpi, quality
+
+
+def chain_doc(source: str, ops: tuple, quality = JPEG_QUALITY):
+  """
+  执行处理链并转为 PDF 文档，只有直角旋转时原图原样嵌入，否则页面大小按原图的分辨率计算
+  """
+  doc = fitz.open()
+  angle = lossless_angle(ops)
+
+  if angle is not None:
+    insert_img_file(doc, source, angle)
+    return doc
+
+  image, dpi, quality = _run_for_save(source, ops, quality)
+  insert_cv_img(doc, image, quality, dpi)
+
+  return doc
+
+
+def chain_pdf_bytes(source: str, ops: tuple, quality = JPEG_QUALITY):
+  with chain_doc(source, ops, quality) as doc:
+    return doc.tobytes()
+
+
+def save_chain(source: str, ops: tuple, out: str, quality = JPEG_QUALITY):
+  """
+  在子进程中执行处理链并保存，out 为 pdf 时转为 pdf
+  """
+  if out.lower().endswith('.pdf'):
+    with chain_doc(source, ops, quality) as doc:
+      doc.save(out, garbage = 3, deflate = True)
+
+    return out
+
+  image, _, quality = _run_for_save(source, ops, quality)
+  write_img(image, out, quality)
+
+  return out
+
+
+def try_save_chain(source: str, ops: tuple, out: str):
+  """
+  在子进程中保存一张图片，出错时返回错误信息而不是抛出，一张失败不影响其他图片
+  :return: 成功时为 None
+  """
+  try:
+    save_chain(source, ops, out)
+  except Exception as e:
+    return f'{type(e).__name__}: {e}'
+
+
+def merge_chains(sources: List[str], chains: List[tuple], new_name: str = None, quality = JPEG_QUALITY,
+                 workers: int = None, bookmarks = True, callback = None, chunk_size = 50,
+                 ):
+  """
+  多张图片执行处理链后合并为一个 PDF，每张图片添加一个书签
+  子进程执行处理链并编码，同时最多有 2 * workers 张在处理或等待写入
+  当前线程按顺序追加页面，每 chunk_size 页增量写入临时文件，内存中最多只有一组页面
+  :param callback: 每追加一张调用 callback(序号, 已追加的张数)，抛出异常时停止，不会生成文件
+  :return: 合并后的文件
+  """
+  workers = workers or min(os.cpu_count() or 1, 61)
+  out, new_name = merge_name(sources[0], new_name)
+  make_dir(out)
+  full = normal_join(out, new_name + '.pdf')
+  toc = []
+  page_count = 0
+  args_list = [(source, ops, quality) for source, ops in zip(sources, chains)]
+  temp = tempfile.mkdtemp(dir = out)
+  combined = os.path.join(temp, 'combined.pdf')
+  chunk = fitz.open()
+
+  def flush():
+    nonlocal chunk
+
+    if not chunk.page_count:
+      return
+
+    if os.path.exists(combined):
+      with fitz.open(combined) as doc:
+        doc.insert_pdf(chunk)
+        doc.save(combined, incremental = True, deflate = True, encryption = fitz.PDF_ENCRYPT_KEEP)
+    else:
+      chunk.save(combined, deflate = True)
+
+    chunk.close()
+    chunk = fitz.open()
+
+  try:
+    for idx, data in pool_map(chain_pdf_bytes, args_list, workers, ordered = True, ahead = workers * 2):
+      if bookmarks:
+        toc.append([1, file_name_and_ext(sources[idx])[0], page_count + 1])
+
+      with fitz.open('pdf', data) as page_doc:
+        chunk.insert_pdf(page_doc)
+        page_count += page_doc.page_count
+
+      if chunk.page_count >= chunk_size:
+        flush()
+
+      if callback:
+        callback(idx, idx + 1)
+
+    flush()
+
+    with fitz.open(combined) as doc:
+      doc.set_toc(toc)
+      doc.save(full, garbage = 3, deflate = True)
+  finally:
+    chunk.close()
+    shutil.rmtree(temp, ignore_errors = True)
+
+  return full
+
+
+class ChainCache:
+  """
+  缓存处理链每一步在预览副本上的结果，撤销、重做或追加操作时从最长的相同前缀继续
+  """
+
+  def __init__(self, size = PROXY_SIZE, max_bytes = 512 << 20):
+    self.size = size
+    self.max_bytes = max_bytes
+    self.used = 0
+    self.items: OrderedDict[tuple, Tuple] = OrderedDict()
+    self.lock = threading.Lock()
+
+  def source_key(self, source: str):
+    stat = os.stat(source)
+
+    return os.path.normcase(os.path.abspath(source)), stat.st_size, stat.st_mtime_ns, self.size
+
+  def get(self, key: tuple):
+    with self.lock:
+      item = self.items.get(key)
+
+      if item is not None:
+        self.items.move_to_end(key)
+
+      return item
+
+  def put(self, key: tuple, item: tuple):
+    with self.lock:
+      if key in self.items:
+        return
+
+      self.items[key] = item
+      self.used += item[0].nbytes
+
+      while self.used > self.max_bytes and len(self.items) > 1:
+        _, old = self.items.popitem(last = False)
+        self.used -= old[0].nbytes
+
+  def clear(self):
+    with self.lock:
+      self.items.clear()
+      self.used = 0
+
+  def run(self, source: str, ops: tuple):
+    """
+    在预览副本上执行处理链，文件不存在或无法读取时抛出 OSError、ValueError
+    :return: (预览图, 检测后确定的处理链)
+    """
+    src = self.source_key(source)
+    item = None
+    start = len(ops)
+
+    while start >= 0:
+      item = self.get((src, ops[:start]))
+
+      if item is not None:
+        break
+
+      start -= 1
+
+    if item is None:
+      image, scale = read_img_proxy(source, self.size)
+
+      if image is None:
+        raise ValueError(f'无法读取图片：{source}')
+
+      item = (image, scale, ())
+      start = 0
+      self.put((src, ()), item)
+
+    image, scale, resolved = item
+
+    for i in range(start, len(ops)):
+      op = ops[i].resolve(image)
+      image = op(image, scale)
+      resolved = resolved + (op,)
+      item = (image, scale, resolved)
+      self.put((src, ops[:i + 1]), item)
+
+      if resolved != ops[:i + 1]:
+        self.put((src, resolved), item)
+
+    return image, resolved
+
+
+CHAIN_CACHE = ChainCache()
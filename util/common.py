@@ -0,0 +1,176 @@
+# -*- encoding: utf-8 -*-
+
+import glob
+import json
+import os
+import re
+import shutil
+import time
+from typing import Any, List
+
+
+def list_at(l: List[Any], idx: int, default = None):
+  try:
+    return l[idx]
+  except IndexError:
+    return default
+
+
+# 路径相关
+def make_dir(folder: str):
+  if os.path.exists(folder):
+    return
+
+  os.mkdir(folder)
+
+
+def del_folder(folder: str, recreate = True):
+  try:
+    if os.path.exists(folder):
+      shutil.rmtree(folder)
+
+      if recreate:
+        make_dir(folder)
+    else:
+      print(f'{folder} 不存在')
+  except OSError as e:
+    print(f'删除 {folder} 失败：{e}')
+
+
+def get_file_name(file: str):
+  return os.path.splitext(os.path.abspath(file))[0]
+
+
+def file_name_and_ext(file):
+  return os.path.splitext(os.path.basename(file))
+
+
+def get_file_folder(file: str):
+  return os.path.dirname(get_file_name(file))
+
+
+def file_2_type(file, ext = 'pdf'):
+  return os.path.normpath(get_file_name(file) + '.' + ext)
+
+
+def normal_join(folder: str, name: str):
+  return os.path.normpath(os.path.join(folder, name))
+
+
+def find_file(folder: str, filter_str: str, rec = True):
+  matches = glob.glob(folder + '/' + filter_str, recursive = rec)
+
+  return matches
+
+
+def find_files(folders: List[str], filter_strs: List[str], rec = True):
+  result = []
+
+  for folder in folders:
+    for filter_str in filter_strs:
+      result += find_file(folder, filter_str, rec)
+
+  return result
+
+
+def del_files(files: List[str]):
+  for file in files:
+    os.remove(file)
+
+
+def normal_path(file: str):
+  file = os.path.normpath(file)
+
+  return file.replace('\\', '/')
+
+
+def filename_with_parent_dir(file):
+  full = normal_path(file)
+  parent = os.path.basename(os.path.dirname(full))
+  file_name = f'{parent}-{os.path.basename(file)}'
+
+  return {
+    'src' : full,
+    'name': file_name
+  }
+
+
+def filter_file_by_glob(home, reg):
+  files = glob.glob(normal_path(f'{home}/**/{reg}'), recursive = True)
+  files = list(set(files))
+  files = [file for file in files if os.path.isfile(file)]
+
+  return files
+
+
+def json_file_2_json(json_file: str):
+  with open(json_file, encoding = 'utf-8', mode = 'r') as f:
+    return json.loads(f.read())
+
+
+def merge_name(file: str, new_name: str = None):
+  out = get_file_folder(file)
+
+  if not new_name:
+    time_str = time.strftime("%Y%m%d%H%M%S", time.localtime())
+    new_name = f'merged-{time_str}'
+
+  return out, new_name
+
+
+# 识别要素并重命名
+def parse_name_rule(rule: str):
+  """
+  解析命名规则，如 2025-{1}-{2}-判决书 解析为 ['2025-', 1, '-', 2, '-判决书']
+  """
+  token = ''
+  rules = []
+
+  for ch in rule.strip():
+    if ch == '{':
+      if token:
+        rules.append(token)
+        token = ''
+    elif ch == '}':
+      rules.append(int(token))
+      token = ''
+    else:
+      token += ch
+
+  if token:
+    rules.append(token)
+
+  return rules
+
+
+def parse_table(data: str, skip_first = True):
+  """
+  解析从 Excel 粘贴的数据，每行以制表符分隔
+  """
+  rows = [line.split('\t') for line in data.strip().split('\n')]
+
+  return rows[1:] if skip_first else rows
+
+
+def content_new_name(file: str, content: str, pattern: str | re.Pattern, rows: List[List[str]], col: int,
+                     rules: List[str | int],
+                     ):
+  """
+  在识别内容中查找 pattern，用匹配到的行按命名规则生成新文件名
+  :return: (识别到的内容, 新文件名)，未识别到时为 (None, None)，无法匹配时新文件名为 None
+  """
+  result = re.search(pattern, content)
+
+  if not result:
+    return None, None
+
+  matched = result.group()
+  row = next((row for row in rows if row[col] in matched), None)
+
+  if row is None:
+    return matched, None
+
+  file_name, _ = file_name_and_ext(file)
+  new_name = ''.join(row[rule] if isinstance(rule, int) else rule for rule in rules)
+
+  return matched, file.replace(file_name, new_name)
@@ -0,0 +1,198 @@
+# -*- encoding: utf-8 -*-
+"""
+减小文件大小：按目标分辨率缩小图片，文字页转为灰度或黑白，重新压缩并合并重复的数据
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Dict, List
+
+import cv2
+import fitz
+import numpy as np
+
+from .common import file_name_and_ext, get_file_folder, normal_join
+from .image import encode_img, fit_img, img_bleach
+from .pool import pool_map
+from .render import pixmap_2_image
+
+
+@dataclass(frozen = True)
+class CompressProfile:
+  # 图片超过该分辨率时缩小
+  dpi: int = 150
+  # 彩色、灰度图片的 JPEG 质量
+  quality: int = 60
+  # auto 时按内容判断，也可指定 color、gray、bilevel
+  mode: str = 'auto'
+  # 压缩后不小于原来的该比例时保留原图
+  min_gain: float = 0.9
+
+
+COMPRESS_PROFILE = CompressProfile()
+
+
+@dataclass
+class SizeReport:
+  source: str
+  out: str
+  before: int
+  after: int
+
+  @property
+  def ratio(self):
+    return self.after / self.before if self.before else 1.0
+
+  def __str__(self):
+    return f'{self.before / 1024:.0f} KB -> {self.after / 1024:.0f} KB（{self.ratio:.0%}）'
+
+
+def page_mode(image, color_ratio = 0.005, gray_ratio = 0.2):
+  """
+  在缩小的副本上判断图片的内容：有彩色（如印章）的为 color，
+  中间灰度较少的文字页为 bilevel，其余（照片等）为 gray
+  """
+  small = fit_img(image, 1000)
+
+  if small.ndim > 2:
+    chroma = small.max(axis = 2).astype(np.int16) - small.min(axis = 2)
+
+    if np.count_nonzero(chroma > 40) > small.shape[0] * small.shape[1] * color_ratio:
+      return 'color'
+
+    small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+  hist = cv2.calcHist([small], [0], None, [256], [0, 256]).ravel()
+
+  return 'bilevel' if hist[64:160].sum() < small.size * gray_ratio else 'gray'
+
+
+def reduce_colors(image, mode = 'auto'):
+  """
+  按 mode 转为灰度或黑白，黑白用 Sauvola 漂白，光照不均的扫描件也能保留文字
+  """
+  if mode == 'auto':
+    mode = page_mode(image)
+
+  if mode == 'bilevel':
+    return img_bleach(image)
+
+  if mode == 'gray' and image.ndim > 2:
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+  return image
+
+
+def downsample_img(image, src_dpi: float = None, dpi = COMPRESS_PROFILE.dpi):
+  """
+  分辨率超过 dpi 时缩小，src_dpi 未知时不缩小
+  :return: (图片, 缩小后的分辨率)
+  """
+  if not src_dpi or src_dpi <= dpi * 1.1:
+    return image, src_dpi
+
+  f = dpi / src_dpi
+
+  return cv2.resize(image, (0, 0), fx = f, fy = f, interpolation = cv2.INTER_AREA), dpi
+
+
+def reduce_img(image, src_dpi: float = None, profile = COMPRESS_PROFILE):
+  """
+  缩小到目标分辨率并减少颜色
+  :param src_dpi: 图片当前的分辨率，未知时不缩小
+  """
+  image, _ = downsample_img(image, src_dpi, profile.dpi)
+
+  return reduce_colors(image, profile.mode)
+
+
+def _reduce_pdf_image(pdf_file: str, xref: int, src_dpi: float, profile = COMPRESS_PROFILE):
+  """
+  在子进程中重新压缩 pdf 中的一张图片，没有变小时返回 None
+  """
+  with fitz.open(pdf_file) as doc:
+    size = len(doc.xref_stream_raw(xref))
+    pix = fitz.Pixmap(doc, xref)
+
+  if pix.alpha:
+    return None
+
+  if pix.n not in (1, 3):
+    pix = fitz.Pixmap(fitz.csRGB, pix)
+
+  data = encode_img(reduce_img(pixmap_2_image(pix), src_dpi, profile), profile.quality)
+
+  return data if len(data) < size * profile.min_gain else None
+
+
+def _pdf_images(doc):
+  """
+  找出需要处理的图片：每个图片 xref 第一次出现的页码及显示时的最大分辨率，内容相同的图片只处理一次
+  :return: ({ xref: (页码, 分辨率) }, { 重复的 xref: 第一次出现的 xref })
+  """
+  images: Dict[int, tuple] = { }
+  same: Dict[int, int] = { }
+  digests: Dict[str, int] = { }
+
+  for page in doc:
+    for item in page.get_images(full = True):
+      xref, smask, width = item[0], item[1], item[2]
+
+      if smask or xref in same:
+        continue
+
+      if xref not in images:
+        digest = hashlib.blake2b(doc.xref_stream_raw(xref), digest_size = 20).hexdigest()
+
+        if digest in digests:
+          same[xref] = digests[digest]
+          continue
+
+        digests[digest] = xref
+        images[xref] = (page.number, 0.0)
+
+      dpi = max((width * 72 / rect.width for rect in page.get_image_rects(xref) if rect.width > 0), default = 0.0)
+      images[xref] = (images[xref][0], max(images[xref][1], dpi))
+
+  return images, same
+
+
+def compress_pdf(pdf_file: str, new_name: str = None, profile = COMPRESS_PROFILE, workers: int = None,
+                 callback = None,
+                 ):
+  """
+  减小 pdf 文件大小，图片在进程池中按页并行处理，保存时合并重复的对象并压缩
+  :param new_name: 默认为 原文件名-small
+  :param callback: 每处理完一张图片调用 callback(已处理的张数, 总张数)
+  :return: SizeReport
+  """
+  name, _ = file_name_and_ext(pdf_file)
+  full = normal_join(get_file_folder(pdf_file), (new_name or f'{name}-small') + '.pdf')
+  before = os.path.getsize(pdf_file)
+
+  with fitz.open(pdf_file) as doc:
+    images, same = _pdf_images(doc)
+    xrefs: List[int] = sorted(images, key = lambda x: images[x][0])
+    args_list = [(pdf_file, xref, images[xref][1], profile) for xref in xrefs]
+    replaced: Dict[int, bytes] = { }
+
+    for count, (idx, data) in enumerate(pool_map(_reduce_pdf_image, args_list, workers), 1):
+      xref = xrefs[idx]
+
+      if data is not None:
+        doc[images[xref][0]].replace_image(xref, stream = data)
+        replaced[xref] = data
+
+      if callback:
+        callback(count, len(xrefs))
+
+    # 重复的图片换成相同的数据，保存时合并为一个对象
+    for xref, first in same.items():
+      if first in replaced:
+        page = next(page for page in doc if any(item[0] == xref for item in page.get_images()))
+        page.replace_image(xref, stream = replaced[first])
+
+    doc.save(full, garbage = 4, deflate = True, clean = True)
+
+  return SizeReport(pdf_file, full, before, os.path.getsize(full))
@@ -0,0 +1,727 @@
+# -*- encoding: utf-8 -*-
+"""
+Office 文档转 PDF，由常驻的转换进程执行
+每个进程只启动一次 Word / Excel 或 LibreOffice，之后的文件复用，不再为每个文件启动、退出 Office
+LibreOffice 只有能导入 uno 时才常驻，否则每个文件仍启动一次 soffice，进程池只负责同时转换、超时和崩溃后重试
+"""
+
+import atexit
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from .common import file_2_type
+
+WORD_EXTS = ('.doc', '.docx')
+EXCEL_EXTS = ('.xls', '.xlsx')
+OFFICE_EXTS = WORD_EXTS + EXCEL_EXTS
+# 单个文件的转换时间上限（秒），超时后结束 Office，该文件记为失败
+DOC_TIMEOUT = 300
+# 转换进程自身卡住时，超过 DOC_TIMEOUT 再等待该秒数后结束进程
+GRACE = 30
+# 每个进程转换该数量的文件后重新启动，释放 Office 长时间运行占用的内存
+MAX_TASKS = 200
+# 转换进程意外退出时，该文件重新转换的次数
+RETRIES = 1
+# 取消时等待转换进程结束 Office 的时间（秒）
+CANCEL_WAIT = 5
+# LibreOffice 启动后等待接受连接的时间（秒）
+START_TIMEOUT = 60
+
+
+class ConvertError(Exception):
+  pass
+
+
+class Converter:
+  """
+  在转换进程中使用，首次转换时才启动 Office，close 时退出
+  单个文件超过 timeout 秒或任务取消时由 kill 结束 Office，正在执行的转换随之失败
+  """
+  name = ''
+
+  def __init__(self, timeout = DOC_TIMEOUT):
+    self.timeout = timeout
+    self.timed_out = False
+    # Office 进程变化时调用 on_pids([(进程号, 是否为进程组), ...])，转换进程被结束时由主进程结束这些进程
+    self.on_pids: Callable[[List[tuple]], None] | None = None
+
+  @classmethod
+  def available(cls):
+    return False
+
+  def run(self, src: str, out: str, abort = None):
+    """
+    :param abort: multiprocessing.Event，置位时（任务已取消）结束 Office
+    """
+    self.timed_out = False
+    done = threading.Event()
+    deadline = time.monotonic() + self.timeout
+
+    def watch():
+      while not done.wait(0.2):
+        if abort is not None and abort.is_set():
+          break
+
+        if time.monotonic() > deadline:
+          self.timed_out = True
+          break
+      else:
+        return
+
+      self.kill()
+
+    threading.Thread(target = watch, daemon = True).start()
+
+    try:
+      self.convert(src, out)
+    except Exception as e:
+      if self.timed_out:
+        raise ConvertError(f'转换超时（{self.timeout} 秒）') from e
+
+      raise
+    finally:
+      done.set()
+
+  def convert(self, src: str, out: str):
+    raise NotImplementedError
+
+  def pids(self) -> List[tuple]:
+    return []
+
+  def pids_changed(self):
+    if self.on_pids:
+      self.on_pids(self.pids())
+
+  def kill(self):
+    """
+    在监视线程中调用，只结束进程，不调用 Office 的接口
+    """
+    pass
+
+  def close(self):
+    pass
+
+
+def kill_pid(pid: int, group = False):
+  try:
+    if os.name == 'nt':
+      subprocess.run(['taskkill', '/T', '/F', '/PID', str(pid)], capture_output = True)
+    elif group:
+      os.killpg(pid, signal.SIGKILL)
+    else:
+      os.kill(pid, signal.SIGKILL)
+  except OSError:
+    pass
+
+
+class MSOfficeConverter(Converter):
+  """
+  通过 COM 调用 Word、Excel，每个进程用 DispatchEx 启动独立的实例，不会关闭用户自己打开的文档
+  """
+  name = 'msoffice'
+
+  def __init__(self, timeout = DOC_TIMEOUT):
+    super().__init__(timeout)
+
+    # ProgID -> (Application, 进程号)
+    self.apps: Dict[str, tuple] = { }
+    self.com = False
+
+  @classmethod
+  def available(cls):
+    return os.name == 'nt' and importlib.util.find_spec('win32com') is not None
+
+  def app(self, prog_id: str):
+    if not self.com:
+      import pythoncom
+
+      # 每个进程初始化一次 COM，之后的文件都在同一线程中转换
+      pythoncom.CoInitialize()
+      self.com = True
+
+    if prog_id not in self.apps:
+      from win32com.client import DispatchEx
+
+      app = DispatchEx(prog_id)
+      app.Visible = False
+      app.DisplayAlerts = 0
+      self.apps[prog_id] = (app, app_pid(app, prog_id))
+      self.pids_changed()
+
+    return self.apps[prog_id][0]
+
+  def convert(self, src: str, out: str):
+    ext = os.path.splitext(src)[1].lower()
+
+    try:
+      # https://zhuanlan.zhihu.com/p/564822327
+      if ext in EXCEL_EXTS:
+        book = self.app('Excel.Application').Workbooks.Open(src, False, True)
+
+        try:
+          book.ExportAsFixedFormat(0, out)
+        finally:
+          book.Close(False)
+      else:
+        # https://stackoverflow.com/questions/6011115/doc-to-pdf-using-python
+        doc = self.app('Word.Application').Documents.Open(src, False, True)
+
+        try:
+          doc.SaveAs(out, FileFormat = 17)
+        finally:
+          doc.Close(0)
+    except Exception:
+      self.drop_dead()
+      raise
+
+  def drop_dead(self):
+    """
+    Office 已退出（崩溃、超时被结束）时丢弃该实例，下一个文件重新启动
+    """
+    for prog_id, (app, pid) in list(self.apps.items()):
+      try:
+        _ = app.Name
+      except Exception:
+        del self.apps[prog_id]
+        self.pids_changed()
+
+  def pids(self):
+    return [(pid, False) for _, pid in self.apps.values() if pid]
+
+  def kill(self):
+    for _, pid in list(self.apps.values()):
+      if pid:
+        kill_pid(pid)
+
+  def close(self):
+    for app, _ in self.apps.values():
+      try:
+        app.Quit()
+      except Exception:
+        pass
+
+    self.apps.clear()
+
+    if self.com:
+      import pythoncom
+
+      pythoncom.CoUninitialize()
+      self.com = False
+
+
+def app_pid(app, prog_id: str):
+  """
+  Office 实例的进程号，超时时用来结束该实例，获取失败时返回 None
+  """
+  try:
+    import win32gui
+    import win32process
+
+    if prog_id == 'Excel.Application':
+      hwnd = app.Hwnd
+    else:
+      # Word 没有 Hwnd，用唯一的标题找到隐藏的主窗口
+      app.Caption = caption = f'layer_helper-{os.getpid()}'
+      hwnd = win32gui.FindWindow('OpusApp', caption)
+
+    return win32process.GetWindowThreadProcessId(hwnd)[1] or None
+  except Exception:
+    return None
+
+
+def find_soffice():
+  for name in ('soffice', 'libreoffice'):
+    path = shutil.which(name)
+
+    if path:
+      return path
+
+  if os.name == 'nt':
+    for base in (os.environ.get('ProgramFiles'), os.environ.get('ProgramFiles(x86)')):
+      path = os.path.join(base or '', 'LibreOffice', 'program', 'soffice.exe')
+
+      if base and os.path.exists(path):
+        return path
+  else:
+    path = '/Applications/LibreOffice.app/Contents/MacOS/soffice'
+
+    if os.path.exists(path):
+      return path
+
+  return None
+
+
+class LibreOfficeConverter(Converter):
+  """
+  无界面的 LibreOffice，每个进程使用单独的用户配置目录，多个进程可同时转换
+  能导入 uno（LibreOffice 自带或系统安装的 Python 绑定）时启动一个常驻的 soffice 并通过 UNO 打开、导出文件，
+  否则每个文件执行一次 soffice --convert-to，配置目录在进程内复用，只有第一次需要初始化
+  没有 uno 时不能让 soffice 常驻：--convert-to 交给已在运行的同一配置目录的 soffice 时不会转换
+  """
+  name = 'libreoffice'
+  FILTERS = {
+    '.doc' : 'writer_pdf_Export',
+    '.docx': 'writer_pdf_Export',
+    '.xls' : 'calc_pdf_Export',
+    '.xlsx': 'calc_pdf_Export',
+  }
+
+  def __init__(self, timeout = DOC_TIMEOUT):
+    super().__init__(timeout)
+
+    self.binary = find_soffice()
+    # 临时目录下的 profile 为配置目录，out-* 为每个文件的输出目录
+    self.root = tempfile.mkdtemp(prefix = 'layer_helper-lo-')
+    self.profile = os.path.join(self.root, 'profile')
+    self.proc: subprocess.Popen | None = None
+    self.desktop = None
+    self.uno = importlib.util.find_spec('uno') is not None
+
+  @classmethod
+  def available(cls):
+    return find_soffice() is not None
+
+  def spawn(self, args: List[str], stderr = subprocess.DEVNULL):
+    if self.binary is None:
+      raise ConvertError('未找到 LibreOffice（soffice）')
+
+    cmd = [self.binary, f'-env:UserInstallation={Path(self.profile).as_uri()}', '--headless', '--nologo',
+           '--nodefault', '--nolockcheck', '--norestore', *args,
+           ]
+    # 单独的进程组，超时时连同 soffice.bin 一起结束
+    if os.name == 'nt':
+      group = { 'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP }
+    else:
+      group = { 'start_new_session': True }
+
+    return subprocess.Popen(cmd, stdin = subprocess.DEVNULL, stdout = subprocess.DEVNULL, stderr = stderr, **group)
+
+  def convert(self, src: str, out: str):
+    ext = os.path.splitext(src)[1].lower()
+
+    if ext not in self.FILTERS:
+      raise ConvertError(f'不支持的文件类型：{ext}')
+
+    if self.uno:
+      self.convert_uno(src, out, self.FILTERS[ext])
+    else:
+      self.convert_cli(src, out, self.FILTERS[ext])
+
+  def convert_cli(self, src: str, out: str, filter_name: str):
+    outdir = tempfile.mkdtemp(dir = self.root, prefix = 'out-')
+
+    try:
+      self.proc = self.spawn(['--convert-to', f'pdf:{filter_name}', '--outdir', outdir, src], subprocess.PIPE)
+      self.pids_changed()
+      _, err = self.proc.communicate()
+      produced = os.path.join(outdir, os.path.splitext(os.path.basename(src))[0] + '.pdf')
+
+      if not os.path.exists(produced):
+        raise ConvertError(err.decode(errors = 'ignore').strip() or 'LibreOffice 转换失败')
+
+      shutil.move(produced, out)
+    finally:
+      if self.proc is not None:
+        self.proc.kill()
+        self.proc.wait()
+        self.proc = None
+        self.pids_changed()
+
+      shutil.rmtree(outdir, ignore_errors = True)
+
+  def start_office(self):
+    import uno
+
+    with socket.socket() as s:
+      s.bind(('127.0.0.1', 0))
+      port = s.getsockname()[1]
+
+    accept = f'socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext'
+    self.proc = self.spawn(['--invisible', f'--accept={accept}'])
+    self.pids_changed()
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+    deadline = time.monotonic() + START_TIMEOUT
+
+    while True:
+      try:
+        ctx = resolver.resolve(f'uno:{accept}')
+        break
+      except Exception:
+        if self.proc.poll() is not None or time.monotonic() > deadline:
+          self.stop_office()
+          raise ConvertError('LibreOffice 启动失败')
+
+        time.sleep(0.25)
+
+    self.desktop = ctx.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', ctx)
+
+  def convert_uno(self, src: str, out: str, filter_name: str):
+    import uno
+    from com.sun.star.beans import PropertyValue
+
+    def props(**kwargs):
+      return tuple(PropertyValue(Name = key, Value = val) for key, val in kwargs.items())
+
+    if self.proc is None or self.proc.poll() is not None:
+      self.stop_office()
+      self.start_office()
+
+    try:
+      doc = self.desktop.loadComponentFromURL(uno.systemPathToFileUrl(src), '_blank', 0,
+                                              props(Hidden = True, ReadOnly = True),
+                                              )
+
+      if doc is None:
+        raise ConvertError('无法打开文件')
+
+      try:
+        doc.storeToURL(uno.systemPathToFileUrl(out), props(FilterName = filter_name))
+      finally:
+        doc.close(True)
+    except Exception:
+      # soffice 已退出时下一个文件重新启动
+      if self.proc is None or self.proc.poll() is not None:
+        self.stop_office()
+
+      raise
+
+  def pids(self):
+    return [(self.proc.pid, True)] if self.proc is not None else []
+
+  def kill(self):
+    proc = self.proc
+
+    if proc is not None and proc.poll() is None:
+      kill_pid(proc.pid, True)
+
+  def stop_office(self):
+    if self.desktop is not None and self.proc is not None and self.proc.poll() is None:
+      try:
+        self.desktop.terminate()
+        self.proc.wait(10)
+      except Exception:
+        pass
+
+    self.kill()
+
+    if self.proc is not None:
+      self.proc.wait()
+      self.proc = None
+      self.pids_changed()
+
+    self.desktop = None
+
+  def close(self):
+    self.stop_office()
+    shutil.rmtree(self.root, ignore_errors = True)
+
+
+BACKENDS: Dict[str, type] = {
+  MSOfficeConverter.name   : MSOfficeConverter,
+  LibreOfficeConverter.name: LibreOfficeConverter,
+}
+
+
+def default_backend():
+  """
+  环境变量 LAYER_HELPER_OFFICE 指定时使用该后端，否则 Windows 上优先使用 Office，其次为 LibreOffice
+  """
+  name = os.environ.get('LAYER_HELPER_OFFICE')
+
+  if name:
+    return name
+
+  for converter in BACKENDS.values():
+    if converter.available():
+      return converter.name
+
+  return None
+
+
+def _serve(backend: str, timeout: float, conn, abort):
+  """
+  转换进程的入口，依次接收 (原文件, 新文件)，返回 (是否成功, 新文件或错误信息)，收到 None 时退出
+  Office 进程变化时另外发送 ('pids', [(进程号, 是否为进程组), ...])
+  """
+  converter = BACKENDS[backend](timeout)
+  converter.on_pids = lambda pids: conn.send(('pids', pids))
+
+  try:
+    while (task := conn.recv()) is not None:
+      try:
+        converter.run(*task, abort)
+        conn.send((True, task[1]))
+      except Exception as e:
+        conn.send((False, f'{type(e).__name__}: {e}'))
+  except (EOFError, KeyboardInterrupt):
+    pass
+  finally:
+    # 连接可能已断开，退出时不再发送
+    converter.on_pids = None
+    converter.close()
+
+
+class _Worker:
+  def __init__(self, backend: str, timeout: float):
+    self.backend = backend
+    self.timeout = timeout
+    self.process = None
+    self.conn = None
+    self.abort = None
+    self.tasks = 0
+    # 转换进程启动的 Office 进程，转换进程被结束、意外退出时 Office 不会随之退出，需要另外结束
+    self.pids: List[tuple] = []
+
+  def start(self):
+    ctx = multiprocessing.get_context('spawn')
+    self.conn, child = ctx.Pipe()
+    self.abort = ctx.Event()
+    self.process = ctx.Process(target = _serve, args = (self.backend, self.timeout, child, self.abort), daemon = True)
+    self.process.start()
+    child.close()
+    self.tasks = 0
+
+  def send(self, task: Tuple[str, str]):
+    if self.process is None or not self.process.is_alive() or self.tasks >= MAX_TASKS:
+      self.stop()
+      self.start()
+
+    self.tasks += 1
+    self.abort.clear()
+    self.conn.send(task)
+
+  def cancel(self):
+    """
+    取消正在转换的文件，由转换进程结束 Office，进程保留复用；CANCEL_WAIT 秒内没有结束时结束进程
+    """
+    self.abort.set()
+
+    try:
+      if self.result(CANCEL_WAIT) is not None:
+        return
+    except (EOFError, OSError):
+      pass
+
+    self.stop(True)
+
+  def result(self, timeout: float = 0):
+    """
+    读取转换结果，期间收到的 Office 进程号记下
+    :return: (是否成功, 新文件或错误信息)，timeout 秒内没有结果时返回 None
+    """
+    deadline = time.monotonic() + timeout
+
+    while self.conn.poll(max(deadline - time.monotonic(), 0)):
+      message = self.conn.recv()
+
+      if message[0] != 'pids':
+        return message
+
+      self.pids = message[1]
+
+    return None
+
+  def stop(self, kill = False):
+    """
+    :param kill: 为 True 时直接结束进程及其启动的 Office（已卡住、意外退出），否则等待其退出 Office
+    """
+    if self.process is None:
+      return
+
+    if not kill and self.process.is_alive():
+      try:
+        self.conn.send(None)
+        self.process.join(GRACE)
+      except OSError:
+        pass
+
+    if self.process.is_alive():
+      self.process.kill()
+      kill = True
+
+    self.process.join()
+
+    if kill:
+      for pid, group in self.pids:
+        kill_pid(pid, group)
+
+    self.pids = []
+    self.conn.close()
+    self.process = None
+    self.conn = None
+    self.abort = None
+
+
+class OfficePool:
+  """
+  常驻的转换进程池，同时转换 workers 个文件
+  转换进程在第一次使用时启动，意外退出、超时被结束后下一个文件自动重新启动
+  多个任务共用时，每次 map 取出空闲的进程，用完放回
+  """
+
+  def __init__(self, backend: str = None, workers: int = None, timeout = DOC_TIMEOUT):
+    """
+    :param backend: msoffice、libreoffice，默认见 default_backend
+    :param workers: 进程数，默认为 cpu 核数，最多 4 个
+    :param timeout: 单个文件的转换时间上限（秒）
+    """
+    self.backend = backend or default_backend()
+
+    if self.backend is None:
+      raise ConvertError('未找到 Office 或 LibreOffice')
+
+    if self.backend not in BACKENDS:
+      raise ConvertError(f'不支持的转换方式：{self.backend}')
+
+    self.timeout = timeout
+    self.size = workers or min(os.cpu_count() or 1, 4)
+    self.idle = [_Worker(self.backend, timeout) for _ in range(self.size)]
+    self.cond = threading.Condition()
+
+  def checkout(self, n: int):
+    with self.cond:
+      while not self.idle:
+        self.cond.wait()
+
+      taken = self.idle[:n]
+      del self.idle[:n]
+
+    return taken
+
+  def checkin(self, workers: List[_Worker]):
+    with self.cond:
+      self.idle += workers
+      self.cond.notify_all()
+
+  def map(self, items: List[Tuple[str, str]], workers: int = None):
+    """
+    转换多个文件，每完成一个返回 (序号, 错误信息)，成功时错误信息为 None，先完成的先返回
+    生成器提前关闭时（如取消任务）结束正在转换的 Office，未开始的文件不再转换
+    :param items: [(原文件, 新文件), ...]
+    :param workers: 同时转换的数量上限，默认为进程数
+    """
+    todo = deque((idx, (os.path.abspath(src), os.path.abspath(out)), 0) for idx, (src, out) in enumerate(items))
+
+    if not todo:
+      return
+
+    slots = self.checkout(min(len(todo), workers or self.size))
+    # 进程 -> (序号, 文件, 已重试次数, 截止时间)
+    busy: Dict[_Worker, tuple] = { }
+
+    try:
+      while todo or busy:
+        for worker in slots:
+          if worker in busy or not todo:
+            continue
+
+          idx, task, tries = todo.popleft()
+
+          try:
+            worker.send(task)
+          except Exception as e:
+            worker.stop(True)
+            yield idx, f'转换进程启动失败：{e}'
+            continue
+
+          busy[worker] = (idx, task, tries, time.monotonic() + self.timeout + GRACE)
+
+        if not busy:
+          continue
+
+        timeout = min(deadline for *_, deadline in busy.values()) - time.monotonic()
+        ready = wait([worker.conn for worker in busy], max(timeout, 0))
+
+        for worker in list(busy):
+          idx, task, tries, deadline = busy[worker]
+
+          if worker.conn in ready:
+            try:
+              result = worker.result()
+            except (EOFError, OSError):
+              worker.stop(True)
+              del busy[worker]
+
+              if tries < RETRIES:
+                todo.appendleft((idx, task, tries + 1))
+                continue
+
+              error = '转换进程意外退出'
+            else:
+              # 只收到了 Office 进程号
+              if result is None:
+                continue
+
+              error = None if result[0] else result[1]
+          elif time.monotonic() >= deadline:
+            worker.stop(True)
+            error = f'转换超时（{self.timeout} 秒）'
+          else:
+            continue
+
+          busy.pop(worker, None)
+          yield idx, error
+    finally:
+      for worker in busy:
+        worker.cancel()
+
+      self.checkin(slots)
+
+  def convert(self, src: str, out: str = None):
+    """
+    转换单个文件，失败时抛出 ConvertError
+    :return: 新文件
+    """
+    out = out or file_2_type(src)
+
+    for _, error in self.map([(src, out)], 1):
+      if error:
+        raise ConvertError(error)
+
+    return out
+
+  def close(self):
+    with self.cond:
+      for worker in self.idle:
+        worker.stop()
+
+
+_office_pool: OfficePool | None = None
+_office_pool_lock = threading.Lock()
+
+
+def office_pool():
+  """
+  界面中各功能共用的转换进程池，退出时关闭其中的 Office
+  """
+  global _office_pool
+
+  with _office_pool_lock:
+    if _office_pool is None:
+      _office_pool = OfficePool()
+      atexit.register(_office_pool.close)
+
+  return _office_pool
+
+
+def office_2_pdf(items: List[Tuple[str, str | None]], workers: int = None):
+  """
+  在共用的进程池中转换多个文件
+  :param items: [(原文件, 新文件), ...]，新文件为 None 时保存为同名的 PDF
+  :return: 每完成一个返回 (序号, 错误信息)，没有文件时不启动进程池
+  """
+  if items:
+    yield from office_pool().map([(src, out or file_2_type(src)) for src, out in items], workers)
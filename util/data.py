@@ -0,0 +1,116 @@
+# -*- encoding: utf-8 -*-
+
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+
+def parse_sfz(id_str: str):
+  birth = id_str[6: 14]
+  birth_format = birth[0:4] + '/' + birth[4:6] + '/' + birth[6:]
+  # 奇数男性，偶数女性
+  gender = id_str[-2]
+
+  return gender, pd.to_datetime(birth_format)
+
+
+def parse_date(val):
+  if isinstance(val, str):
+    if val.isdigit():
+      val = int(val)
+    else:
+      return pd.to_datetime(val)
+
+  dt = None
+  val /= 1000
+
+  if val < 0:
+    dt = datetime(1970, 1, 1) + timedelta(seconds = val)
+  else:
+    dt = datetime.fromtimestamp(val)
+
+  return dt
+
+
+def format_date(val = None, remove_zero = False):
+  if val is None:
+    val = datetime.now().timestamp() * 1000
+
+  dt = parse_date(val)
+
+  if remove_zero:
+    return f'{dt.year}年{dt.month}月{dt.day}日'
+  else:
+    return dt.strftime('%Y年%m月%d日')
+
+
+# json 相关
+def excel_2_json(excel_file: str):
+  excel_data = pd.read_excel(excel_file, dtype = 'str')
+  json_str = excel_data.to_json(orient = 'records', force_ascii = False)
+  rows = json.loads(json_str)
+
+  return rows
+
+
+def cal_fees(num: float, cal_half = True):
+  if num <= 10000:
+    result = 50
+  elif num < 100000:
+    result = num * 0.025 - 200
+  elif num < 200000:
+    result = num * 0.02 + 300
+  elif num < 500000:
+    result = num * 0.015 + 1300
+  elif num < 1000000:
+    result = num * 0.01 + 3800
+  elif num < 2000000:
+    result = num * 0.009 + 4800
+  elif num < 5000000:
+    result = num * 0.008 + 6800
+  elif num < 10000000:
+    result = num * 0.007 + 11800
+  elif num < 20000000:
+    result = num * 0.006 + 21800
+  else:
+    result = num * 0.005 + 41800
+
+  if cal_half:
+    return f'{result:,.2f}\t{result / 2:,.2f}'
+  else:
+    return f'{result:,.2f}'
+
+
+def cal_fenqi(start, total):
+  dt = parse_date(start)
+  dates = [dt] + [dt + relativedelta(months = i + 1) for i in range(0, total - 1)]
+  results = []
+  cur_year = None
+
+  for date in dates:
+    y = date.year
+    m = date.month
+    d = date.day
+    date_str = f'{m}月{d}日'
+
+    if date.year != cur_year:
+      date_str = f'{y}年' + date_str
+
+    results.append(date_str)
+    cur_year = date.year
+
+  return '、'.join(results)
+
+
+def main():
+  # img = read_img('./_test/imgs/微信图片_20250328111930.jpg')
+  # new_image = img_bleach(img)
+  # cv2.imwrite('./test.jpg', new_image)
+  # correct_pdf_orient('./S30C-0i25031710240.pdf')
+  print(cal_fenqi('2025/1/1', 10))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,277 @@
+# -*- encoding: utf-8 -*-
+
+from collections import deque
+from typing import Iterable
+
+import cv2
+import fitz
+import numpy as np
+from cv2.typing import MatLike
+
+from .common import file_2_type
+from .pool import thread_pool
+
+
+# 图片类
+def _bleach_rows(image, out, y0: int, y1: int, window_size = 15, k = 0.2, r = 128):
+  """
+  对 [y0, y1) 行做 Sauvola 二值化，上下多取半个窗口的行，结果与整张图一起计算相同
+  """
+  half = window_size // 2
+  top = max(0, y0 - half)
+  bottom = min(image.shape[0], y1 + half)
+  gray = image[top:bottom]
+
+  if gray.ndim > 2:
+    gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+
+  # 由 uint8 直接求窗口均值与平方均值，内部用整数累加，不会溢出
+  size = (window_size, window_size)
+  mean = cv2.boxFilter(gray, cv2.CV_32F, size)
+  threshold = cv2.sqrBoxFilter(gray, cv2.CV_32F, size)
+  threshold -= mean * mean
+  np.maximum(threshold, 0, out = threshold)
+  np.sqrt(threshold, out = threshold)
+
+  # threshold = mean * (1 + k * (std / r - 1))
+  threshold *= k / r
+  threshold += 1 - k
+  threshold *= mean
+
+  rows = slice(y0 - top, y1 - top)
+  np.multiply(gray[rows] > threshold[rows], 255, out = out[y0:y1], casting = 'unsafe')
+
+
+def _bleach_start(image, window_size = 15, k = 0.2, r = 128, tile_rows = 256):
+  if isinstance(image, str):
+    image = read_img(image)
+
+  out = np.empty(image.shape[:2], np.uint8)
+  pool = thread_pool()
+  futures = [pool.submit(_bleach_rows, image, out, y0, min(y0 + tile_rows, image.shape[0]), window_size, k, r)
+             for y0 in range(0, image.shape[0], tile_rows)]
+
+  return out, futures
+
+
+def _bleach_result(task):
+  out, futures = task
+
+  for future in futures:
+    future.result()
+
+  return out
+
+
+def img_bleach(image, window_size = 15, k = 0.2, r = 128, tile_rows = 256):
+  """
+  Sauvola 漂白，按 tile_rows 行分块在多个线程中计算，临时内存只与分块大小、线程数有关
+  """
+  return _bleach_result(_bleach_start(image, window_size, k, r, tile_rows))
+
+
+def img_bleach_batch(images: Iterable, window_size = 15, k = 0.2, r = 128, tile_rows = 256, prefetch = 2):
+  """
+  按顺序返回每张图片的漂白结果，同时最多处理 prefetch 张
+  :param images: 图片或图片路径
+  """
+  pending = deque()
+
+  for image in images:
+    pending.append(_bleach_start(image, window_size, k, r, tile_rows))
+
+    if len(pending) > prefetch:
+      yield _bleach_result(pending.popleft())
+
+  while pending:
+    yield _bleach_result(pending.popleft())
+
+
+def float_convertor(x):
+  if x.isdigit():
+    out = float(x)
+  else:
+    out = x
+  return out
+
+
+def resize_im(im, scale, max_scale = None):
+  f = float(scale) / min(im.shape[0], im.shape[1])
+
+  if max_scale is not None and f * max(im.shape[0], im.shape[1]) > max_scale:
+    f = float(max_scale) / max(im.shape[0], im.shape[1])
+
+  return cv2.resize(im, (0, 0), fx = f, fy = f)
+
+
+def fit_img(image, size = 300):
+  """
+  等比缩小到 size x size 以内，不放大
+  """
+  f = size / max(image.shape[0], image.shape[1])
+
+  if f >= 1:
+    return image
+
+  return cv2.resize(image, (0, 0), fx = f, fy = f, interpolation = cv2.INTER_AREA)
+
+
+def read_img(img_file: str):
+  with open(img_file, 'rb') as f:
+    return cv2.imdecode(np.frombuffer(f.read(), np.int8), cv2.IMREAD_COLOR)
+
+
+def read_img_proxy(img_file: str, size = 300):
+  """
+  缩小解码，只在缩小后仍不足 size 时才用更大的尺寸重新解码
+  :return: (缩小后的图片, 相对原图的比例)
+  """
+  with open(img_file, 'rb') as f:
+    data = np.frombuffer(f.read(), np.uint8)
+
+  image = None
+  factor = 1
+
+  for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                       (2, cv2.IMREAD_REDUCED_COLOR_2), (1, cv2.IMREAD_COLOR),
+                       ):
+    image = cv2.imdecode(data, flag)
+
+    if image is None or max(image.shape[0], image.shape[1]) >= size:
+      break
+
+  if image is None:
+    return None, 1.0
+
+  proxy = fit_img(image, size)
+
+  return proxy, proxy.shape[0] / image.shape[0] / factor
+
+
+def read_img_thumb(img_file: str, size = 300):
+  return read_img_proxy(img_file, size)[0]
+
+
+def write_img(image, name, quality: int = None):
+  ext = name.split('.')[-1]
+  params = [cv2.IMWRITE_JPEG_QUALITY, quality] if quality and ext.lower() in ('jpg', 'jpeg') else []
+
+  with open(name, 'wb') as f:
+    ret, buf = cv2.imencode(f".{ext}", image, params)
+    if ret:
+      f.write(buf.tobytes())
+      return True
+    else:
+      return False
+
+
+# 处理后的图片嵌入 PDF 时的 JPEG 质量
+JPEG_QUALITY = 90
+
+# 图片没有记录分辨率时 MuPDF 按 96 计算页面大小
+DEFAULT_DPI = 96
+
+
+def encode_img(image, quality = JPEG_QUALITY):
+  """
+  编码为嵌入 PDF 的图片：只有黑白两色的（如漂白后）用无损的 PNG，MuPDF 会存为 1 位的图片，其余用 JPEG
+  :return: 编码后的字节
+  """
+  if image.ndim == 2 and cv2.countNonZero(cv2.inRange(image, 1, 254)) == 0:
+    ok, buf = cv2.imencode('.png', image)
+  else:
+    ok, buf = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+
+  if not ok:
+    raise ValueError('图片编码失败')
+
+  return buf.tobytes()
+
+
+def img_dpi(img_file: str, width: int):
+  """
+  图片文件记录的分辨率，只读文件头，不解码
+  :param width: 图片的像素宽度
+  """
+  with fitz.open(img_file) as img_doc:
+    return width * 72 / img_doc[0].rect.width
+
+
+# 图片没有记录分辨率时，按铺满一张 A4 纸估计分辨率（英寸）
+PAGE_INCHES = (8.27, 11.69)
+
+
+def page_dpi(width: int, height: int, page = PAGE_INCHES):
+  """
+  按图片铺满一页纸估计分辨率，手机拍照、扫描仪生成的 JPEG 大多没有记录分辨率
+  """
+  short, long = sorted((width, height))
+
+  return max(short / page[0], long / page[1])
+
+
+def add_img_page(doc, data: bytes, width: float, height: float, rotate = 0):
+  """
+  在 doc 末尾新建 width x height 点大小的页面放入已编码的图片，JPEG 原样嵌入
+  """
+  page = doc.new_page(width = width, height = height)
+  page.insert_image(page.rect, stream = data)
+
+  if rotate:
+    page.set_rotation(rotate % 360)
+
+  return page
+
+
+def insert_img_file(doc, img_file: str, rotate = 0):
+  """
+  在 doc 末尾插入图片文件的每一页（TIFF 可能有多页），JPEG 原样嵌入，不重新编码
+  """
+  start = len(doc)
+
+  with fitz.open(img_file) as img_doc, fitz.open('pdf', img_doc.convert_to_pdf()) as img_pdf:
+    doc.insert_pdf(img_pdf)
+
+  if rotate:
+    for page in doc.pages(start):
+      page.set_rotation(rotate % 360)
+
+
+def insert_cv_img(doc, image: MatLike, quality = JPEG_QUALITY, dpi: float = DEFAULT_DPI):
+  """
+  在 doc 末尾插入处理后的图片，只编码一次
+  黑白图片的 1 位数据不压缩，保存 doc 时需指定 deflate = True
+  """
+  h, w = image.shape[:2]
+
+  return add_img_page(doc, encode_img(image, quality), w * 72 / dpi, h * 72 / dpi)
+
+
+def img_2_pdf(img_file: str, new_name: str = None, rotate = 0):
+  """
+  图片文件转为 PDF，在内存中完成，可在多个进程中同时执行
+  :param rotate: 顺时针旋转页面的角度，90 的整数倍，图片本身不变
+  """
+  new_name = new_name or file_2_type(img_file)
+
+  with fitz.open() as doc:
+    insert_img_file(doc, img_file, rotate)
+    doc.save(new_name, garbage = 3, deflate = True)
+
+  return new_name
+
+
+def cv_img_2_pdf(img_file: str, image: MatLike, quality = JPEG_QUALITY, dpi: float = DEFAULT_DPI,
+                 new_name: str = None,
+                 ):
+  """
+  处理后的图片转为 PDF，默认保存为 img_file 同名的 pdf
+  :param dpi: 计算页面大小用的分辨率，一般取原图的分辨率
+  """
+  new_name = new_name or file_2_type(img_file)
+
+  with fitz.open() as doc:
+    insert_cv_img(doc, image, quality, dpi)
+    doc.save(new_name, garbage = 3, deflate = True)
+
+  return new_name
@@ -0,0 +1,139 @@
+# -*- encoding: utf-8 -*-
+
+import os
+from dataclasses import replace
+from typing import List
+
+from .cache import file_digest, image_digest, RESULT_CACHE, ResultCache
+from .pdf import pdf_text, rotate_pdf, usable_text
+from .pool import pool_map
+from .render import render_pdf, RENDER_PROFILES
+from .rotate import rotate_img
+
+
+def tesseract():
+  """
+  pytesseract 导入时会顺带导入 pandas，用到时才导入
+  """
+  from pytesseract import pytesseract
+
+  return pytesseract
+
+
+def ocr_pdf(pdf_file: str, page = 0, dpi = 350, lang = 'chi_sim', config = '', clip = None):
+  key = ResultCache.key(file_digest(pdf_file), page, dpi, lang, config, clip)
+  result = RESULT_CACHE.get('ocr', key)
+
+  if result is not None:
+    return result
+
+  img, = render_pdf(pdf_file, page, replace(RENDER_PROFILES['ocr'], dpi = dpi, clip = clip))
+  result = tesseract().image_to_string(img, lang = lang, config = config)
+  result = result.replace(' ', '')
+  RESULT_CACHE.put('ocr', key, result)
+
+  return result
+
+
+def read_pdf_text(pdf_file: str, page = 0, dpi = 350, lang = 'chi_sim', clip = None, min_chars = 10):
+  """
+  优先读取文字层，没有可用文字时再 OCR
+  """
+  text = pdf_text(pdf_file, page, clip)
+
+  if usable_text(text, min_chars):
+    return text.replace(' ', '')
+
+  return ocr_pdf(pdf_file, page, dpi, lang, clip = clip)
+
+
+def _ocr_worker(pdf_file: str, page = 0, dpi = 350, clip = None, text_first = True):
+  try:
+    if text_first:
+      return read_pdf_text(pdf_file, page, dpi, clip = clip)
+
+    return ocr_pdf(pdf_file, page, dpi, clip = clip)
+  except (OSError, RuntimeError, tesseract().TesseractError) as e:
+    print(f'识别 {pdf_file} 失败：{e}')
+    return ''
+
+
+def ocr_pdfs(pdf_files: List[str], page = 0, dpi = 350, workers: int = None, ordered = False, clip = None,
+             text_first = True,
+             ):
+  """
+  多进程识别 pdf 文件，每识别完一个即返回 (序号, 内容)
+  :param pdf_files:
+  :param page:
+  :param dpi:
+  :param clip: 只识别页面的该比例区域，见 page_clip
+  :param text_first: 优先读取文字层
+  :param workers: 同时识别的进程数，默认为 cpu 核数
+  :param ordered: 为 True 时按 pdf_files 的顺序返回，否则先识别完的先返回
+  :return:
+  """
+  workers = min(workers or os.cpu_count() or 1, len(pdf_files))
+
+  if workers <= 1:
+    for idx, pdf_file in enumerate(pdf_files):
+      yield idx, _ocr_worker(pdf_file, page, dpi, clip, text_first)
+    return
+
+  args_list = [(pdf_file, page, dpi, clip, text_first) for pdf_file in pdf_files]
+
+  yield from pool_map(_ocr_worker, args_list, workers, ordered)
+
+
+OSD_CONFIG = '--psm 0'
+
+
+def get_rotate_angle(image):
+  return _rotate_angle(image)[0]
+
+
+def _rotate_angle(image):
+  """
+  :return: (识别结果, 是否可以缓存)，识别失败时按不旋转处理，但不缓存，下次重新识别
+  """
+  # resized_img = resize_im(image, scale=600, max_scale=1200)
+  key = ResultCache.key(image_digest(image), OSD_CONFIG)
+  out = RESULT_CACHE.get('osd', key)
+
+  if out is not None:
+    return out, True
+
+  try:
+    out = tesseract().image_to_osd(image, config = OSD_CONFIG, output_type = 'dict')
+  except tesseract().TesseractError:
+    return { 'rotate': 0 }, False
+
+  RESULT_CACHE.put('osd', key, out)
+
+  return out, True
+
+
+def correct_img_orient(image):
+  out = get_rotate_angle(image)
+  img_rotated = rotate_img(image, out['rotate'])
+
+  return img_rotated
+
+
+def get_pdf_rotate_angle(pdf_file: str, page = 0, profile = 'osd'):
+  profile = RENDER_PROFILES[profile]
+  key = ResultCache.key(file_digest(pdf_file), page, profile, OSD_CONFIG)
+  out = RESULT_CACHE.get('pdf_osd', key)
+
+  if out is None:
+    image, = render_pdf(pdf_file, page, profile)
+    out, ok = _rotate_angle(image)
+
+    if ok:
+      RESULT_CACHE.put('pdf_osd', key, out)
+
+  return out
+
+
+def correct_pdf_orient(pdf_file: str, page = 0, new_name: str = None, incremental = False):
+  angle = get_pdf_rotate_angle(pdf_file, page)['rotate']
+  rotate_pdf(pdf_file, angle, new_name, incremental)
@@ -0,0 +1,42 @@
+# -*- encoding: utf-8 -*-
+
+import os
+from typing import List
+
+from docx import Document
+from docxcompose.composer import Composer
+
+from .common import merge_name, normal_join
+
+
+def word_2_pdf(word_file: str, new_name: str = None):
+  """
+  在共用的转换进程中转换，Word 只启动一次，多个文件同时转换时使用 office_2_pdf
+  """
+  from .convert import office_pool
+
+  return office_pool().convert(os.path.normpath(word_file), new_name)
+
+
+def excel_2_pdf(excel_file: str, new_name: str = None):
+  from .convert import office_pool
+
+  return office_pool().convert(os.path.normpath(excel_file), new_name)
+
+
+# word 工具类
+def merge_word(word_files: List[str], new_name: str = None):
+  out, new_name = merge_name(word_files[0], new_name)
+  master = Document(word_files[0])
+  composer = Composer(master)
+
+  for file in word_files[1:]:
+    master.add_page_break()
+    doc = Document(file)
+    composer.append(doc)
+
+  composer.save(normal_join(out, new_name + '.docx'))
+
+
+def split_word(word_file: str, step = 1):
+  pass
@@ -0,0 +1,448 @@
+# -*- encoding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Tuple
+
+import fitz
+from pymupdf.mupdf import PDF_ENCRYPT_KEEP
+
+from .common import del_files, file_name_and_ext, get_file_name, make_dir, merge_name, normal_join
+from .pool import pool_map
+
+
+# pdf 工具类
+def _merge_docs(pdf_files: List[str], titles: List[str] = None, bookmarks = True):
+  doc = fitz.open()
+  toc = []
+
+  for i, file in enumerate(pdf_files):
+    src = fitz.open(file)
+    start = doc.page_count
+
+    if bookmarks:
+      title = titles[i] if titles else file_name_and_ext(file)[0]
+      toc.append([1, title, start + 1])
+      # 原文件自带的书签挂在该文件下
+      toc += [[level + 1, name, page + start] for level, name, page in src.get_toc() if page > 0]
+
+    doc.insert_pdf(src, from_page = 0, to_page = -1)
+    src.close()
+
+  return doc, toc
+
+
+def _merge_chunk(pdf_files: List[str], out_file: str, titles: List[str] = None, bookmarks = True):
+  doc, toc = _merge_docs(pdf_files, titles, bookmarks)
+  page_count = doc.page_count
+  doc.save(out_file, garbage = 1)
+  doc.close()
+
+  return toc, page_count
+
+
+def merge_pdf(pdf_files: List[str], new_name: str = None, del_raw = False, titles: List[str] = None,
+              bookmarks = True, workers = 0, chunk_size = 50, garbage = 4, deflate = False, callback = None,
+              ):
+  """
+  合并 pdf 文件，每个源文件添加一个书签
+  :param pdf_files:
+  :param new_name:
+  :param del_raw:
+  :param titles: 书签名，默认为源文件名
+  :param bookmarks:
+  :param workers: 大于 1 时分组后多进程合并
+  :param chunk_size: 每组文件数，只有一组时直接在内存中合并
+  :param garbage: 最终保存的 garbage 级别
+  :param deflate: 最终保存时是否压缩
+  :param callback: 每合并完一组调用 callback(已合并的文件数)
+  :return: 合并后的文件
+  """
+  out, new_name = merge_name(pdf_files[0], new_name)
+  make_dir(out)
+  full = normal_join(out, new_name + '.pdf')
+  chunks = [pdf_files[i: i + chunk_size] for i in range(0, len(pdf_files), chunk_size)]
+
+  if len(chunks) == 1:
+    doc, toc = _merge_docs(pdf_files, titles, bookmarks)
+    doc.set_toc(toc)
+    doc.save(full, garbage = garbage, deflate = deflate)
+    doc.close()
+
+    if callback:
+      callback(len(pdf_files))
+  else:
+    _merge_chunks(chunks, full, titles, bookmarks, workers, garbage, deflate, callback)
+
+  if del_raw:
+    del_files(pdf_files)
+
+  return full
+
+
+def _merge_chunks(chunks: List[List[str]], full: str, titles: List[str] = None, bookmarks = True, workers = 0,
+                  garbage = 4, deflate = False, callback = None,
+                  ):
+  # 分组合并到临时文件，再逐个增量追加，内存中最多只有一组的内容
+  temp = tempfile.mkdtemp(dir = os.path.dirname(full))
+  parts = [os.path.join(temp, f'{i}.pdf') for i in range(len(chunks))]
+  offsets = [0]
+
+  for chunk in chunks:
+    offsets.append(offsets[-1] + len(chunk))
+
+  chunk_titles = [titles[offsets[i]: offsets[i + 1]] if titles else None for i in range(len(chunks))]
+  results = [None] * len(chunks)
+
+  try:
+    if workers > 1:
+      args_list = [(chunk, parts[i], chunk_titles[i], bookmarks) for i, chunk in enumerate(chunks)]
+      done = 0
+
+      for i, result in pool_map(_merge_chunk, args_list, workers):
+        results[i] = result
+        done += len(chunks[i])
+
+        if callback:
+          callback(done)
+    else:
+      for i, chunk in enumerate(chunks):
+        results[i] = _merge_chunk(chunk, parts[i], chunk_titles[i], bookmarks)
+
+        if callback:
+          callback(offsets[i + 1])
+
+    combined = os.path.join(temp, 'combined.pdf')
+    shutil.copyfile(parts[0], combined)
+    toc, page_count = results[0]
+
+    for i in range(1, len(parts)):
+      doc = fitz.open(combined)
+      src = fitz.open(parts[i])
+      doc.insert_pdf(src)
+      src.close()
+      doc.saveIncr()
+      doc.close()
+
+      chunk_toc, chunk_pages = results[i]
+      toc += [[level, name, page + page_count] for level, name, page in chunk_toc]
+      page_count += chunk_pages
+
+    doc = fitz.open(combined)
+    doc.set_toc(toc)
+    doc.save(full, garbage = garbage, deflate = deflate)
+    doc.close()
+  finally:
+    shutil.rmtree(temp, ignore_errors = True)
+
+
+def save_pdf(doc, out, name, garbage = 4):
+  make_dir(out)
+  doc.save(normal_join(out, name + '.pdf'), garbage = garbage)
+  doc.close()
+
+
+def _extract_pdf(doc, s = 0, e = -1):
+  new_doc = fitz.open()
+  new_doc.insert_pdf(doc, from_page = s, to_page = e)
+
+  return new_doc
+
+
+def extract_pdf(pdf_file, s: int = 0, e = -1, out: str = None, new_name: str = None):
+  """
+  提取 pdf 文件指定页码范围为一个新的 pdf 文件
+  :param pdf_file:
+  :param s:
+  :param e:
+  :param out:
+  :param new_name:
+  :return:
+  """
+  doc = fitz.open(pdf_file)
+  new_doc = _extract_pdf(doc, s, e)
+
+  out, new_name, _ = extract_name(pdf_file, s, e, out, new_name)
+  save_pdf(new_doc, out, new_name)
+  doc.close()
+
+
+def extract_name(pdf_file: str, s: int = 0, e: int = -1, out: str = None, new_name: str = None):
+  out = out or get_file_name(pdf_file)
+  new_name = new_name or f'part_{s + 1}_{e + 1}'
+  full = normal_join(out, new_name + '.pdf')
+
+  return out, new_name, full
+
+
+def split_count(page_num: int, step = 1, s = 0):
+  """
+  规则分割出的份数
+  """
+  return max(0, -(-(page_num - s) // step))
+
+
+def split_part(pdf_file: str, i: int, page_num: int, step = 1, out: str = None, new_name: str = None):
+  """
+  规则分割中从第 i 页（从 0 开始）开始的一份，不用生成全部分割就能得到某一份的文件名
+  """
+  end = min(i + step - 1, page_num - 1)
+
+  if new_name:
+    _, _, full = extract_name(pdf_file, out = out, new_name = f'{i}_{new_name}')
+  else:
+    _, _, full = extract_name(pdf_file, i, end, out)
+
+  return {
+    's'   : i,
+    'e'   : end,
+    'full': os.path.normpath(full),
+  }
+
+
+def split_parts(pdf_file: str, page_num: int, step = 1, s = 0, out: str = None, new_name: str = None):
+  return [split_part(pdf_file, i, page_num, step, out, new_name) for i in range(s, page_num, step)]
+
+
+def _write_part(doc, part, garbage = 1):
+  # 拆出来的部分只引用源文件的一小段对象，garbage = 1 去掉无用对象即可，不必做 4 级去重
+  new_doc = _extract_pdf(doc, part['s'], part['e'])
+  new_doc.save(part['full'], garbage = garbage)
+  new_doc.close()
+
+
+# 进程池中每个进程对同一源文件只打开一次
+_part_docs: OrderedDict[tuple, Any] = OrderedDict()
+
+
+def _part_doc(pdf_file: str):
+  stat = os.stat(pdf_file)
+  key = (os.path.abspath(pdf_file), stat.st_size, stat.st_mtime_ns)
+  doc = _part_docs.get(key)
+
+  if doc is None:
+    doc = fitz.open(pdf_file)
+    _part_docs[key] = doc
+
+    while len(_part_docs) > 4:
+      _, old = _part_docs.popitem(last = False)
+      old.close()
+
+  return doc
+
+
+def _part_worker(pdf_file: str, part, garbage = 1):
+  _write_part(_part_doc(pdf_file), part, garbage)
+
+
+def split_pdf_parts(pdf_file: str, parts: List[dict], workers = 0, callback = None, garbage = 1, doc = None):
+  """
+  打开一次源文件，按 parts 写出全部分割文件
+  :param pdf_file:
+  :param parts: [{'s': 起始页, 'e': 结束页, 'full': 输出路径}]，页码从 0 开始
+  :param workers: 大于 1 时使用进程池写出
+  :param callback: 每写完一份调用 callback(idx)
+  :param garbage:
+  :param doc: 已打开的源文件，串行写出时复用
+  :return:
+  """
+  for folder in set(os.path.dirname(part['full']) for part in parts):
+    make_dir(folder)
+
+  if workers > 1 and len(parts) > 1:
+    for idx, _ in pool_map(_part_worker, [(pdf_file, part, garbage) for part in parts], workers):
+      if callback:
+        callback(idx)
+
+    return
+
+  src = doc or fitz.open(pdf_file)
+
+  for idx, part in enumerate(parts):
+    _write_part(src, part, garbage)
+
+    if callback:
+      callback(idx)
+
+  if doc is None:
+    src.close()
+
+
+def split_pdf(pdf_file: str, step = 1, s = 0, e = None, out: str = None, new_name = None, workers = 0,
+              callback = None,
+              ):
+  """
+  规则分割 pdf 文件
+  :param pdf_file:
+  :param s:
+  :param e:
+  :param step:
+  :param out:
+  :param new_name:
+  :param workers:
+  :param callback:
+  :return: 分割出的文件
+  """
+  doc = fitz.open(pdf_file)
+  page_num = e or doc.page_count
+  parts = split_parts(pdf_file, page_num, step, s, out, new_name)
+
+  if workers > 1:
+    doc.close()
+    split_pdf_parts(pdf_file, parts, workers, callback)
+  else:
+    split_pdf_parts(pdf_file, parts, callback = callback, doc = doc)
+    doc.close()
+
+  return [part['full'] for part in parts]
+
+
+@dataclass
+class PDFMeta:
+  page_count: int
+  page_sizes: List[Tuple[float, float]]
+  rotations: List[int]
+  has_text: bool
+  encrypted: bool
+
+
+def read_pdf_meta(pdf_file: str, text_pages = 3):
+  doc = fitz.open(pdf_file)
+  encrypted = doc.is_encrypted or doc.needs_pass
+  page_sizes = []
+  rotations = []
+  has_text = False
+
+  if not doc.needs_pass:
+    for i, page in enumerate(doc):
+      page_sizes.append((page.rect.width, page.rect.height))
+      rotations.append(page.rotation)
+
+      # 只看前几页判断是否有文字层
+      if not has_text and i < text_pages:
+        has_text = bool(page.get_text('text').strip())
+
+  meta = PDFMeta(doc.page_count, page_sizes, rotations, has_text, encrypted)
+  doc.close()
+
+  return meta
+
+
+class PDFMetaCache:
+  """
+  按 (路径, 大小, 修改时间) 缓存 pdf 元数据，超出 max_size 时淘汰最久未使用的
+  """
+
+  def __init__(self, max_size = 4096):
+    self.max_size = max_size
+    self.items: OrderedDict[tuple, PDFMeta] = OrderedDict()
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def key(pdf_file: str):
+    stat = os.stat(pdf_file)
+
+    return os.path.normcase(os.path.abspath(pdf_file)), stat.st_size, stat.st_mtime_ns
+
+  def get(self, pdf_file: str):
+    key = self.key(pdf_file)
+
+    with self.lock:
+      meta = self.items.get(key)
+
+      if meta is not None:
+        self.items.move_to_end(key)
+        return meta
+
+    meta = read_pdf_meta(pdf_file)
+
+    with self.lock:
+      self.items[key] = meta
+
+      while len(self.items) > self.max_size:
+        self.items.popitem(last = False)
+
+    return meta
+
+  def prefetch(self, pdf_files: List[str], callback = None):
+    for i, pdf_file in enumerate(pdf_files):
+      try:
+        self.get(pdf_file)
+      except (OSError, RuntimeError) as e:
+        print(f'读取 {pdf_file} 失败：{e}')
+
+      if callback:
+        callback(i)
+
+  def clear(self):
+    with self.lock:
+      self.items.clear()
+
+
+PDF_META = PDFMetaCache()
+
+
+def get_pdf_meta(pdf_file: str):
+  return PDF_META.get(pdf_file)
+
+
+def get_pdf_page(pdf_file: str):
+  return PDF_META.get(pdf_file).page_count
+
+
+def split_name(pdf_file, step = 1, s = 0, e = None, out = None, new_name = None):
+  page_num = e or get_pdf_page(pdf_file)
+  parts = split_parts(pdf_file, page_num, step, s, out, new_name)
+
+  return [part['full'] for part in parts]
+
+
+def page_clip(page, clip = None):
+  """
+  将 (x0, y0, x1, y1) 页面比例换算为页面坐标，如 (0, 0, 1, 0.3) 表示页面顶部 30%
+  """
+  if clip is None:
+    return None
+
+  rect = page.rect
+  x0, y0, x1, y1 = clip
+
+  return fitz.Rect(rect.x0 + rect.width * x0, rect.y0 + rect.height * y0,
+                   rect.x0 + rect.width * x1, rect.y0 + rect.height * y1,
+                   )
+
+
+def usable_text(text: str, min_chars = 10):
+  chars = ''.join(text.split())
+
+  # 缺少 ToUnicode 的字体会提取出大量替换字符
+  return len(chars) >= min_chars and chars.count('\ufffd') < len(chars) * 0.1
+
+
+def pdf_text(pdf_file: str, page = 0, clip = None):
+  doc = fitz.open(pdf_file)
+  pdf_page = doc.load_page(page)
+  text = pdf_page.get_text('text', clip = page_clip(pdf_page, clip))
+  doc.close()
+
+  return text
+
+
+def rotate_pdf(pdf_file: str, angle: float = 0.0, new_name: str = None, incremental = False):
+  angle = int(((360 - angle) / 90) * 90)
+  doc = fitz.open(pdf_file)
+
+  for page in doc:
+    page.set_rotation(angle)
+
+  if incremental:
+    doc.save(doc.name, incremental = True, encryption = PDF_ENCRYPT_KEEP)
+  else:
+    name = new_name or doc.name.replace('.pdf', f'-校正方向.pdf')
+    doc.save(name)
+
+  doc.close()
@@ -0,0 +1,99 @@
+# -*- encoding: utf-8 -*-
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import List
+
+
+# 进程池
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_lock = threading.Lock()
+_thread_pool: ThreadPoolExecutor | None = None
+
+
+def _init_worker():
+  # 多个进程同时识别时，限制 tesseract 自身的线程数，避免互相抢占
+  os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def process_pool():
+  """
+  所有功能共用一个进程池，进程数不超过 cpu 核数
+  """
+  global _process_pool
+
+  with _process_pool_lock:
+    if _process_pool is None:
+      # 与 Windows 一致使用 spawn，fork 会复制界面、线程池中其他线程持有的锁，子进程可能卡死
+      _process_pool = ProcessPoolExecutor(max_workers = min(os.cpu_count() or 1, 61), initializer = _init_worker,
+                                          mp_context = multiprocessing.get_context('spawn'),
+                                          )
+
+  return _process_pool
+
+
+def thread_pool():
+  """
+  OpenCV、numpy 计算时会释放 GIL，分块处理大图时用线程即可并行，不需要复制图片到子进程
+  """
+  global _thread_pool
+
+  with _process_pool_lock:
+    if _thread_pool is None:
+      _thread_pool = ThreadPoolExecutor(max_workers = os.cpu_count() or 1, thread_name_prefix = 'util')
+
+  return _thread_pool
+
+
+def pool_map(fn, args_list: List[tuple], workers: int = None, ordered = False, ahead: int = None):
+  """
+  在共享进程池中执行 fn(*args)，同时最多提交 workers 个，每完成一个返回 (序号, 结果)
+  生成器提前关闭时（如取消任务）会撤销尚未开始的任务
+  :param fn: 需为模块级函数
+  :param args_list:
+  :param workers:
+  :param ordered: 为 True 时按 args_list 的顺序返回，否则先完成的先返回
+  :param ahead: ordered 时执行中与已完成但还没轮到返回的总数上限，结果较大时用来限制内存
+  :return:
+  """
+  pool = process_pool()
+  workers = workers or pool._max_workers
+  items = iter(enumerate(args_list))
+  pending = { }
+  results = { }
+  next_idx = 0
+
+  def fill():
+    while len(pending) < workers and (ahead is None or len(pending) + len(results) < ahead):
+      item = next(items, None)
+
+      if item is None:
+        break
+
+      idx, args = item
+      pending[pool.submit(fn, *args)] = idx
+
+  try:
+    fill()
+
+    while pending:
+      done, _ = wait(pending, return_when = FIRST_COMPLETED)
+
+      for future in done:
+        idx = pending.pop(future)
+
+        if ordered:
+          results[idx] = future.result()
+        else:
+          yield idx, future.result()
+
+      while next_idx in results:
+        yield next_idx, results.pop(next_idx)
+        next_idx += 1
+
+      fill()
+  finally:
+    for future in pending:
+      future.cancel()
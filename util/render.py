@@ -0,0 +1,97 @@
+# -*- encoding: utf-8 -*-
+
+from dataclasses import dataclass
+
+import cv2
+import fitz
+import numpy as np
+
+from .pdf import page_clip
+
+
+@dataclass(frozen = True)
+class RenderProfile:
+  dpi: int = 350
+  gray: bool = False
+  # 页面比例 (x0, y0, x1, y1)，见 page_clip
+  clip: tuple = None
+  # 忽略页面自带的旋转
+  reset_angle: bool = False
+
+
+RENDER_PROFILES = {
+  'thumbnail': RenderProfile(dpi = 50),
+  'preview'  : RenderProfile(dpi = 50, reset_angle = True),
+  'osd'      : RenderProfile(dpi = 150, gray = True, reset_angle = True),
+  'ocr'      : RenderProfile(dpi = 350, gray = True),
+}
+
+
+def pixmap_2_image(pix):
+  img = np.frombuffer(pix.samples_mv, dtype = np.uint8).reshape((pix.height, pix.width, pix.n))
+
+  if pix.n == 1:
+    return img[:, :, 0].copy()
+
+  # 与 read_img 一致，使用 BGR
+  return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+
+
+def pdf_2_image(pdf_file: str, page = 0, dpi = 350, reset_angle = False, clip = None, gray = False):
+  doc = fitz.open(pdf_file)
+
+  if reset_angle:
+    doc[page].set_rotation(0)
+
+  page = doc.load_page(page)
+  pix = page.get_pixmap(dpi = dpi, clip = page_clip(page, clip), colorspace = fitz.csGRAY if gray else fitz.csRGB)
+  img = pixmap_2_image(pix)
+  doc.close()
+
+  return img
+
+
+def _profile_image(image, rotation: int, scale: float, profile: RenderProfile):
+  if rotation and not profile.reset_angle:
+    image = np.rot90(image, -rotation // 90)
+
+  if profile.clip:
+    h, w = image.shape[:2]
+    x0, y0, x1, y1 = profile.clip
+    image = image[round(h * y0): round(h * y1), round(w * x0): round(w * x1)]
+
+  if scale != 1:
+    image = cv2.resize(image, (0, 0), fx = scale, fy = scale, interpolation = cv2.INTER_AREA)
+
+  if profile.gray and image.ndim == 3:
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+  return np.ascontiguousarray(image)
+
+
+def render_pdf(pdf_file: str, page = 0, *profiles: str | RenderProfile):
+  """
+  按多个渲染配置输出同一页，只渲染一次，其余由缩放、裁剪、旋转得到
+  :param pdf_file:
+  :param page:
+  :param profiles: RENDER_PROFILES 中的名称或 RenderProfile
+  :return: 与 profiles 一一对应的图片
+  """
+  profiles = [RENDER_PROFILES[profile] if isinstance(profile, str) else profile for profile in profiles]
+
+  if len(profiles) == 1:
+    profile = profiles[0]
+
+    return [pdf_2_image(pdf_file, page, profile.dpi, profile.reset_angle, profile.clip, profile.gray)]
+
+  dpi = max(profile.dpi for profile in profiles)
+  gray = all(profile.gray for profile in profiles)
+  doc = fitz.open(pdf_file)
+  rotation = doc[page].rotation
+  doc[page].set_rotation(0)
+  pdf_page = doc.load_page(page)
+  pix = pdf_page.get_pixmap(dpi = dpi, colorspace = fitz.csGRAY if gray else fitz.csRGB)
+  image = pixmap_2_image(pix)
+  doc.close()
+
+  return [_profile_image(image, rotation, profile.dpi / dpi, profile) for profile in profiles]
@@ -0,0 +1,113 @@
+# -*- encoding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from .image import fit_img
+
+# 超过该角度时旋转后扩大画布，否则保持原大小（纠偏时只会差几度）
+MAX_SKEW = 15
+
+# 顺时针角度对应的 cv2.rotate 参数
+_RIGHT_ANGLES = {
+  90 : cv2.ROTATE_90_CLOCKWISE,
+  180: cv2.ROTATE_180,
+  270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+
+def rotate_right(image, angle: int):
+  """
+  顺时针旋转 90 的整数倍，只搬移像素，没有插值损失
+  """
+  angle %= 360
+
+  if angle == 0:
+    return image
+
+  return cv2.rotate(image, _RIGHT_ANGLES[angle])
+
+
+def warp_img(image, angle: float, expand = False, border = 255, flags = cv2.INTER_LINEAR):
+  """
+  顺时针旋转任意角度
+  :param expand: 是否扩大画布以容纳整张图，否则保持原大小
+  :param border: 空白处的填充值，默认白色
+  :return:
+  """
+  h, w = image.shape[:2]
+  matrix = cv2.getRotationMatrix2D(((w - 1) / 2, (h - 1) / 2), -angle, 1.0)
+
+  if expand:
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_w, new_h = int(round(h * sin + w * cos)), int(round(h * cos + w * sin))
+    matrix[0, 2] += (new_w - w) / 2
+    matrix[1, 2] += (new_h - h) / 2
+    w, h = new_w, new_h
+
+  return cv2.warpAffine(image, matrix, (w, h), flags = flags, borderMode = cv2.BORDER_CONSTANT,
+                        borderValue = (border, border, border),
+                        )
+
+
+def rotate_img(image, angle: float = 0, expand: bool = None):
+  """
+  顺时针旋转 angle 度，先无损旋转最接近的 90 的整数倍，剩余不超过 45 度的部分再做仿射变换
+  :param expand: 剩余部分是否扩大画布，默认超过 MAX_SKEW 时扩大
+  :return:
+  """
+  angle %= 360
+  right = int(round(angle / 90)) * 90
+  skew = angle - right
+  image = rotate_right(image, right)
+
+  if abs(skew) < 1e-3:
+    return image
+
+  if expand is None:
+    expand = abs(skew) > MAX_SKEW
+
+  return warp_img(image, skew, expand)
+
+
+def _line_score(mask, angle: float):
+  rotated = warp_img(mask, angle, border = 0, flags = cv2.INTER_NEAREST)
+  rows = cv2.reduce(rotated, 1, cv2.REDUCE_SUM, dtype = cv2.CV_32F).ravel()
+
+  # 文字行水平时，行与行间距的像素数差异最大
+  return float(np.square(np.diff(rows)).sum())
+
+
+def get_skew_angle(image, max_angle: float = 10, size = 1000, step = 0.5):
+  """
+  检测扫描件的倾斜角度，在缩小到 size 以内的副本上按投影找文字行最水平的角度
+  :return: 顺时针旋转该角度即可摆正，与 rotate_img 一致
+  """
+  small = fit_img(image, size)
+
+  if small.ndim > 2:
+    small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+  _, mask = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+  if cv2.countNonZero(mask) == 0:
+    return 0.0
+
+  angles = np.arange(-max_angle, max_angle + step / 2, step)
+  best = max(angles, key = lambda a: _line_score(mask, a))
+  angles = np.arange(best - step, best + step * 1.1, step / 5)
+  best = max(angles, key = lambda a: _line_score(mask, a))
+
+  return round(float(best), 2) + 0.0
+
+
+def deskew_img(image, max_angle: float = 10, min_angle = 0.1):
+  """
+  纠正扫描件的轻微倾斜，画布大小不变
+  """
+  angle = get_skew_angle(image, max_angle)
+
+  if abs(angle) < min_angle:
+    return image
+
+  return rotate_img(image, angle, expand = False)
@@ -0,0 +1,276 @@
+# -*- encoding: utf-8 -*-
+
+import glob
+import heapq
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+class FileIndex:
+  """
+  按扩展名（小写）分组的文件索引，每个目录只用 os.scandir 遍历一次，之后按扩展名筛选不再读取磁盘
+  与 glob 一致，跳过 . 开头的文件和目录，不进入目录的符号链接
+  """
+
+  def __init__(self, exts: Iterable[str] = None):
+    """
+    :param exts: 只记录这些扩展名的文件，如 ['.pdf', '.jpg']，默认记录全部
+    """
+    self.exts = { ext.lower() for ext in exts } if exts is not None else None
+    # 扩展名 -> [(发现顺序, 路径, 是否在所选目录的第一层), ...]
+    self.buckets: Dict[str, List[Tuple[int, str, bool]]] = { }
+    self.roots: List[str] = []
+    self.count = 0
+
+  def scan(self, folders: List[str], callback: Callable[[int, str, str, bool], None] = None, rec = True):
+    """
+    遍历目录，每记录一个文件调用 callback(发现顺序, 路径, 扩展名, 是否在第一层)
+    同一目录中按名称排序，结果与执行顺序无关
+    :param rec: 为 False 时不进入子目录
+    """
+    for folder in folders:
+      root = os.path.normpath(folder)
+      self.roots.append(root)
+      stack = [root]
+
+      while stack:
+        cur = stack.pop()
+
+        try:
+          with os.scandir(cur) as it:
+            entries = sorted(it, key = lambda entry: entry.name)
+        except OSError:
+          continue
+
+        dirs = []
+
+        for entry in entries:
+          if entry.name.startswith('.'):
+            continue
+
+          try:
+            if entry.is_dir(follow_symlinks = False):
+              dirs.append(entry.path)
+              continue
+
+            if not entry.is_file():
+              continue
+          except OSError:
+            continue
+
+          ext = os.path.splitext(entry.name)[1].lower()
+
+          if self.exts is not None and ext not in self.exts:
+            continue
+
+          seq = self.count
+          self.count += 1
+          self.buckets.setdefault(ext, []).append((seq, entry.path, cur == root))
+
+          if callback:
+            callback(seq, entry.path, ext, cur == root)
+
+        if rec:
+          stack += reversed(dirs)
+
+    return self
+
+  def files(self, exts: Iterable[str], rec = True):
+    """
+    按发现顺序返回指定扩展名的文件
+    :param rec: 为 False 时只返回所选目录第一层的文件
+    :return: [(路径, 扩展名), ...]
+    """
+    buckets = [[(seq, path, ext) for seq, path, top in self.buckets.get(ext, []) if rec or top]
+               for ext in { ext.lower() for ext in exts }]
+
+    return [(path, ext) for _, path, ext in heapq.merge(*buckets)]
+
+  def __len__(self):
+    return self.count
+
+
+def scan_files(folders: List[str], exts: Iterable[str], rec = True):
+  """
+  一次遍历找出目录中指定扩展名的文件，替代按扩展名多次调用 find_files
+  """
+  return [path for path, _ in FileIndex(exts).scan(folders, rec = rec).files(exts)]
+
+
+@dataclass(frozen = True)
+class CatalogFile:
+  path: str
+  # 相对待整理目录的路径，以 / 分隔
+  rel: str
+  name: str
+  # 小写的扩展名
+  ext: str
+  size: int
+
+
+@dataclass
+class CatalogDir:
+  mtime: int
+  files: List[CatalogFile] = field(default_factory = list)
+  dirs: List[str] = field(default_factory = list)
+
+
+class GlobMatcher:
+  """
+  编译后的 glob 规则，与 glob.glob(f'{目录}/**/{规则}', recursive = True) 的结果一致
+  规则不含 / 时只匹配文件名，*.pdf 这类规则先比较扩展名
+  """
+
+  def __init__(self, pattern: str):
+    self.pattern = pattern.replace('\\', '/').strip('/')
+    self.on_name = '/' not in self.pattern
+    self.ext = None
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    regex = glob.translate(self.pattern if self.on_name else f'**/{self.pattern}', recursive = True,
+                           include_hidden = False, seps = '/',
+                           )
+    self.regex = re.compile(regex, flags)
+
+    ext = os.path.splitext(self.pattern)[1]
+
+    if self.on_name and ext and not glob.has_magic(ext):
+      self.ext = ext.lower()
+
+  def __call__(self, file: CatalogFile):
+    if self.ext and file.ext != self.ext:
+      return False
+
+    return self.regex.match(file.name if self.on_name else file.rel) is not None
+
+
+class FileCatalog:
+  """
+  目录下所有文件的路径、名称、扩展名、大小，只遍历一次
+  之后按目录的修改时间增量刷新，只重新读取增删过文件的目录
+  """
+
+  def __init__(self, root: str):
+    self.root = os.path.normpath(root)
+    # 相对路径 -> CatalogDir，根目录为 ''
+    self.dirs: Dict[str, CatalogDir] = { }
+    self.refreshed = 0.0
+    self.lock = threading.Lock()
+
+  def _read_dir(self, rel: str):
+    full = os.path.join(self.root, rel) if rel else self.root
+    item = CatalogDir(os.stat(full).st_mtime_ns)
+
+    with os.scandir(full) as it:
+      entries = sorted(it, key = lambda entry: entry.name)
+
+    for entry in entries:
+      if entry.name.startswith('.'):
+        continue
+
+      try:
+        child = f'{rel}/{entry.name}' if rel else entry.name
+
+        if entry.is_dir(follow_symlinks = False):
+          item.dirs.append(child)
+        elif entry.is_file():
+          ext = os.path.splitext(entry.name)[1].lower()
+          item.files.append(CatalogFile(entry.path, child, entry.name, ext, entry.stat().st_size))
+      except OSError:
+        continue
+
+    return item
+
+  def _read_tree(self, rel: str, dirs: Dict[str, CatalogDir], job = None):
+    stack = [rel]
+
+    while stack:
+      cur = stack.pop()
+
+      if job:
+        job.check()
+
+      try:
+        item = self._read_dir(cur)
+      except OSError:
+        continue
+
+      dirs[cur] = item
+      stack += reversed(item.dirs)
+
+  def scan(self, job = None):
+    """
+    完整遍历一次
+    :param job: 传入时每个目录检查一次是否已取消
+    """
+    dirs: Dict[str, CatalogDir] = { }
+    self._read_tree('', dirs, job)
+
+    with self.lock:
+      self.dirs = dirs
+      self.refreshed = time.monotonic()
+
+    return self
+
+  def refresh(self, job = None):
+    """
+    按目录的修改时间增量刷新：目录中增删、重命名过文件时才重新读取该目录，新的子目录完整读取
+    只修改了文件内容时目录的修改时间不变，大小不会更新
+    :return: 重新读取的目录数
+    """
+    with self.lock:
+      old = dict(self.dirs)
+
+    dirs: Dict[str, CatalogDir] = { }
+    changed = 0
+    stack = ['']
+
+    while stack:
+      rel = stack.pop()
+
+      if job:
+        job.check()
+
+      item = old.get(rel)
+
+      if item is None:
+        before = len(dirs)
+        self._read_tree(rel, dirs, job)
+        changed += len(dirs) - before
+        continue
+
+      try:
+        mtime = os.stat(os.path.join(self.root, rel) if rel else self.root).st_mtime_ns
+
+        if mtime != item.mtime:
+          item = self._read_dir(rel)
+          changed += 1
+      except OSError:
+        changed += 1
+        continue
+
+      dirs[rel] = item
+      stack += reversed(item.dirs)
+
+    with self.lock:
+      self.dirs = dirs
+      self.refreshed = time.monotonic()
+
+    return changed
+
+  def match(self, matchers: List[GlobMatcher]):
+    """
+    返回符合任一规则的文件，按路径排序
+    """
+    with self.lock:
+      dirs = list(self.dirs.values())
+
+    result = [file for item in dirs for file in item.files if any(matcher(file) for matcher in matchers)]
+
+    return sorted(result, key = lambda file: file.rel)
+
+  def __len__(self):
+    return sum(len(item.files) for item in self.dirs.values())